@@ -1,19 +1,30 @@
 import streamlit as st
-import google.generativeai as genai
-from PIL import Image
-import io
-import os
 import json
+import os
 from datetime import datetime
-from pathlib import Path
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import base64
+import threading
+from contextlib import contextmanager
+import time
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from smartsplit.batch import Throttle, extract_many
+from smartsplit.emails import build_summary_message, plan_fanout
+from smartsplit.expense_table import ExpenseTable
+from smartsplit.extractors import ExtractorUnavailable, build_extractor
+from smartsplit import metrics
+from smartsplit.auth import (browser_token_cache, fetch_userinfo, interactive_login, new_browser_secret,
+                             remove_unbound_tokens, silent_login)
+from smartsplit.ledger import apply_expenses
+from smartsplit.mail import MailDispatcher, authorized_http_factory, build_gmail_service
+from smartsplit.money import format_cents, split_evenly
+from smartsplit.outbox import GmailSenders, OutboxWorker, outbox_message
+from smartsplit.paging import PAGE_SIZE, TABLE_PAGE_SIZE, debt_rows, ledger_debts, page_count, page_slice, search
+from smartsplit.receipt_cache import CACHE_FILE as RECEIPT_CACHE_FILE, ReceiptCache
+from smartsplit.receipts import amount_due, scale_items
+from smartsplit.settlement import simplify_ledger
+from smartsplit.shared import SharedData
+from smartsplit.snapshot import SNAPSHOT_FILE
+from smartsplit.storage import DATA_DIR, DB_FILE, ConflictError, Store
 
 
 
@@ -24,15 +35,19 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+RERUN_START = time.perf_counter()
 
 # Load environment variables
 load_dotenv('api.env')
 
-# Configure Gemini API
+# Receipt extraction backend: gemini, local (tesseract OCR), local-first or gemini-first
+RECEIPT_EXTRACTOR = os.getenv("RECEIPT_EXTRACTOR", "gemini")
+# Gemini reply format: json (structured output) or text (streamed, items appear as they are read)
+GEMINI_RESPONSE_FORMAT = os.getenv("GEMINI_RESPONSE_FORMAT", "json")
+
+# Gemini API key; the SDK is configured once, when the extractor is first built
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
+if not GEMINI_API_KEY and RECEIPT_EXTRACTOR != "local":
     st.error("GEMINI_API_KEY not found in environment variables. Please create a .env file with your API key.")
 
 # Google OAuth configuration
@@ -44,9 +59,26 @@ SCOPES = [
     'https://www.googleapis.com/auth/gmail.send'
 ]
 
-# Paths for credentials and token
+# Receipt extraction concurrency; set GEMINI_REQUESTS_PER_MINUTE to stay under the API quota
+EXTRACTION_WORKERS = 4
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0")) or None
+
+# Concurrent Gmail sends by the background outbox worker
+MAIL_WORKERS = 8
+# Include a plain-text alternative in summary emails
+EMAIL_PLAIN_TEXT = True
+
+# Stage timings: SMARTSPLIT_METRICS=1 records them, SMARTSPLIT_METRICS_TRACE=path also appends them to a JSONL file
+METRICS_ENABLED = os.getenv("SMARTSPLIT_METRICS", "") not in ("", "0")
+METRICS_TRACE = os.getenv("SMARTSPLIT_METRICS_TRACE") or None
+# Comma-separated emails that see the performance panel
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("SMARTSPLIT_ADMINS", "").split(",") if email.strip()}
+
+# OAuth client secrets; each account's token is saved under data/tokens, per browser
 CREDENTIALS_FILE = "credentials.json"
-TOKEN_FILE = "token.json"
+# Cookie holding the browser's secret for its saved logins, kept for a year
+BROWSER_COOKIE = "smartsplit_browser"
+BROWSER_COOKIE_MAX_AGE = 365 * 24 * 3600
 
 def init_session_state():
     if 'authenticated' not in st.session_state:
@@ -63,197 +95,241 @@ def init_session_state():
         st.session_state.groups = {}
     if 'expenses' not in st.session_state:
         st.session_state.expenses = {}
+    if 'ledgers' not in st.session_state:
+        st.session_state.ledgers = {}
     if 'credentials' not in st.session_state:
         st.session_state.credentials = None
+    if 'mail_dispatcher' not in st.session_state:
+        st.session_state.mail_dispatcher = None
 
-def authenticate_google():
+def authenticate_google(login_hint=None):
     try:
-        # Always start fresh by removing existing token
-        if os.path.exists(TOKEN_FILE):
-            os.remove(TOKEN_FILE)
-            
         if not os.path.exists(CREDENTIALS_FILE):
             st.error("credentials.json file not found! Please make sure you have downloaded it from Google Cloud Console.")
             return None
-            
-        flow = InstalledAppFlow.from_client_secrets_file(
-            CREDENTIALS_FILE,
-            SCOPES,
-            redirect_uri='http://localhost:8080'
-        )
         
-        # Force new login by not using cached credentials
-        creds = flow.run_local_server(
-            port=8080,
-            prompt='consent',
-            authorization_prompt_message='Please login with your Google account'
-        )
+        creds = interactive_login(CREDENTIALS_FILE, SCOPES, login_hint=login_hint)
+        user_info = fetch_userinfo(creds)
         
-        # Save the credentials for the next run
-        with open(TOKEN_FILE, 'w') as token:
-            token.write(creds.to_json())
+        # Saved with the token, so the next login needs neither the browser nor this lookup
+        get_token_cache().save(creds, user_info)
         
-        return creds
+        return creds, user_info
     except Exception as e:
         st.error(f"Authentication error: {str(e)}")
         return None
 
+def complete_login(creds, user_info):
+    user_email = user_info['email']
+    
+    # Update session state
+    st.session_state.authenticated = True
+    st.session_state.user_email = user_email
+    st.session_state.credentials = creds
+    
+    # Initialize user if not exists
+    with shared_write():
+        if user_email not in st.session_state.users:
+            get_store().save_user(user_email, user_info['name'])
+            st.session_state.users[user_email] = {
+                "full_name": user_info['name'],
+                "groups": {},
+                "expenses": []
+            }
+    
+    st.success(f"Welcome, {st.session_state.users[user_email]['full_name']}!")
+    st.rerun()
+
 # Initialize session state
 init_session_state()
 
+@st.cache_resource
+def setup_metrics():
+    metrics.configure(enabled=METRICS_ENABLED, trace=METRICS_TRACE)
+
+setup_metrics()
+
+@st.cache_resource
+def remove_legacy_tokens():
+    # Token files from before logins were bound to a browser are unreachable but hold refresh tokens
+    remove_unbound_tokens()
+
+remove_legacy_tokens()
+
 # Data persistence functions
+@st.cache_resource
+def get_store():
+    store = Store(DB_FILE)
+    # One-shot import of the legacy data/*.json files
+    store.migrate_from_json(DATA_DIR)
+    return store
+
+def get_browser_secret():
+    # Saved logins are bound to the browser through a random secret in a cookie;
+    # a browser without one gets a new secret, stored by set_browser_cookie()
+    if 'browser_secret' not in st.session_state:
+        secret = st.context.cookies.get(BROWSER_COOKIE)
+        # Anything shorter was not issued by new_browser_secret()
+        if not isinstance(secret, str) or len(secret) < 32:
+            secret = new_browser_secret()
+        st.session_state.browser_secret = secret
+    return st.session_state.browser_secret
+
+def set_browser_cookie():
+    secret = get_browser_secret()
+    if st.context.cookies.get(BROWSER_COOKIE) == secret:
+        return
+    cookie = f"{BROWSER_COOKIE}={secret}; path=/; max-age={BROWSER_COOKIE_MAX_AGE}; SameSite=Strict"
+    st.html(
+        f"<script>document.cookie = {json.dumps(cookie)}"
+        " + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+        unsafe_allow_javascript=True,
+    )
+
+def get_token_cache():
+    # Only the logins saved from this browser
+    return browser_token_cache(get_browser_secret())
+
+@st.cache_resource
+def get_receipt_cache():
+    return ReceiptCache(RECEIPT_CACHE_FILE)
+
+@st.cache_resource
+def get_extractor():
+    # Imported and configured on first use, not on every cold start
+    if GEMINI_API_KEY and RECEIPT_EXTRACTOR != "local":
+        import google.generativeai as genai
+        genai.configure(api_key=GEMINI_API_KEY)
+    return build_extractor(RECEIPT_EXTRACTOR, structured=GEMINI_RESPONSE_FORMAT != "text")
+
+@st.cache_resource
+def get_mail_senders():
+    return GmailSenders()
+
+@st.cache_resource
+def get_outbox_worker():
+    # Delivers queued notification emails in the background, with retries
+    worker = OutboxWorker(get_store(), get_mail_senders(), max_workers=MAIL_WORKERS)
+    worker.start()
+    return worker
+
+@st.cache_resource
+def get_shared_data():
+    # Expenses come from the binary snapshot, mapped per group on first use. If it was
+    # missing or behind the database, write a fresh one for the next start
+    shared = SharedData(get_store(), SNAPSHOT_FILE)
+    if shared.stale:
+        threading.Thread(target=shared.write_snapshot, name="snapshot-writer", daemon=True).start()
+    return shared
+
 def load_data():
-    data_dir = Path("data")
-    data_dir.mkdir(exist_ok=True)
-    
-    try:
-        with open(data_dir / "users.json", "r") as f:
-            st.session_state.users = json.load(f)
-    except FileNotFoundError:
-        st.session_state.users = {}
-    
-    try:
-        with open(data_dir / "groups.json", "r") as f:
-            st.session_state.groups = json.load(f)
-    except FileNotFoundError:
-        st.session_state.groups = {}
-    
-    try:
-        with open(data_dir / "expenses.json", "r") as f:
-            st.session_state.expenses = json.load(f)
-    except FileNotFoundError:
-        st.session_state.expenses = {}
+    # Sessions share one loaded copy; it is only re-read after external writes
+    shared = get_shared_data()
+    with metrics.timer("load_data"):
+        shared.refresh()
+    use_shared_data(shared)
 
-def save_data():
-    data_dir = Path("data")
-    data_dir.mkdir(exist_ok=True)
-    
-    with open(data_dir / "users.json", "w") as f:
-        json.dump(st.session_state.users, f)
-    
-    with open(data_dir / "groups.json", "w") as f:
-        json.dump(st.session_state.groups, f)
-    
-    with open(data_dir / "expenses.json", "w") as f:
-        json.dump(st.session_state.expenses, f)
+def use_shared_data(shared):
+    # One read of the tuple, so users, groups and ledgers always come from the same load
+    st.session_state.users, st.session_state.groups, st.session_state.ledgers = shared.data
+
+@contextmanager
+def shared_write():
+    # Write to the store first, then to the shared copy, all under its lock. A reload
+    # may have swapped in new dicts since this rerun started; apply changes to those
+    shared = get_shared_data()
+    with shared.lock:
+        use_shared_data(shared)
+        yield shared
+
+def reload_after_conflict(error):
+    # Another session changed the group first; show its latest state instead
+    shared = get_shared_data()
+    shared.refresh(force=True)
+    use_shared_data(shared)
+    st.warning(f"{error}. The latest data has been loaded; please review and try again.")
+
+def display_name(email):
+    user = st.session_state.users.get(email)
+    return user["full_name"] if user else email
+
+def member_label(email):
+    # What member searches match against
+    return f"{display_name(email)} {email}"
+
+@st.cache_resource
+def get_debt_rows_cache():
+    # (group, simplified) -> (ledger, version, {email: name}, rows), shared by all sessions
+    return {}
+
+def forget_debt_rows(group_name):
+    cache = get_debt_rows_cache()
+    cache.pop((group_name, False), None)
+    cache.pop((group_name, True), None)
+
+def group_debt_rows(group_name, simplify):
+    # Sorting all rows is the slow part of a big group's table; they only change with
+    # the group's version or one of the names shown. Versions restart at 1 when a group
+    # is deleted and created again, so an entry is also tied to the ledger dict it was
+    # built from: a new group, or a reload, gets a new one (the entry keeps the old one
+    # alive, so its identity can't be reused)
+    cache = get_debt_rows_cache()
+    cached = cache.get((group_name, simplify))
+    if (cached is not None and cached[0] is st.session_state.ledgers.get(group_name)
+            and cached[1] == st.session_state.groups[group_name]["version"]
+            and all(display_name(email) == name for email, name in cached[2].items())):
+        return cached[3]
+    names = {}
+
+    def name(email):
+        names[email] = display_name(email)
+        return names[email]
+
+    # Under the lock, so the version and the ledger the rows come from match
+    with shared_write():
+        version = st.session_state.groups[group_name]["version"]
+        debts = st.session_state.ledgers.get(group_name, {})
+        rows = debt_rows(simplify_ledger(debts) if simplify else ledger_debts(debts), name)
+        # Groups deleted elsewhere, e.g. by another process, since they were cached
+        for key in [key for key in list(cache) if key[0] not in st.session_state.groups]:
+            cache.pop(key, None)
+        cache[(group_name, simplify)] = (debts, version, names, rows)
+    return rows
+
+def paged(items, key, text=str, page_size=PAGE_SIZE):
+    # Render one page of a long list per rerun, with a search box over it. Always a
+    # copy: items may be a shared dict that other sessions change while this one iterates
+    items = list(items)
+    if len(items) <= page_size:
+        return items
+    query = st.text_input("Search", key=f"{key}_search", placeholder="Name or email")
+    matches = search(items, query, text)
+    pages = page_count(len(matches), page_size)
+    if pages == 1:
+        if not matches:
+            st.caption("No matches")
+        return matches
+    page_key = f"{key}_page"
+    # The list may have shrunk since the page was picked
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    st.caption(f"{len(matches)} {'match' if len(matches) == 1 else 'matches'}, page {page} of {pages}")
+    return page_slice(matches, page, page_size)
 
 # Load data at startup
 load_data()
 
-# Define the email sending function
-def send_expenses_summary_email(expenses, group_name, member_email, is_payer=False):
-    try:
-        if not st.session_state.credentials:
-            st.error("No credentials available. Please log in again.")
-            return False
-            
-        # Create message
-        message = MIMEMultipart()
-        message['to'] = member_email
-        message['from'] = st.session_state.user_email
-        message['subject'] = f'Expense Summary for {group_name}'
-
-        # Calculate totals and what this person owes/paid
-        total_amount = sum(expense['amount'] for expense in expenses)
-        person_paid = sum(expense['amount'] for expense in expenses if expense['payer_email'] == member_email)
-        person_owes = sum(expense['share'] for expense in expenses if member_email in expense['assignee_emails'] and expense['payer_email'] != member_email)
-        
-        # Create email body
-        body = f"""
-        <html>
-            <body>
-                <h2>Expense Summary for {group_name}</h2>
-                <p><strong>Date:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-        """
-        
-        if is_payer:
-            body += f"""
-                <h3>You paid a total of: ${person_paid:.2f}</h3>
-                <p>Here's what others owe you:</p>
-                <ul>
-            """
-            # Calculate what others owe this person
-            owing_summary = {}
-            for expense in expenses:
-                if expense['payer_email'] == member_email:
-                    for i, assignee_email in enumerate(expense['assignee_emails']):
-                        if assignee_email != member_email:
-                            assignee_name = expense['assignee_names'][i]
-                            if assignee_name not in owing_summary:
-                                owing_summary[assignee_name] = 0
-                            owing_summary[assignee_name] += expense['share']
-            
-            for person, amount in owing_summary.items():
-                body += f"<li><strong>{person}</strong> owes you: ${amount:.2f}</li>"
-            
-            body += "</ul>"
-        else:
-            body += f"""
-                <h3>Your Share: ${person_owes:.2f}</h3>
-                <p>Here's what you owe to others:</p>
-                <ul>
-            """
-            # Calculate what this person owes to others
-            owing_summary = {}
-            for expense in expenses:
-                if member_email in expense['assignee_emails'] and expense['payer_email'] != member_email:
-                    payer_name = expense['payer_name']
-                    if payer_name not in owing_summary:
-                        owing_summary[payer_name] = 0
-                    owing_summary[payer_name] += expense['share']
-            
-            for person, amount in owing_summary.items():
-                body += f"<li>You owe <strong>{person}</strong>: ${amount:.2f}</li>"
-            
-            body += "</ul>"
-        
-        body += """
-                <h3>Expense Details:</h3>
-                <table border="1" cellpadding="5" style="border-collapse: collapse;">
-                    <tr style="background-color: #f2f2f2;">
-                        <th>Item</th>
-                        <th>Amount</th>
-                        <th>Paid By</th>
-                        <th>Your Share</th>
-                    </tr>
-        """
-        
-        # Add relevant expenses to the table
-        for expense in expenses:
-            if member_email in expense['assignee_emails'] or expense['payer_email'] == member_email:
-                body += f"""
-                    <tr>
-                        <td>{expense['item']}</td>
-                        <td>${expense['amount']:.2f}</td>
-                        <td>{expense['payer_name']}</td>
-                        <td>${expense['share'] if member_email in expense['assignee_emails'] else expense['amount']:.2f}</td>
-                    </tr>
-                """
-        
-        body += """
-                </table>
-                <br>
-                <p>Please settle your share of the expenses.</p>
-            </body>
-        </html>
-        """
-        
-        message.attach(MIMEText(body, 'html'))
-        
-        # Encode message
-        raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        
-        # Send email using Gmail API
-        gmail_service = build('gmail', 'v1', credentials=st.session_state.credentials)
-        gmail_service.users().messages().send(
-            userId='me',
-            body={'raw': raw_message}
-        ).execute()
-        
-        return True
-    except Exception as e:
-        st.error(f"Failed to send email: {str(e)}")
-        return False
+def get_mail_dispatcher():
+    # One Gmail client per login; each send worker gets its own authorized transport
+    if st.session_state.get('mail_dispatcher') is None:
+        credentials = st.session_state.credentials
+        st.session_state.mail_dispatcher = MailDispatcher(build_gmail_service(credentials),
+                                                          authorized_http_factory(credentials),
+                                                          max_workers=MAIL_WORKERS)
+    # Let the outbox worker send as this user
+    get_mail_senders().register(st.session_state.user_email, st.session_state.mail_dispatcher)
+    return st.session_state.mail_dispatcher
 
 # CSS for better text visibility and sidebar
 st.markdown("""
@@ -405,39 +481,49 @@ st.markdown("### Split expenses with friends and family")
 # Authentication flow
 if not st.session_state.authenticated:
     st.markdown("### 🔐 Login")
-    st.markdown("Please log in with your Google account to continue.")
     
-    if st.button("Login with Google"):
-        try:
-            creds = authenticate_google()
-            if creds:
-                # Get user email
-                service = build('oauth2', 'v2', credentials=creds)
-                user_info = service.userinfo().get().execute()
-                user_email = user_info['email']
-                
-                # Update session state
-                st.session_state.authenticated = True
-                st.session_state.user_email = user_email
-                st.session_state.credentials = creds
-                
-                # Initialize user if not exists
-                if user_email not in st.session_state.users:
-                    st.session_state.users[user_email] = {
-                        "full_name": user_info.get('name', user_email),
-                        "groups": [],
-                        "expenses": []
-                    }
-                    save_data()
-                
-                st.success(f"Welcome, {st.session_state.users[user_email]['full_name']}!")
-                st.rerun()
-            else:
-                st.error("Failed to authenticate. Please make sure you have the correct credentials.json file.")
-        except Exception as e:
-            st.error(f"Authentication failed: {str(e)}")
+    login = None
+    attempted = False
+    set_browser_cookie()
+    saved_accounts = get_token_cache().accounts()
+    if saved_accounts:
+        st.markdown("Continue with an account that has logged in from this browser before, or use another Google account.")
+        for account in saved_accounts:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                if st.button(f"Continue as {account['name']} ({account['email']})", key=f"login_{account['email']}"):
+                    attempted = True
+                    try:
+                        login = silent_login(get_token_cache(), account['email'], SCOPES)
+                    except Exception as e:
+                        st.error(f"Could not refresh the saved login: {str(e)}")
+                    if login is None:
+                        # Revoked, or the app now needs more access: ask Google again
+                        login = authenticate_google(login_hint=account['email'])
+            with col2:
+                if st.button("Forget", key=f"forget_{account['email']}", help="Remove the saved login from this browser"):
+                    get_token_cache().forget(account['email'])
+                    st.rerun()
+        other_account_label = "Use another account"
+    else:
+        st.markdown("Please log in with your Google account to continue.")
+        other_account_label = "Login with Google"
+    
+    if st.button(other_account_label, key="login_google"):
+        attempted = True
+        login = authenticate_google()
+    
+    if login:
+        complete_login(*login)
+    elif attempted:
+        st.error("Failed to authenticate. Please make sure you have the correct credentials.json file.")
     st.stop()
 
+# Start the notification worker and let it send as this user
+get_outbox_worker()
+if st.session_state.credentials:
+    get_mail_dispatcher()
+
 # Sidebar for group management
 with st.sidebar:
     st.header("👥 Groups")
@@ -446,14 +532,62 @@ with st.sidebar:
     st.markdown(f"**Logged in as:** {st.session_state.users[st.session_state.user_email]['full_name']}")
     st.markdown(f"*{st.session_state.user_email}*")
     
+    # Background delivery status of this user's notification emails
+    outbox_counts = get_store().outbox_counts(st.session_state.user_email)
+    if outbox_counts:
+        queued = outbox_counts.get('pending', 0) + outbox_counts.get('sending', 0)
+        st.caption(f"Notifications: {queued} queued, {outbox_counts.get('sent', 0)} sent, "
+                   f"{outbox_counts.get('dead', 0)} failed")
+        if outbox_counts.get('dead'):
+            with st.expander("Failed notifications"):
+                for message in get_store().dead_messages(st.session_state.user_email):
+                    st.markdown(f"- {message['recipient']}: {message['last_error']}")
+                if st.button("Retry failed", key="retry_notifications"):
+                    get_store().requeue_dead_messages(st.session_state.user_email)
+                    get_outbox_worker().notify()
+                    st.rerun()
+    
+    # Where the time goes, for admins
+    if st.session_state.user_email.lower() in ADMIN_EMAILS:
+        with st.expander("⏱️ Performance"):
+            if not metrics.enabled():
+                st.caption("Metrics are off. Set SMARTSPLIT_METRICS=1 to record stage timings.")
+            else:
+                stages = metrics.summary()
+                if stages:
+                    st.dataframe(
+                        {
+                            "Stage": [row["stage"] for row in stages],
+                            "Count": [row["count"] for row in stages],
+                            "p50 ms": [row["p50"] * 1000 for row in stages],
+                            "p95 ms": [row["p95"] * 1000 for row in stages],
+                            "p99 ms": [row["p99"] * 1000 for row in stages],
+                            "Total s": [row["total"] for row in stages],
+                        },
+                        column_config={
+                            name: st.column_config.NumberColumn(format="%.1f")
+                            for name in ("p50 ms", "p95 ms", "p99 ms", "Total s")
+                        },
+                        hide_index=True,
+                    )
+                else:
+                    st.caption("No timings recorded yet.")
+                counters = metrics.counters()
+                if counters:
+                    st.caption(", ".join(f"{name}: {value}" for name, value in sorted(counters.items())))
+                st.download_button("Prometheus metrics", metrics.prometheus_text(),
+                                   file_name="smartsplit.prom", mime="text/plain")
+                if st.button("Reset metrics", key="reset_metrics"):
+                    metrics.reset()
+                    st.rerun()
+    
     # Logout button
     if st.button("Logout"):
-        # Clear all session state
+        # Clear all session state but the browser's secret for its saved logins
         for key in list(st.session_state.keys()):
-            del st.session_state[key]
-        # Remove token file to force new login
-        if os.path.exists(TOKEN_FILE):
-            os.remove(TOKEN_FILE)
+            if key != 'browser_secret':
+                del st.session_state[key]
+        # The saved token stays, so logging back in needs no browser round trip
         # Reinitialize session state
         init_session_state()
         st.rerun()
@@ -465,40 +599,61 @@ with st.sidebar:
         group_name = st.text_input("Group Name", placeholder="e.g., Friends Trip", key="new_group_name")
         if st.button("Create Group", key="add_group_button"):
             if group_name and group_name not in st.session_state.groups:
-                st.session_state.groups[group_name] = {
-                    "members": [st.session_state.user_email],
-                    "expenses": []
-                }
-                st.session_state.users[st.session_state.user_email]["groups"].append(group_name)
-                save_data()
-                st.success(f"Group '{group_name}' created!")
+                try:
+                    with shared_write():
+                        version = get_store().create_group(group_name, st.session_state.user_email)
+                        st.session_state.groups[group_name] = {
+                            "members": {st.session_state.user_email: None},
+                            "expenses": ExpenseTable(),
+                            "version": version
+                        }
+                        st.session_state.users[st.session_state.user_email]["groups"][group_name] = None
+                except ConflictError as error:
+                    reload_after_conflict(error)
+                else:
+                    st.success(f"Group '{group_name}' created!")
             elif group_name in st.session_state.groups:
                 st.error("Group name already exists!")
     
-    # Display and manage groups
-    if st.session_state.groups:
+    # Display and manage the logged-in user's groups, through the user -> groups index
+    my_groups = st.session_state.users[st.session_state.user_email]["groups"]
+    if my_groups:
         st.markdown("### Your Groups")
-        selected_group = st.selectbox("Select Group", list(st.session_state.groups.keys()), key="group_select")
+        group_names = list(my_groups)
+        if len(group_names) > PAGE_SIZE:
+            matching_groups = search(group_names, st.text_input("Search groups", key="group_search"))
+            if matching_groups:
+                group_names = matching_groups
+            else:
+                st.caption("No groups match")
+        selected_group = st.selectbox("Select Group", group_names, key="group_select")
         
         # Group management options
         with st.expander("Manage Group", expanded=True):
             # Delete group option
             if st.button("Delete Group", key="delete_group"):
                 if selected_group:
-                    # Remove group from all members
-                    for member_email in st.session_state.groups[selected_group]["members"]:
-                        if member_email in st.session_state.users:
-                            st.session_state.users[member_email]["groups"].remove(selected_group)
-                    # Delete the group
-                    del st.session_state.groups[selected_group]
-                    save_data()
-                    st.success(f"Group '{selected_group}' deleted!")
-                    st.rerun()
+                    try:
+                        with shared_write():
+                            get_store().delete_group(selected_group, st.session_state.groups[selected_group]["version"])
+                            # Remove group from all members
+                            for member_email in st.session_state.groups[selected_group]["members"]:
+                                if member_email in st.session_state.users:
+                                    st.session_state.users[member_email]["groups"].pop(selected_group, None)
+                            # Delete the group
+                            del st.session_state.groups[selected_group]
+                            st.session_state.ledgers.pop(selected_group, None)
+                            forget_debt_rows(selected_group)
+                    except ConflictError as error:
+                        reload_after_conflict(error)
+                    else:
+                        st.success(f"Group '{selected_group}' deleted!")
+                        st.rerun()
             
             # Show existing members
             if st.session_state.groups[selected_group]["members"]:
                 st.markdown("#### Members")
-                for member_email in st.session_state.groups[selected_group]["members"]:
+                for member_email in paged(st.session_state.groups[selected_group]["members"], "members", member_label):
                     col1, col2 = st.columns([3, 1])
                     with col1:
                         member_name = st.session_state.users[member_email]["full_name"]
@@ -506,17 +661,23 @@ with st.sidebar:
                     with col2:
                         if member_email != st.session_state.user_email:  # Can't remove yourself
                             if st.button("Remove", key=f"remove_{member_email}"):
-                                # Remove member from group
-                                st.session_state.groups[selected_group]["members"].remove(member_email)
-                                # Remove group from member's groups
-                                st.session_state.users[member_email]["groups"].remove(selected_group)
-                                save_data()
-                                st.success(f"Removed {member_name} from the group!")
-                                st.rerun()
+                                try:
+                                    with shared_write():
+                                        group = st.session_state.groups[selected_group]
+                                        group["version"] = get_store().remove_member(selected_group, member_email, group["version"])
+                                        # Remove member from group
+                                        del group["members"][member_email]
+                                        # Remove group from member's groups
+                                        st.session_state.users[member_email]["groups"].pop(selected_group, None)
+                                except ConflictError as error:
+                                    reload_after_conflict(error)
+                                else:
+                                    st.success(f"Removed {member_name} from the group!")
+                                    st.rerun()
         
         # Add a section to update member names
         with st.expander("Update Member Names"):
-            for member_email in st.session_state.groups[selected_group]["members"]:
+            for member_email in paged(st.session_state.groups[selected_group]["members"], "rename_members", member_label):
                 current_name = st.session_state.users[member_email]["full_name"]
                 col1, col2 = st.columns([2, 1])
                 with col1:
@@ -526,8 +687,9 @@ with st.sidebar:
                 with col2:
                     if st.button("Update", key=f"update_btn_{member_email}"):
                         if new_name != current_name:
-                            st.session_state.users[member_email]["full_name"] = new_name
-                            save_data()
+                            with shared_write():
+                                get_store().save_user(member_email, new_name)
+                                st.session_state.users[member_email]["full_name"] = new_name
                             st.success(f"Updated name for {member_email} to {new_name}")
                             st.rerun()
         
@@ -542,21 +704,26 @@ with st.sidebar:
         if st.button("Add Member", key="add_member_button"):
             if member_email and member_name:
                 if member_email not in st.session_state.groups[selected_group]["members"]:
-                    # If user doesn't exist in our system yet, create a new entry
-                    if member_email not in st.session_state.users:
-                        st.session_state.users[member_email] = {
-                            "full_name": member_name,
-                            "groups": [selected_group],
-                            "expenses": []
-                        }
+                    try:
+                        with shared_write():
+                            group = st.session_state.groups[selected_group]
+                            group["version"] = get_store().add_member(selected_group, member_email, member_name, group["version"])
+                            # If user doesn't exist in our system yet, create a new entry
+                            if member_email not in st.session_state.users:
+                                st.session_state.users[member_email] = {
+                                    "full_name": member_name,
+                                    "groups": {selected_group: None},
+                                    "expenses": []
+                                }
+                            else:
+                                st.session_state.users[member_email]["groups"][selected_group] = None
+                            
+                            # Add to group
+                            group["members"][member_email] = None
+                    except ConflictError as error:
+                        reload_after_conflict(error)
                     else:
-                        if selected_group not in st.session_state.users[member_email]["groups"]:
-                            st.session_state.users[member_email]["groups"].append(selected_group)
-                    
-                    # Add to group
-                    st.session_state.groups[selected_group]["members"].append(member_email)
-                    save_data()
-                    st.success(f"Added '{member_name}' to '{selected_group}'")
+                        st.success(f"Added '{member_name}' to '{selected_group}'")
                 else:
                     st.error("Member already in group")
             else:
@@ -571,42 +738,33 @@ if 'selected_group' in locals() and selected_group:
         if st.session_state.groups[selected_group]["expenses"]:
             st.markdown("### Who Owes Whom")
             
-            # Calculate who owes whom
-            debts = {}
-            for expense in st.session_state.groups[selected_group]["expenses"]:
-                payer_email = expense['payer']
-                payer_name = st.session_state.users[payer_email]["full_name"]
-                
-                for assignee_email in expense['assignees']:
-                    if assignee_email != payer_email:  # Don't count if someone owes themselves
-                        assignee_name = st.session_state.users[assignee_email]["full_name"]
-                        
-                        if assignee_email not in debts:
-                            debts[assignee_email] = {}
-                        
-                        if payer_email not in debts[assignee_email]:
-                            debts[assignee_email][payer_email] = 0
-                        
-                        debts[assignee_email][payer_email] += expense['share']
+            # Balances are maintained incrementally as expenses are saved
+            debts = st.session_state.ledgers.get(selected_group, {})
+            
+            simplify = st.checkbox("Simplify debts", key="simplify_debts",
+                                   help="Net out balances and settle with the fewest transfers")
             
-            # Display the summary
+            # One table for all debts, however many members the group has
             if debts:
-                for debtor_email, owes_to in debts.items():
-                    debtor_name = st.session_state.users[debtor_email]["full_name"]
-                    total_owed = sum(owes_to.values())
-                    
-                    st.markdown(f"""
-                    <div style='background-color: #f8f9fa; padding: 0.5rem; border-radius: 8px; margin-bottom: 0.5rem; font-size: 0.9rem;'>
-                        <p style='margin: 0;'><strong>{debtor_name}</strong> owes a total of <strong>${total_owed:.2f}</strong>:</p>
-                    """, unsafe_allow_html=True)
-                    
-                    for creditor_email, amount in owes_to.items():
-                        creditor_name = st.session_state.users[creditor_email]["full_name"]
-                        st.markdown(f"""
-                        <div style='padding-left: 1rem; font-size: 0.85rem;'>
-                            • ${amount:.2f} to {creditor_name}
-                        </div>
-                        """, unsafe_allow_html=True)
+                with metrics.timer("debts.rows"):
+                    rows = group_debt_rows(selected_group, simplify)
+                if rows:
+                    noun = "transfer" if simplify else "debt"
+                    st.caption(f"{len(rows)} {noun}{'' if len(rows) == 1 else 's'}, "
+                               f"{format_cents(sum(row[2] for row in rows))} in total")
+                    page = paged(rows, "debts", lambda row: f"{row[0]} {row[1]}", TABLE_PAGE_SIZE)
+                    st.dataframe(
+                        {
+                            "Owed by": [row[0] for row in page],
+                            "Owed to": [row[1] for row in page],
+                            # Dollars for display only; sorting works on the numbers
+                            "Amount": [row[2] / 100 for row in page],
+                        },
+                        column_config={"Amount": st.column_config.NumberColumn(format="$%.2f")},
+                        hide_index=True,
+                    )
+                else:
+                    st.info("Everyone is settled up.")
             else:
                 st.info("No debts to show.")
         else:
@@ -614,132 +772,136 @@ if 'selected_group' in locals() and selected_group:
     
     # Upload and process receipt
     with st.expander("Add New Expense", expanded=True):
-        uploaded_file = st.file_uploader("Upload Receipt", type=['png', 'jpg', 'jpeg'])
-        if uploaded_file is not None:
-            image = Image.open(uploaded_file)
-            # Resize image to a reasonable width while maintaining aspect ratio
-            max_width = 400
-            ratio = max_width / image.width
-            new_height = int(image.height * ratio)
-            image = image.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            st.image(image, caption="Uploaded Receipt", width=max_width)
+        uploaded_files = st.file_uploader("Upload Receipts", type=['png', 'jpg', 'jpeg'], accept_multiple_files=True)
+        if uploaded_files:
+            # Image handling is only loaded once there is a receipt to look at
+            from PIL import Image
+            from smartsplit.imaging import preprocess
+            
+            images = {}
+            receipt_names = {}
+            image_columns = st.columns(min(len(uploaded_files), 4))
+            for i, uploaded_file in enumerate(uploaded_files):
+                images[i] = (Image.open(uploaded_file), uploaded_file.size)
+                receipt_names[i] = uploaded_file.name
+                # Resize image for display to a reasonable width while maintaining aspect ratio
+                image = images[i][0]
+                max_width = 400
+                ratio = max_width / image.width
+                new_height = int(image.height * ratio)
+                image = image.resize((max_width, new_height), Image.Resampling.LANCZOS)
+                with image_columns[i % len(image_columns)]:
+                    st.image(image, caption=uploaded_file.name, width=max_width)
         
             if st.button("Extract Items"):
-                with st.spinner("Processing receipt..."):
-                    try:
-                        # Initialize Gemini model
-                        model = genai.GenerativeModel('gemini-1.5-flash-latest')
-                        response = model.generate_content([
-                            """Extract items, prices, and tax information from this receipt. 
-                            Look for:
-                            1. Individual items and their prices
-                            2. Subtotal amount
-                            3. Tax amounts (C-taxable, A-taxable, etc.)
-                            4. Total amount
-                            
-                            Format the response as:
-                            ITEMS:
-                            Item1: $Price1
-                            Item2: $Price2
-                            ...
-                            
-                            TAXES:
-                            C-taxable: $Amount
-                            A-taxable: $Amount
-                            ...
-                            
-                            TOTALS:
-                            Subtotal: $Amount
-                            Total: $Amount""",
-                            image
-                        ])
-                        
-                        # Parse the response
-                        items = []
-                        taxes = {}
-                        subtotal = 0
-                        total = 0
-                        
-                        current_section = None
-                        for line in response.text.split('\n'):
-                            line = line.strip()
-                            if not line:
-                                continue
-                                
-                            if line == "ITEMS:":
-                                current_section = "items"
-                                continue
-                            elif line == "TAXES:":
-                                current_section = "taxes"
+                cache = get_receipt_cache()
+                try:
+                    extractor = get_extractor()
+                except ExtractorUnavailable as e:
+                    st.error(f"Receipt extraction is unavailable: {str(e)}")
+                    st.stop()
+                
+                # One slot per receipt, filled in as each extraction finishes
+                placeholders = {i: st.empty() for i in images}
+                for i, placeholder in placeholders.items():
+                    placeholder.info(f"Waiting for {receipt_names[i]}...")
+                
+                def prepare(job):
+                    # Shrink the full-resolution upload before it is hashed and sent
+                    i, (image, size) = job
+                    return i, preprocess(image, size)
+                
+                def extract(job):
+                    i, prepared = job
+                    found = []
+                    
+                    def show_item(item):
+                        # Called from the worker as the model's reply streams in
+                        found.append(item)
+                        placeholders[i].info(f"Reading {receipt_names[i]}... {len(found)} item(s) so far, "
+                                             f"latest: {item['name']} ({format_cents(item['price'])})")
+                    
+                    # Identical images skip the model call entirely
+                    receipt = cache.get_or_extract(prepared.image, lambda _: extractor.extract(prepared, show_item),
+                                                   extractor.prompt, extractor.cache_id)
+                    return prepared, receipt
+                
+                # Let the workers update their placeholders
+                script_ctx = get_script_run_ctx()
+                
+                def attach_ctx():
+                    add_script_run_ctx(threading.current_thread(), script_ctx)
+                
+                all_items = []
+                jobs = {i: (i, upload) for i, upload in images.items()}
+                with st.spinner(f"Processing {len(images)} receipt(s)..."):
+                    for i, result, error in extract_many(jobs, extract, max_workers=EXTRACTION_WORKERS,
+                                                         throttle=Throttle(GEMINI_REQUESTS_PER_MINUTE),
+                                                         prepare=prepare, initializer=attach_ctx):
+                        with placeholders[i].container():
+                            if error is not None:
+                                st.error(f"Error processing {receipt_names[i]}: {str(error)}")
                                 continue
-                            elif line == "TOTALS:":
-                                current_section = "totals"
+                            prepared, receipt = result
+                            st.caption(f"Sent {len(prepared.data) / 1024:.0f} KB instead of "
+                                       f"{prepared.original_bytes / 1024:.0f} KB "
+                                       f"(preprocessed in {prepared.seconds * 1000:.0f} ms)")
+                            if not receipt["items"]:
+                                st.error(f"No items found in {receipt_names[i]}")
                                 continue
                             
-                            if current_section == "items" and ':' in line and '$' in line:
-                                name, price = line.split(':')
-                                price = float(price.strip().replace('$', ''))
-                                items.append({"name": name.strip(), "price": price})
-                            elif current_section == "taxes" and ':' in line and '$' in line:
-                                tax_type, amount = line.split(':')
-                                amount = float(amount.strip().replace('$', ''))
-                                taxes[tax_type.strip()] = amount
-                            elif current_section == "totals" and ':' in line and '$' in line:
-                                total_type, amount = line.split(':')
-                                amount = float(amount.strip().replace('$', ''))
-                                if "subtotal" in total_type.lower():
-                                    subtotal = amount
-                                elif "total" in total_type.lower():
-                                    total = amount
-                        
-                        # Use total amount if available, otherwise use subtotal
-                        final_amount = total if total > 0 else subtotal
-                        
-                        if items:
-                            # Adjust item prices proportionally to match the final amount
-                            items_total = sum(item['price'] for item in items)
-                            if items_total > 0:
-                                ratio = final_amount / items_total
-                                for item in items:
-                                    item['price'] = round(item['price'] * ratio, 2)
+                            taxes = receipt["taxes"]
+                            subtotal = receipt["subtotal"]
+                            final_amount = amount_due(receipt)
                             
-                            st.session_state.current_items = items
-                            st.session_state.total_amount = final_amount
+                            # Adjust item prices proportionally to match the final amount,
+                            # allocating leftover cents so they add up to it exactly
+                            items = scale_items(receipt["items"], final_amount)
+                            if len(images) > 1:
+                                # Keep item names unique across receipts
+                                for item in items:
+                                    item['name'] = f"{item['name']} ({receipt_names[i]})"
+                            all_items.extend(items)
                             
                             # Show amounts in a clear order
-                            st.markdown("### Receipt Summary")
+                            st.markdown(f"### Receipt Summary: {receipt_names[i]}")
                             
                             # Show subtotal
-                            st.markdown(f"#### Subtotal: ${subtotal:.2f}")
+                            st.markdown(f"#### Subtotal: {format_cents(subtotal)}")
                             
                             # Show tax breakdown
                             if taxes:
                                 st.markdown("#### Tax Breakdown:")
                                 total_tax = 0
                                 for tax_type, amount in taxes.items():
-                                    st.markdown(f"- {tax_type}: ${amount:.2f}")
+                                    st.markdown(f"- {tax_type}: {format_cents(amount)}")
                                     total_tax += amount
-                                st.markdown(f"**Total Tax:** ${total_tax:.2f}")
+                                st.markdown(f"**Total Tax:** {format_cents(total_tax)}")
                             
                             # Show final total
-                            st.markdown(f"#### Total Amount: ${final_amount:.2f}")
+                            st.markdown(f"#### Total Amount: {format_cents(final_amount)}")
                             
                             # Show items
                             st.markdown("### Items")
                             for item in items:
-                                st.markdown(f"- {item['name']}: ${item['price']:.2f}")
-                        else:
-                            st.error("No items found in the receipt")
-                    except Exception as e:
-                        st.error(f"Error processing receipt: {str(e)}")
+                                st.markdown(f"- {item['name']}: {format_cents(item['price'])}")
+                
+                if all_items:
+                    st.session_state.current_items = all_items
+                    st.session_state.total_amount = sum(item['price'] for item in all_items)
+            
+            cache_stats = get_receipt_cache().stats()
+            st.caption(f"Extraction cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                       f"{cache_stats['entries']} receipts stored")
 
     # Expense management
     if 'current_items' in st.session_state:
         st.subheader("Split Expenses")
         
         # Create a mapping of emails to names and names to emails for selection
-        email_to_name = {email: st.session_state.users[email]["full_name"] for email in st.session_state.groups[selected_group]["members"]}
-        name_to_email = {st.session_state.users[email]["full_name"]: email for email in st.session_state.groups[selected_group]["members"]}
+        group_members = list(st.session_state.groups[selected_group]["members"])
+        email_to_name = {email: st.session_state.users[email]["full_name"] for email in group_members}
+        name_to_email = {st.session_state.users[email]["full_name"]: email for email in group_members}
         member_names = list(name_to_email.keys())
         
         # Ask who paid before processing items
@@ -751,7 +913,7 @@ if 'selected_group' in locals() and selected_group:
             st.session_state.pending_expenses = []
         
         for i, item in enumerate(st.session_state.current_items):
-            with st.expander(f"{item['name']} - ${item['price']}", expanded=True):
+            with st.expander(f"{item['name']} - {format_cents(item['price'])}", expanded=True):
                 st.markdown("#### Split between:")
                 assignee_names = st.multiselect(
                     "Select people to split with",
@@ -764,8 +926,13 @@ if 'selected_group' in locals() and selected_group:
                 assignee_emails = [name_to_email[name] for name in assignee_names]
                 
                 if assignee_names:
-                    share = item['price'] / len(assignee_emails)
-                    st.markdown(f"**Each person owes:** ${share:.2f}")
+                    shares = split_evenly(item['price'], len(assignee_emails))
+                    if len(set(shares)) == 1:
+                        st.markdown(f"**Each person owes:** {format_cents(shares[0])}")
+                    else:
+                        # The leftover cents go to the first people selected
+                        owed = ", ".join(f"{name} {format_cents(share)}" for name, share in zip(assignee_names, shares))
+                        st.markdown(f"**Each person owes:** {owed}")
                     
                     # Automatically add to pending expenses when assignees are selected
                     expense = {
@@ -776,7 +943,7 @@ if 'selected_group' in locals() and selected_group:
                         "payer_name": payer_name,
                         "assignee_emails": assignee_emails,
                         "assignee_names": assignee_names,
-                        "share": share,
+                        "shares": shares,
                         "date": datetime.now().isoformat()
                     }
                     
@@ -790,6 +957,9 @@ if 'selected_group' in locals() and selected_group:
                             break
                     
                     if not item_exists:
+                        if not st.session_state.pending_expenses:
+                            # The group as it was when these expenses were entered
+                            st.session_state.pending_version = st.session_state.groups[selected_group]["version"]
                         st.session_state.pending_expenses.append(expense)
                         st.success(f"{item['name']} added to pending expenses")
                         st.rerun()
@@ -798,39 +968,23 @@ if 'selected_group' in locals() and selected_group:
         if st.session_state.pending_expenses:
             st.markdown("### Pending Expenses Summary")
             with st.container():
+                # Per-person totals for the summary and the emails, in one pass
+                pending_plan = plan_fanout(st.session_state.pending_expenses)
+                
                 st.markdown("#### Total Amount")
-                total_amount = sum(item["amount"] for item in st.session_state.pending_expenses)
-                st.markdown(f"**${total_amount:.2f}**")
+                total_amount = sum(expense['amount'] for expense in st.session_state.pending_expenses)
+                st.markdown(f"**{format_cents(total_amount)}**")
                 
                 st.markdown("#### Amount paid by each person")
-                payer_summary = {}
-                for exp in st.session_state.pending_expenses:
-                    payer_name = exp['payer_name']
-                    if payer_name not in payer_summary:
-                        payer_summary[payer_name] = 0
-                    payer_summary[payer_name] += exp['amount']
-                
-                for payer, amount in payer_summary.items():
-                    percentage = (amount / total_amount) * 100 if total_amount > 0 else 0
-                    st.markdown(f"• {payer}: ${amount:.2f} ({percentage:.1f}% of total)")
+                for email, summary in pending_plan.items():
+                    if summary.paid:
+                        percentage = (summary.paid / total_amount) * 100 if total_amount > 0 else 0
+                        st.markdown(f"• {st.session_state.users[email]['full_name']}: {format_cents(summary.paid)} ({percentage:.1f}% of total)")
                 
                 st.markdown("#### What each person owes")
-                owing_summary = {}
-                for expense in st.session_state.pending_expenses:
-                    for i, assignee_email in enumerate(expense['assignee_emails']):
-                        assignee_name = expense['assignee_names'][i]
-                        if assignee_email != expense['payer_email']:
-                            if assignee_name not in owing_summary:
-                                owing_summary[assignee_name] = {}
-                            
-                            if expense['payer_name'] not in owing_summary[assignee_name]:
-                                owing_summary[assignee_name][expense['payer_name']] = 0
-                            
-                            owing_summary[assignee_name][expense['payer_name']] += expense['share']
-                
-                for person, owes_to in owing_summary.items():
-                    for creditor, amount in owes_to.items():
-                        st.markdown(f"• {person} owes {creditor}: ${amount:.2f}")
+                for email, summary in pending_plan.items():
+                    for creditor, amount in summary.owes_to.items():
+                        st.markdown(f"• {st.session_state.users[email]['full_name']} owes {st.session_state.users[creditor]['full_name']}: {format_cents(amount)}")
                 
                 # Save All and Clear buttons
                 col1, col2 = st.columns([1, 1])
@@ -843,7 +997,7 @@ if 'selected_group' in locals() and selected_group:
                                 # Create a copy of pending expenses to work with
                                 pending_expenses_copy = st.session_state.pending_expenses.copy()
                                 
-                                # Save all expenses at once
+                                # Convert to the stored expense format
                                 all_storage_expenses = []
                                 for expense in pending_expenses_copy:
                                     storage_expense = {
@@ -852,44 +1006,75 @@ if 'selected_group' in locals() and selected_group:
                                         "amount": expense["amount"],
                                         "payer": expense["payer_email"],
                                         "assignees": expense["assignee_emails"],
-                                        "share": expense["share"],
+                                        "shares": expense["shares"],
                                         "date": expense["date"]
                                     }
                                     all_storage_expenses.append(storage_expense)
                                 
-                                # Add all expenses to the group at once
-                                st.session_state.groups[selected_group]["expenses"].extend(all_storage_expenses)
-                                save_data()
-                                
-                                # Prepare and send all emails at once
-                                member_expenses_map = {}
-                                for member_email in st.session_state.groups[selected_group]["members"]:
-                                    member_expenses = [
-                                        expense for expense in pending_expenses_copy
-                                        if member_email in expense['assignee_emails'] or member_email == expense['payer_email']
-                                    ]
-                                    if member_expenses:
-                                        member_expenses_map[member_email] = member_expenses
-                                
-                                # Send all emails
-                                for member_email, member_expenses in member_expenses_map.items():
-                                    is_payer = any(expense['payer_email'] == member_email for expense in member_expenses)
-                                    send_expenses_summary_email(
-                                        member_expenses,
+                                # Prepare all emails at once from the per-member plan
+                                # Other sessions may add users or members meanwhile; iterate copies
+                                outbox = []
+                                names = {email: user["full_name"] for email, user in list(st.session_state.users.items())}
+                                sent_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+                                for member_email in list(st.session_state.groups[selected_group]["members"]):
+                                    summary = pending_plan.get(member_email)
+                                    if summary is None:
+                                        continue
+                                    message = build_summary_message(
+                                        st.session_state.user_email,
+                                        summary,
                                         selected_group,
-                                        member_email,
-                                        is_payer
+                                        names,
+                                        sent_at,
+                                        plain_text=EMAIL_PLAIN_TEXT
                                     )
+                                    outbox.append(outbox_message(st.session_state.user_email, member_email, message,
+                                                                 [row.id for row in summary.rows]))
                                 
-                                # Clear all pending expenses at once
-                                st.session_state.pending_expenses = []
-                                
-                                st.success("All expenses saved and notifications sent!")
+                                # Save the expenses and queue their emails in one transaction;
+                                # the outbox worker sends them in the background
+                                participants = set(pending_plan)
+                                try:
+                                    with shared_write() as shared:
+                                        try:
+                                            version = get_store().add_expenses(
+                                                selected_group, all_storage_expenses, outbox,
+                                                expected_version=st.session_state.get('pending_version')
+                                            )
+                                        except ConflictError:
+                                            # Others' expenses don't change these; only a changed membership does
+                                            shared.refresh(force=True)
+                                            use_shared_data(shared)
+                                            group = st.session_state.groups.get(selected_group)
+                                            if group is None or not participants <= group["members"].keys():
+                                                raise
+                                            version = get_store().add_expenses(
+                                                selected_group, all_storage_expenses, outbox,
+                                                expected_version=group["version"]
+                                            )
+                                        group = st.session_state.groups[selected_group]
+                                        group["version"] = version
+                                        group["expenses"].extend(all_storage_expenses)
+                                        apply_expenses(st.session_state.ledgers.setdefault(selected_group, {}), all_storage_expenses)
+                                except ConflictError as error:
+                                    reload_after_conflict(error)
+                                else:
+                                    get_outbox_worker().notify()
+                                    
+                                    # Clear all pending expenses at once
+                                    st.session_state.pending_expenses = []
+                                    st.session_state.pop('pending_version', None)
+                                    
+                                    st.success("All expenses saved! Notifications are being sent in the background.")
                 
                 with col2:
                     if st.button("Clear Pending", key="clear_pending"):
                         st.session_state.pending_expenses = []
+                        st.session_state.pop('pending_version', None)
 
 # Footer
 st.markdown("---")
-st.markdown('<p style="text-align: center; color: #2c3e50;">Made with ❤️ using Gemini Vision | <a href="https://github.com/patchy631/ai-engineering-hub/issues">Report an Issue</a></p>', unsafe_allow_html=True)
\ No newline at end of file
+st.markdown('<p style="text-align: center; color: #2c3e50;">Made with ❤️ using Gemini Vision | <a href="https://github.com/patchy631/ai-engineering-hub/issues">Report an Issue</a></p>', unsafe_allow_html=True)
+
+# A full logged-in rerun; reruns cut short by st.rerun() are not recorded
+metrics.observe("rerun", time.perf_counter() - RERUN_START)
\ No newline at end of file
@@ -0,0 +1,3 @@
+"""Benchmarks for SmartSplit. Run them from the repository root, e.g.
+``python -m benchmarks.bench_rerun``. ``python -m benchmarks.suite`` runs
+the main stages together and saves or compares JSON results across commits."""
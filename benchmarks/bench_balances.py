@@ -0,0 +1,100 @@
+"""Vectorized balance matrix against the per-expense Python loop.
+
+One random dataset honouring ``--members`` and ``--max-assignees`` is
+timed three ways: in an ``ExpenseTable``, which is what ``Store.load`` returns
+and what ``build_ledger`` vectorizes, as the aggregation alone on the NumPy
+columns, and as expense dicts through the Python loop, which ``build_ledger``
+keeps for dicts because converting them to columns costs more than it saves.
+
+    python -m benchmarks.bench_balances --rows 1000000 --members 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from smartsplit.columnar import ExpenseColumns, matrix_to_ledger
+from smartsplit.expense_table import ExpenseTable
+from smartsplit.ledger import apply_expenses, build_ledger
+
+
+def random_columns(rows, members, max_assignees, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, max_assignees + 1, size=rows)
+    offsets = np.zeros(rows + 1, dtype=np.int64)
+    np.cumsum(sizes, out=offsets[1:])
+    amount = rng.integers(100, 20000, size=rows)
+    # Equal split in cents; the remainder is dropped, which is fine for timing
+    share = np.repeat(amount // sizes, sizes)
+    return ExpenseColumns(
+        members=[f"user{i}@example.com" for i in range(members)],
+        payer=rng.integers(0, members, size=rows),
+        amount=amount,
+        offsets=offsets,
+        assignee=rng.integers(0, members, size=int(offsets[-1])),
+        share=share,
+    )
+
+
+def to_expenses(columns, rows):
+    """The first ``rows`` of ``columns`` as the app's expense dicts."""
+    members = columns.members
+    expenses = []
+    for row in range(rows):
+        start, end = int(columns.offsets[row]), int(columns.offsets[row + 1])
+        expenses.append({
+            "id": str(row),
+            "item": "Item",
+            "amount": int(columns.amount[row]),
+            "payer": members[columns.payer[row]],
+            "assignees": [members[i] for i in columns.assignee[start:end]],
+            "shares": columns.share[start:end].tolist(),
+            "date": "2024-01-01T00:00:00",
+        })
+    return expenses
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--members", type=int, default=50)
+    parser.add_argument("--max-assignees", type=int, default=4)
+    parser.add_argument("--python-rows", type=int, default=100_000,
+                        help="rows for the comparison with the Python loop")
+    args = parser.parse_args()
+
+    columns = random_columns(args.rows, args.members, args.max_assignees)
+    print(f"{args.rows} rows, {len(columns.assignee)} shares, {args.members} members")
+    table = ExpenseTable(to_expenses(columns, args.rows))
+    _, table_ms = timed(lambda: build_ledger(table))
+    _, from_table_ms = timed(lambda: ExpenseColumns.from_table(table))
+    print("  in an ExpenseTable, as Store.load returns them")
+    print(f"    build_ledger:   {table_ms:9.1f} ms  (end to end)")
+    print(f"    from_table:     {from_table_ms:9.1f} ms")
+    del table
+
+    _, matrix_ms = timed(columns.balance_matrix)
+    _, ledger_ms = timed(lambda: matrix_to_ledger(columns.balance_matrix(), columns.members))
+    _, paid_ms = timed(columns.paid_totals)
+    print("  on prebuilt columns (no conversion)")
+    print(f"    balance_matrix: {matrix_ms:9.1f} ms")
+    print(f"    with ledger:    {ledger_ms:9.1f} ms  (balance_matrix + matrix_to_ledger)")
+    print(f"    paid_totals:    {paid_ms:9.1f} ms")
+
+    python_rows = min(args.python_rows, args.rows)
+    expenses = to_expenses(columns, python_rows)
+    _, loop_ms = timed(lambda: apply_expenses({}, expenses))
+    _, convert_ms = timed(lambda: ExpenseColumns.from_expenses(expenses))
+    print(f"  first {python_rows} rows as expense dicts")
+    print(f"    Python loop:    {loop_ms:9.1f} ms  (what build_ledger runs for dicts)")
+    print(f"    from_expenses:  {convert_ms:9.1f} ms  (conversion alone)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Summary email fan-out: per-member concatenation against one-pass planning
+and compiled templates.
+
+Renders one summary per member for a group of ``--members`` people sharing
+``--expenses`` expenses. The concatenation variant reproduces the previous
+path: filter the expenses for every member, then three aggregation passes
+and ``body +=`` per email.
+
+    python -m benchmarks.bench_email --members 1000 --expenses 500
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from smartsplit.columnar import ExpenseColumns
+from smartsplit.emails import build_summary_message, get_environment, plan_fanout, render_summary
+from smartsplit.money import format_cents, split_evenly
+
+DATE = "2024-01-01 12:00"
+
+
+def generate(members, expenses, max_assignees, seed=0):
+    rng = random.Random(seed)
+    emails = [f"user{i}@example.com" for i in range(members)]
+    names = {email: f"User {i}" for i, email in enumerate(emails)}
+    pending = []
+    for i in range(expenses):
+        payer = rng.choice(emails)
+        assignees = rng.sample(emails, rng.randint(1, max_assignees))
+        amount = rng.randint(100, 20000)
+        pending.append({
+            "id": str(i), "item": f"Item {i}", "amount": amount,
+            "payer_email": payer, "payer_name": names[payer],
+            "assignee_emails": assignees, "assignee_names": [names[a] for a in assignees],
+            "shares": split_evenly(amount, len(assignees)), "date": DATE,
+        })
+    return emails, names, pending
+
+
+def render_concat(expenses, group_name, member_email, names):
+    is_payer = any(expense['payer_email'] == member_email for expense in expenses)
+    columns = ExpenseColumns.from_expenses(expenses, members=[member_email],
+                                           payer_key='payer_email', assignees_key='assignee_emails')
+    balances = columns.balance_matrix()
+    person_paid = columns.paid_totals()[0]
+    person_owes = balances[0].sum()
+    body = f"<html><body><h2>Expense Summary for {group_name}</h2><p><strong>Date:</strong> {DATE}</p>"
+    if is_payer:
+        body += f"<h3>You paid a total of: {format_cents(person_paid)}</h3><p>Here's what others owe you:</p><ul>"
+        for debtor in np.flatnonzero(balances[:, 0]):
+            body += f"<li><strong>{names[columns.members[debtor]]}</strong> owes you: {format_cents(balances[debtor, 0])}</li>"
+        body += "</ul>"
+    else:
+        body += f"<h3>Your Share: {format_cents(person_owes)}</h3><p>Here's what you owe to others:</p><ul>"
+        for creditor in np.flatnonzero(balances[0]):
+            body += f"<li>You owe <strong>{names[columns.members[creditor]]}</strong>: {format_cents(balances[0, creditor])}</li>"
+        body += "</ul>"
+    body += "<h3>Expense Details:</h3><table><tr><th>Item</th><th>Amount</th><th>Paid By</th><th>Your Share</th></tr>"
+    for expense in expenses:
+        if member_email in expense['assignee_emails'] or expense['payer_email'] == member_email:
+            share = (expense['shares'][expense['assignee_emails'].index(member_email)]
+                     if member_email in expense['assignee_emails'] else expense['amount'])
+            body += (f"<tr><td>{expense['item']}</td><td>{format_cents(expense['amount'])}</td>"
+                     f"<td>{expense['payer_name']}</td><td>{format_cents(share)}</td></tr>")
+    return body + "</table><p>Please settle your share of the expenses.</p></body></html>"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=1000)
+    parser.add_argument("--expenses", type=int, default=500)
+    parser.add_argument("--max-assignees", type=int, default=20)
+    args = parser.parse_args()
+
+    emails, names, pending = generate(args.members, args.expenses, args.max_assignees)
+    plan = plan_fanout(pending)
+    print(f"{len(plan)} recipients, {args.expenses} expenses, "
+          f"{sum(len(summary.rows) for summary in plan.values()) / len(plan):.1f} expenses per email")
+
+    start = time.perf_counter()
+    get_environment().get_template("summary.html")
+    get_environment().get_template("summary.txt")
+    print(f"{'template load':<24} {(time.perf_counter() - start) * 1000:>8.1f} ms (once per process)")
+
+    def concat():
+        for email in emails:
+            member_expenses = [expense for expense in pending
+                               if email in expense['assignee_emails'] or email == expense['payer_email']]
+            if member_expenses:
+                render_concat(member_expenses, "Trip", email, names)
+
+    def templates(plain_text):
+        for summary in plan_fanout(pending).values():
+            render_summary(summary, "Trip", names, DATE, plain_text=plain_text)
+
+    def messages():
+        for summary in plan_fanout(pending).values():
+            build_summary_message("me@example.com", summary, "Trip", names, DATE).as_string()
+
+    start = time.perf_counter()
+    plan_fanout(pending)
+    print(f"{'plan_fanout alone':<24} {(time.perf_counter() - start) * 1000:>8.1f} ms")
+    runs = [
+        ("concat + columnar", concat),
+        ("plan + html", lambda: templates(False)),
+        ("plan + html + text", lambda: templates(True)),
+        ("plan + MIME message", messages),
+    ]
+    for label, run in runs:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} {elapsed * 1000:>8.1f} ms  {elapsed / len(plan) * 1e6:>7.0f} us/email")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Notification delivery: serial sends against the pool and batch dispatchers.
+
+Runs against the local fake Gmail service, with ``--latency`` seconds per
+round trip standing in for the network.
+
+    python -m benchmarks.bench_mail --recipients 30 --latency 0.3
+"""
+import argparse
+import time
+from email.mime.text import MIMEText
+
+from smartsplit.fakes import FakeGmailService
+from smartsplit.mail import MailDispatcher
+
+
+def make_messages(count):
+    messages = {}
+    for i in range(count):
+        message = MIMEText(f"<p>Summary {i}</p>", 'html')
+        message['to'] = f"user{i}@example.com"
+        message['subject'] = "Expense Summary"
+        messages[message['to']] = message
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--recipients", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per Gmail round trip")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    messages = make_messages(args.recipients)
+
+    def serial(dispatcher):
+        for recipient, message in messages.items():
+            dispatcher.send(message)
+            yield recipient, None, None
+
+    runs = [
+        ("serial", serial),
+        (f"pool x{args.workers}", lambda dispatcher: dispatcher.send_many(messages)),
+        ("batch", lambda dispatcher: dispatcher.send_batch(messages)),
+    ]
+    print(f"{args.recipients} recipients, {args.latency * 1000:.0f} ms per round trip")
+    for label, run in runs:
+        service = FakeGmailService(latency=args.latency)
+        dispatcher = MailDispatcher(service, max_workers=args.workers)
+        start = time.perf_counter()
+        failed = sum(error is not None for _, _, error in run(dispatcher))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<10} {elapsed:>7.2f} s  sent {len(service.sent)}  failed {failed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Membership operations: lists against the insertion-ordered set index.
+
+Times ``contains``, add and remove on one group's members, and deleting a
+group (dropping it from every member's groups), with each user belonging to
+``--groups-per-user`` groups.
+
+    python -m benchmarks.bench_membership --members 100 1000 10000
+"""
+import argparse
+import timeit
+
+
+def list_ops(members, groups_per_user):
+    emails = [f"user{i}@example.com" for i in range(members)]
+    group_lists = {email: [f"Group {g}" for g in range(groups_per_user)] for email in emails}
+    probe = emails[-1]
+
+    def contains():
+        return probe in emails
+
+    def add_remove():
+        emails.append("new@example.com")
+        emails.remove("new@example.com")
+
+    def delete_group():
+        for email in emails:
+            group_lists[email].remove("Group 0")
+            group_lists[email].append("Group 0")
+
+    return contains, add_remove, delete_group
+
+
+def index_ops(members, groups_per_user):
+    emails = dict.fromkeys(f"user{i}@example.com" for i in range(members))
+    group_sets = {email: dict.fromkeys(f"Group {g}" for g in range(groups_per_user)) for email in emails}
+    probe = f"user{members - 1}@example.com"
+
+    def contains():
+        return probe in emails
+
+    def add_remove():
+        emails["new@example.com"] = None
+        del emails["new@example.com"]
+
+    def delete_group():
+        for email in emails:
+            group_sets[email].pop("Group 0", None)
+            group_sets[email]["Group 0"] = None
+
+    return contains, add_remove, delete_group
+
+
+def best_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--groups-per-user", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'members':>8} {'variant':<8} {'contains us':>12} {'add+remove us':>14} {'delete group ms':>16}")
+    for members in args.members:
+        for label, build in (("list", list_ops), ("index", index_ops)):
+            contains, add_remove, delete_group = build(members, args.groups_per_user)
+            print(f"{members:>8} {label:<8} {best_us(contains, 1000):>12.2f} {best_us(add_remove, 1000):>14.2f} "
+                  f"{best_us(delete_group, 3) / 1000:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Memory per stored expense: dicts against ``ExpenseTable`` columns.
+
+Loads the same SQLite rows twice, as the expense dicts the store used to
+return and as the compact tables it returns now, and reports the bytes
+allocated per expense (``tracemalloc``) and the load time. ``--assignees``
+sets how many people share each item.
+
+    python -m benchmarks.bench_memory --groups 100 --expenses-per-group 1000
+"""
+import argparse
+import gc
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.synthetic import generate, populate
+from smartsplit.storage import EXPENSE_COLUMNS, Store, _expense_from_row
+
+
+def load_dicts(store):
+    groups = {}
+    for row in store._conn.execute(f"SELECT group_name, {EXPENSE_COLUMNS} FROM expenses ORDER BY seq"):
+        groups.setdefault(row[0], []).append(_expense_from_row(row[1:]))
+    return groups
+
+
+def load_tables(store):
+    _, groups = store.load()
+    return {name: group["expenses"] for name, group in groups.items()}
+
+
+def measure(load, store):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    loaded = load(store)
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    # Load time without tracemalloc's overhead
+    start = time.perf_counter()
+    load(store)
+    return size, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--members-per-group", type=int, default=8)
+    parser.add_argument("--expenses-per-group", type=int, default=1000)
+    args = parser.parse_args()
+
+    users, groups = generate(args.groups, members_per_group=args.members_per_group,
+                             expenses_per_group=args.expenses_per_group)
+    expenses = args.groups * args.expenses_per_group
+    with tempfile.TemporaryDirectory() as tmp:
+        store = Store(Path(tmp) / "smartsplit.db")
+        populate(store, users, groups)
+        print(f"{expenses} expenses in {args.groups} groups")
+        print(f"{'layout':<8} {'MB':>8} {'bytes/expense':>14} {'load ms':>9}")
+        sizes = {}
+        for label, load in (("dicts", load_dicts), ("table", load_tables)):
+            size, elapsed = measure(load, store)
+            sizes[label] = size
+            print(f"{label:<8} {size / 1e6:>8.1f} {size / expenses:>14.0f} {elapsed * 1000:>9.0f}")
+        store.close()
+    print(f"{sizes['dicts'] / sizes['table']:.1f}x less memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Cost of the timing hooks, with metrics off and on.
+
+Times a trivial function called plainly, through ``@timed`` and inside
+``with timer(...)``, first with recording off (the default) and then on.
+Off, the hooks should add well under a microsecond per call.
+
+    python -m benchmarks.bench_metrics
+"""
+import argparse
+import timeit
+
+from smartsplit import metrics
+
+
+def work():
+    return None
+
+
+timed_work = metrics.timed("bench.timed")(work)
+
+
+def with_timer():
+    with metrics.timer("bench.timer"):
+        work()
+
+
+def best_ns(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=200000)
+    args = parser.parse_args()
+
+    baseline = best_ns(work, args.number)
+    print(f"{'metrics':<8} {'hook':<8} {'ns/call':>8} {'overhead ns':>12}")
+    for enabled in (False, True):
+        metrics.configure(enabled=enabled)
+        for label, func in (("timed", timed_work), ("timer", with_timer)):
+            ns = best_ns(func, args.number)
+            print(f"{'on' if enabled else 'off':<8} {label:<8} {ns:>8.0f} {ns - baseline:>12.0f}")
+    metrics.configure(enabled=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Receipt preprocessing settings: payload size, time and extraction quality.
+
+Offline it renders synthetic receipt photos (known items, on a cluttered
+background) and reports preprocessing time, payload bytes and the upload
+time those bytes would take. With ``--live`` it also sends every variant to
+Gemini (needs GEMINI_API_KEY) and reports latency and item accuracy.
+
+    python -m benchmarks.bench_preprocess
+    python -m benchmarks.bench_preprocess --live --receipts 3
+    python -m benchmarks.bench_preprocess --images path/to/photos
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from smartsplit.imaging import preprocess
+from smartsplit.receipts import MODEL_NAME, extract_receipt
+
+# (label, preprocess options); None sends the upload untouched
+SETTINGS = [
+    ("original", None),
+    ("1024px q70 gray", dict(long_edge=1024, quality=70)),
+    ("1600px q80 gray", dict(long_edge=1600, quality=80)),
+    ("2048px q85 gray", dict(long_edge=2048, quality=85)),
+    ("1600px q80 color", dict(long_edge=1600, quality=80, grayscale=False)),
+    ("1600px q80 no crop", dict(long_edge=1600, quality=80, crop=False)),
+]
+
+
+def synthetic_receipt(seed, size=(3000, 4000)):
+    """A phone-photo-like receipt and the items printed on it."""
+    rng = random.Random(seed)
+    photo = Image.new("RGB", size, (90, 70, 60))
+    draw = ImageDraw.Draw(photo)
+    for _ in range(4000):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        shade = rng.randrange(50, 130)
+        draw.rectangle([x, y, x + 25, y + 25], fill=(shade, shade - 10, shade - 20))
+    left, top = size[0] // 3, size[1] // 8
+    draw.rectangle([left, top, 2 * size[0] // 3, 7 * size[1] // 8], fill=(236, 233, 226))
+
+    items = [{"name": f"ITEM {chr(65 + i)}", "price": rng.randint(99, 2999)} for i in range(rng.randint(4, 10))]
+    lines = ["ITEMS:"] + [f"{item['name']}: ${item['price'] // 100}.{item['price'] % 100:02d}" for item in items]
+    for row, line in enumerate(lines):
+        draw.text((left + 60, top + 80 + row * 70), line, fill=(25, 25, 25), font_size=48)
+
+    buffer = io.BytesIO()
+    photo.save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue(), items
+
+
+def accuracy(expected, extracted):
+    found = {(item["name"].upper(), item["price"]) for item in extracted}
+    return sum((item["name"], item["price"]) in found for item in expected) / len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--receipts", type=int, default=5, help="synthetic receipts to render")
+    parser.add_argument("--images", type=Path, help="directory of real receipt photos instead")
+    parser.add_argument("--live", action="store_true", help="call Gemini for latency and accuracy")
+    parser.add_argument("--bandwidth-mbps", type=float, default=5.0, help="uplink for the upload estimate")
+    args = parser.parse_args()
+
+    if args.images:
+        samples = [(path.read_bytes(), None) for path in sorted(args.images.iterdir())
+                   if path.suffix.lower() in (".jpg", ".jpeg", ".png")]
+    else:
+        samples = [synthetic_receipt(seed) for seed in range(args.receipts)]
+
+    model = None
+    if args.live:
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+        model = genai.GenerativeModel(MODEL_NAME)
+
+    print(f"{len(samples)} receipts, mean upload {statistics.mean(len(d) for d, _ in samples) / 1024:.0f} KB")
+    header = f"{'setting':<20} {'prep ms':>8} {'KB':>8} {'upload ms':>10}"
+    if model:
+        header += f" {'model ms':>9} {'accuracy':>9}"
+    print(header)
+    for label, options in SETTINGS:
+        prep_ms, sizes, model_ms, scores = [], [], [], []
+        for data, expected in samples:
+            image = Image.open(io.BytesIO(data))
+            if options is None:
+                payload, blob = data, {"mime_type": Image.MIME[image.format], "data": data}
+                prep_ms.append(0.0)
+            else:
+                prepared = preprocess(image, len(data), **options)
+                payload, blob = prepared.data, prepared.blob()
+                prep_ms.append(prepared.seconds * 1000)
+            sizes.append(len(payload))
+            if model:
+                start = time.perf_counter()
+                receipt = extract_receipt(model, blob)
+                model_ms.append((time.perf_counter() - start) * 1000)
+                if expected:
+                    scores.append(accuracy(expected, receipt["items"]))
+
+        kilobytes = statistics.mean(sizes) / 1024
+        upload_ms = statistics.mean(sizes) * 8 / (args.bandwidth_mbps * 1e6) * 1000
+        row = f"{label:<20} {statistics.mean(prep_ms):>8.1f} {kilobytes:>8.1f} {upload_ms:>10.0f}"
+        if model:
+            score = f"{statistics.mean(scores):.0%}" if scores else "n/a"
+            row += f" {statistics.mean(model_ms):>9.0f} {score:>9}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
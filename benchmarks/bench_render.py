@@ -0,0 +1,66 @@
+"""App rerun time and element count against group size.
+
+Runs the real script headlessly (``streamlit.testing``) as a logged-in
+member of one group with ``--members`` people and times warm reruns. With
+member lists paginated and the balances in one table, the number of
+elements should stay the same as groups grow.
+
+    python -m benchmarks.bench_render --members 10 100 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.synthetic import generate, populate
+from smartsplit.storage import Store
+
+APP = Path(__file__).resolve().parent.parent / "Smart-Split_app.py"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--expenses", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    print(f"{'members':>8} {'debts':>8} {'elements':>9} {'widgets':>8} {'rerun ms':>9}")
+    for members in args.members:
+        with tempfile.TemporaryDirectory() as tmp:
+            # The app keeps its database under ./data
+            os.chdir(tmp)
+            try:
+                users, groups = generate(1, members_per_group=members, expenses_per_group=args.expenses)
+                store = Store()
+                populate(store, users, groups)
+                debts = sum(len(owes_to) for owes_to in store.load_ledger("Group 0").values())
+                store.close()
+
+                # The store and shared data are cached per process; start each size afresh
+                st.cache_resource.clear()
+                app = AppTest.from_file(str(APP), default_timeout=120)
+                app.session_state.authenticated = True
+                app.session_state.user_email = groups["Group 0"]["members"][0]
+                app.run()
+                if app.exception:
+                    raise SystemExit(app.exception[0].message)
+                timings = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    app.run()
+                    timings.append(time.perf_counter() - start)
+                elements = sum(1 for _ in app.main) + sum(1 for _ in app.sidebar)
+                widgets = len(app.button) + len(app.text_input) + len(app.number_input)
+            finally:
+                os.chdir(cwd)
+        print(f"{members:>8} {debts:>8} {elements:>9} {widgets:>8} {min(timings) * 1000:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Event log startup: full replay against snapshot plus tail.
+
+Writes ``--events`` synthetic events (mostly single expenses, with some
+membership changes) to a temporary log, then times opening it with no
+snapshot (replay everything), writing a snapshot, and opening again with
+only ``--tail`` events after the snapshot.
+
+    python -m benchmarks.bench_replay --events 1000000
+    python -m benchmarks.bench_replay --events 10000000   # ~2 GB of log, several GB of RAM
+"""
+import argparse
+import random
+import tempfile
+import time
+
+from benchmarks.synthetic import ITEMS
+from smartsplit.eventlog import EventStore
+from smartsplit.money import split_evenly
+
+BATCH = 10000
+
+
+def synthetic_events(count, groups, members_per_group, seed=0):
+    rng = random.Random(seed)
+    emails = [f"user{i}@example.com" for i in range(groups * members_per_group // 2)]
+    members = {}
+    for email in emails:
+        yield {"type": "user_saved", "email": email, "full_name": email.split("@")[0]}
+    for g in range(groups):
+        name = f"Group {g}"
+        members[name] = rng.sample(emails, members_per_group)
+        yield {"type": "group_created", "group": name, "owner": members[name][0]}
+        for email in members[name][1:]:
+            yield {"type": "member_added", "group": name, "email": email}
+    produced = len(emails) + groups * members_per_group
+    names = list(members)
+    for n in range(produced, count):
+        name = rng.choice(names)
+        if rng.random() < 0.01:
+            email = rng.choice(emails)
+            kind = "member_removed" if email in members[name] else "member_added"
+            yield {"type": kind, "group": name, "email": email}
+            continue
+        amount = rng.randint(100, 20000)
+        assignees = rng.sample(members[name], rng.randint(1, len(members[name])))
+        yield {"type": "expenses_added", "group": name, "expenses": [{
+            "id": str(n), "item": rng.choice(ITEMS), "amount": amount,
+            "payer": rng.choice(members[name]), "assignees": assignees,
+            "shares": split_evenly(amount, len(assignees)), "date": "2024-01-01T00:00:00",
+        }]}
+
+
+def write_events(store, events):
+    batch = []
+    for event in events:
+        batch.append(event)
+        if len(batch) == BATCH:
+            store.append_many(batch)
+            batch = []
+    if batch:
+        store.append_many(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--tail", type=int, default=10_000, help="events after the snapshot")
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--members-per-group", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        events = synthetic_events(args.events + args.tail, args.groups, args.members_per_group)
+        never = args.events + args.tail + 1
+        start = time.perf_counter()
+        store = EventStore(tmp, snapshot_every=never, sync=False)
+        write_events(store, (event for _, event in zip(range(args.events), events)))
+        store.close()
+        print(f"wrote {args.events:,} events in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        store = EventStore(tmp, snapshot_every=never, sync=False)
+        print(f"full replay:        {time.perf_counter() - start:8.2f} s ({store.replayed:,} events)")
+
+        start = time.perf_counter()
+        store.snapshot()
+        print(f"snapshot write:     {time.perf_counter() - start:8.2f} s")
+        write_events(store, events)
+        store.close()
+
+        start = time.perf_counter()
+        store = EventStore(tmp, snapshot_every=never, sync=False)
+        print(f"snapshot + tail:    {time.perf_counter() - start:8.2f} s ({store.replayed:,} events replayed)")
+        store.close()
+
+        # Durable single-event appends, as the app would make them
+        store = EventStore(tmp, snapshot_every=never, sync=True)
+        start = time.perf_counter()
+        for n in range(200):
+            store.append("user_saved", email=f"bench{n}@example.com", full_name="Bench")
+        elapsed = time.perf_counter() - start
+        print(f"fsync'd append:     {elapsed / 200 * 1000:8.2f} ms per event")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-rerun data loading cost against dataset size.
+
+Compares the legacy behaviour (parse every JSON file on every rerun), reloading
+everything from SQLite, and the shared in-memory layer that only checks
+whether the database changed.
+
+    python -m benchmarks.bench_rerun --groups 100 1000 10000
+"""
+import argparse
+import json
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.synthetic import generate, populate, write_json
+from smartsplit.shared import SharedData
+from smartsplit.storage import Store
+
+
+def legacy_load(data_dir):
+    loaded = []
+    for name in ("users.json", "groups.json", "expenses.json"):
+        with open(data_dir / name, "r") as f:
+            loaded.append(json.load(f))
+    return loaded
+
+
+def best_ms(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--expenses-per-group", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'groups':>8} {'expenses':>10} {'json (ms)':>12} {'sqlite (ms)':>12} {'shared (ms)':>12}")
+    for num_groups in args.groups:
+        users, groups = generate(num_groups, expenses_per_group=args.expenses_per_group)
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp)
+            write_json(data_dir, users, groups)
+            store = Store(data_dir / "smartsplit.db")
+            populate(store, users, groups)
+            shared = SharedData(store)
+
+            json_ms = best_ms(lambda: legacy_load(data_dir), args.repeat)
+            sqlite_ms = best_ms(store.load, args.repeat)
+            shared_ms = best_ms(shared.refresh, args.repeat)
+            store.close()
+        total_expenses = num_groups * args.expenses_per_group
+        print(f"{num_groups:>8} {total_expenses:>10} {json_ms:>12.3f} {sqlite_ms:>12.3f} {shared_ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
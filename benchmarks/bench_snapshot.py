@@ -0,0 +1,76 @@
+"""Dataset load time: JSON files, SQLite and the binary snapshot.
+
+Writes one synthetic dataset in all three forms and times reading all of it
+from each, plus opening the snapshot and reading a single group (users,
+that group's expenses and balances), which is what showing one group needs.
+
+    python -m benchmarks.bench_snapshot --groups 100 1000 --expenses-per-group 200
+"""
+import argparse
+import json
+import os
+import tempfile
+import timeit
+from pathlib import Path
+
+from benchmarks.synthetic import generate, populate
+from smartsplit.snapshot import Snapshot, write_json, write_snapshot
+from smartsplit.storage import Store
+
+
+def load_json(data_dir):
+    for name in ("users.json", "groups.json", "ledgers.json"):
+        with open(data_dir / name, "r") as f:
+            json.load(f)
+
+
+def load_snapshot(path):
+    with Snapshot(path) as snapshot:
+        snapshot.load()
+        snapshot.load_ledgers()
+
+
+def load_one_group(path, group_name):
+    with Snapshot(path) as snapshot:
+        snapshot.users()
+        snapshot.group(group_name)
+        snapshot.ledger(group_name)
+
+
+def best_ms(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--expenses-per-group", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'groups':>7} {'expenses':>9} {'json MB':>8} {'snap MB':>8} {'json ms':>8} {'sqlite ms':>10} "
+          f"{'snap ms':>8} {'1 group ms':>11}")
+    for num_groups in args.groups:
+        users, groups = generate(num_groups, expenses_per_group=args.expenses_per_group)
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            store = Store(tmp / "smartsplit.db")
+            populate(store, users, groups)
+            users, groups = store.load()
+            ledgers = store.load_ledgers()
+            write_json(tmp / "json", users, groups, ledgers)
+            snapshot = write_snapshot(tmp / "smartsplit.snap", users, groups, ledgers)
+            json_mb = sum(os.path.getsize(path) for path in (tmp / "json").iterdir()) / 1e6
+
+            json_ms = best_ms(lambda: load_json(tmp / "json"), args.repeat)
+            sqlite_ms = best_ms(lambda: (store.load(), store.load_ledgers()), args.repeat)
+            snapshot_ms = best_ms(lambda: load_snapshot(snapshot), args.repeat)
+            one_ms = best_ms(lambda: load_one_group(snapshot, "Group 0"), args.repeat)
+            print(f"{num_groups:>7} {num_groups * args.expenses_per_group:>9} {json_mb:>8.1f} "
+                  f"{os.path.getsize(snapshot) / 1e6:>8.1f} {json_ms:>8.1f} {sqlite_ms:>10.1f} "
+                  f"{snapshot_ms:>8.1f} {one_ms:>11.2f}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
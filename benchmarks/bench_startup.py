@@ -0,0 +1,92 @@
+"""App cold start: what gets imported, and how long the first run and reruns take.
+
+Each scenario runs the real script headlessly in a fresh interpreter with
+``-X importtime``: the login page (not logged in) and the group page of a
+logged-in user. Reports the first run and the best warm rerun, plus the
+cumulative import time of the heavy SDKs, which should only show up once
+login, extraction or mail actually needs them.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --imports 30   # the slowest imports of each run
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic import generate, populate
+from smartsplit.storage import Store
+
+APP = Path(__file__).resolve().parent.parent / "Smart-Split_app.py"
+ROOT = APP.parent
+
+HEAVY = ["google.generativeai", "googleapiclient", "google_auth_oauthlib", "PIL", "jinja2", "numpy", "pandas"]
+
+RUN = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=120)
+if sys.argv[2]:
+    app.session_state.authenticated = True
+    app.session_state.user_email = sys.argv[2]
+start = time.perf_counter()
+app.run()
+first = time.perf_counter() - start
+if app.exception:
+    raise SystemExit(app.exception[0].message)
+reruns = []
+for _ in range(5):
+    start = time.perf_counter()
+    app.run()
+    reruns.append(time.perf_counter() - start)
+print(json.dumps({"first": first, "rerun": min(reruns)}))
+"""
+
+
+def parse_importtime(stderr):
+    """``{module: cumulative_us}`` from ``-X importtime`` output."""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        imports[name] = int(cumulative)
+    return imports
+
+
+def run(user, data_dir, env):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", RUN, str(APP), user or ""],
+                            cwd=data_dir, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(result.stderr[-2000:])
+    return json.loads(result.stdout.splitlines()[-1]), parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--imports", type=int, default=0, help="also list this many slowest imports")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    with tempfile.TemporaryDirectory() as tmp:
+        # The app keeps its database under ./data
+        users, groups = generate(5, members_per_group=6, expenses_per_group=50)
+        store = Store(Path(tmp) / "data" / "smartsplit.db")
+        populate(store, users, groups)
+        store.close()
+        user = groups["Group 0"]["members"][0]
+
+        for label, login in (("login page", None), ("group page", user)):
+            timings, imports = run(login, tmp, env)
+            heavy = ", ".join(f"{name} {imports[name] / 1000:.0f} ms" for name in HEAVY if name in imports)
+            print(f"{label}: first run {timings['first'] * 1000:.0f} ms, rerun {timings['rerun'] * 1000:.0f} ms")
+            print(f"  heavy imports: {heavy or 'none'}")
+            for name, cumulative in sorted(imports.items(), key=lambda item: -item[1])[:args.imports]:
+                print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Concurrent writers against one database: no lost updates, no torn ledgers.
+
+Starts ``--threads`` writers that each save ``--writes`` expenses to random
+groups the way a session does: read the group's version, then write with
+``expected_version`` and retry on ``ConflictError``. A few writes add or
+remove a guest member instead, which changes the version under the others.
+
+With ``--connections shared`` all writers go through one ``Store`` and keep a
+``SharedData`` copy up to date under its lock, as the app's sessions do; with
+``separate`` each writer opens its own connection, like separate processes.
+Afterwards every expense must be stored exactly once, every group's version
+must equal its number of successful writes, the stored balances must match
+the expenses, and the shared copy (if any) must match the database.
+
+    python -m benchmarks.stress_writes --threads 16 --writes 500
+    python -m benchmarks.stress_writes --connections separate
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from benchmarks.synthetic import ITEMS
+from smartsplit.ledger import apply_expenses
+from smartsplit.money import split_evenly
+from smartsplit.shared import SharedData
+from smartsplit.storage import ConflictError, Store
+
+GUEST = "guest@example.com"
+
+
+def setup(store, groups, members_per_group):
+    emails = [f"user{i}@example.com" for i in range(members_per_group)]
+    for email in emails + [GUEST]:
+        store.save_user(email, email.split("@")[0])
+    names = [f"Group {g}" for g in range(groups)]
+    for name in names:
+        store.create_group(name, emails[0])
+        for email in emails[1:]:
+            store.add_member(name, email)
+    return names, emails
+
+
+class Writer(threading.Thread):
+    def __init__(self, number, store, shared, names, emails, writes, member_rate):
+        super().__init__(name=f"writer-{number}")
+        self.number = number
+        self.store = store
+        self.shared = shared
+        self.names = names
+        self.emails = emails
+        self.writes = writes
+        self.member_rate = member_rate
+        self.rng = random.Random(number)
+        self.conflicts = 0
+        self.succeeded = Counter()
+        self.expenses = 0
+        self.error = None
+
+    def run(self):
+        try:
+            for n in range(self.writes):
+                name = self.rng.choice(self.names)
+                if self.rng.random() < self.member_rate:
+                    self.write(name, self.toggle_guest)
+                else:
+                    expense = self.expense(n)
+                    self.write(name, lambda name, version: self.add_expense(name, version, expense))
+                    self.expenses += 1
+        except Exception as error:  # reported by the main thread
+            self.error = error
+
+    def write(self, name, change):
+        # Optimistic retry loop: re-read the version after every conflict
+        while True:
+            version = self.store.group_version(name)
+            try:
+                if self.shared is None:
+                    change(name, version)
+                else:
+                    with self.shared.lock:
+                        change(name, version)
+            except ConflictError:
+                self.conflicts += 1
+                continue
+            self.succeeded[name] += 1
+            return
+
+    def expense(self, n):
+        amount = self.rng.randint(100, 20000)
+        assignees = self.rng.sample(self.emails, self.rng.randint(1, len(self.emails)))
+        return {
+            "id": f"{self.number}-{n}", "item": self.rng.choice(ITEMS), "amount": amount,
+            "payer": self.rng.choice(self.emails), "assignees": assignees,
+            "shares": split_evenly(amount, len(assignees)), "date": "2024-01-01T00:00:00",
+        }
+
+    def add_expense(self, name, version, expense):
+        new_version = self.store.add_expenses(name, [expense], expected_version=version)
+        if self.shared is not None:
+            group = self.shared.groups[name]
+            group["version"] = new_version
+            group["expenses"].append(expense)
+            apply_expenses(self.shared.ledgers.setdefault(name, {}), [expense])
+
+    def toggle_guest(self, name, version):
+        # Both are no-ops if the guest is already in/out, but still advance the version
+        members = self.shared.groups[name]["members"] if self.shared is not None else None
+        if self.rng.random() < 0.5:
+            new_version = self.store.add_member(name, GUEST, expected_version=version)
+            if members is not None:
+                members[GUEST] = None
+                self.shared.users[GUEST]["groups"][name] = None
+        else:
+            new_version = self.store.remove_member(name, GUEST, expected_version=version)
+            if members is not None:
+                members.pop(GUEST, None)
+                self.shared.users[GUEST]["groups"].pop(name, None)
+        if self.shared is not None:
+            self.shared.groups[name]["version"] = new_version
+
+
+def verify(store, shared, names, emails, writers):
+    problems = []
+    users, groups = store.load()
+    expected_ids = {f"{writer.number}-{n}" for writer in writers for n in range(writer.writes)}
+    stored_ids = [expense["id"] for group in groups.values() for expense in group["expenses"]]
+    expense_total = sum(writer.expenses for writer in writers)
+    if len(stored_ids) != expense_total or len(set(stored_ids)) != len(stored_ids):
+        problems.append(f"{len(stored_ids)} expenses stored ({len(set(stored_ids))} distinct), {expense_total} written")
+    if not set(stored_ids) <= expected_ids:
+        problems.append("unexpected expense ids stored")
+    succeeded = sum((writer.succeeded for writer in writers), Counter())
+    for name in names:
+        # Version 1 at creation, one per member added during setup, one per write
+        expected = len(emails) + succeeded[name]
+        if groups[name]["version"] != expected:
+            problems.append(f"{name}: version {groups[name]['version']}, expected {expected}")
+    for name, mismatches in store.check_ledgers().items():
+        problems.append(f"{name}: stored balances differ from expenses ({len(mismatches)} pairs)")
+    if shared is not None:
+        if shared.groups != groups:
+            problems.append("shared groups differ from the database")
+        if shared.users != users:
+            problems.append("shared users differ from the database")
+        if shared.ledgers != store.load_ledgers():
+            problems.append("shared balances differ from the database")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--writes", type=int, default=300, help="writes per thread")
+    parser.add_argument("--groups", type=int, default=4, help="few groups means many conflicts")
+    parser.add_argument("--members-per-group", type=int, default=6)
+    parser.add_argument("--member-rate", type=float, default=0.05, help="share of writes that change membership")
+    parser.add_argument("--connections", choices=["shared", "separate"], default="shared")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "stress.db"
+        store = Store(path)
+        names, emails = setup(store, args.groups, args.members_per_group)
+        shared = SharedData(store) if args.connections == "shared" else None
+        stores = [store if shared else Store(path) for _ in range(args.threads)]
+        writers = [Writer(n, stores[n], shared, names, emails, args.writes, args.member_rate)
+                   for n in range(args.threads)]
+
+        start = time.perf_counter()
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        elapsed = time.perf_counter() - start
+        for writer_store in stores:
+            if writer_store is not store:
+                writer_store.close()
+
+        errors = [f"{writer.name}: {writer.error!r}" for writer in writers if writer.error]
+        total = args.threads * args.writes
+        conflicts = sum(writer.conflicts for writer in writers)
+        print(f"{args.threads} threads x {args.writes} writes over {args.groups} groups "
+              f"({args.connections} connection{'s' if args.connections == 'separate' else ''})")
+        print(f"  {total / elapsed:8.0f} writes/s, {conflicts} conflicts retried "
+              f"({conflicts / total:.1%} of writes)")
+        problems = errors + verify(store, shared, names, emails, writers)
+        store.close()
+    for problem in problems:
+        print(f"  FAIL {problem}")
+    if problems:
+        raise SystemExit(1)
+    print("  OK: no lost or duplicated writes; balances match the expenses")
+
+
+if __name__ == "__main__":
+    main()
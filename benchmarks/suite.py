@@ -0,0 +1,237 @@
+"""The whole benchmark suite on one seeded dataset, with JSON results.
+
+Times loading and saving, Who Owes Whom, the pending-expense summaries,
+email rendering and sending, and receipt parsing. Gemini and Gmail are the
+local fakes from ``smartsplit.fakes``, so the suite runs offline. Results
+record the commit they were measured on; ``--compare`` lines them up
+against an earlier run and exits non-zero if any stage got slower than
+``--threshold``.
+
+    python -m benchmarks.suite --size small --output base.json
+    python -m benchmarks.suite --size small --compare base.json
+    python -m benchmarks.suite --size medium --only debts. email.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.synthetic import generate, pending_expenses, populate, write_json
+from smartsplit.emails import build_summary_message, plan_fanout, render_summary
+from smartsplit.fakes import CANNED_RECEIPT, CANNED_RECEIPT_JSON, FakeGmailService, FakeModel
+from smartsplit.ledger import build_ledger
+from smartsplit.mail import MailDispatcher
+from smartsplit.paging import debt_rows, ledger_debts
+from smartsplit.receipts import extract_receipt, extract_receipt_json, parse_receipt_json, parse_receipt_text
+from smartsplit.settlement import simplify_ledger
+from smartsplit.storage import Store
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SIZES = {
+    "small": {"groups": 20, "members_per_group": 6, "expenses_per_group": 50},
+    "medium": {"groups": 200, "members_per_group": 12, "expenses_per_group": 200},
+    "large": {"groups": 1000, "members_per_group": 25, "expenses_per_group": 500},
+}
+# Model replies parsed per receipt stage
+RECEIPTS = 200
+DATE = "2024-01-01 12:00"
+# Shortest sample worth timing; quicker stages are looped
+MIN_SAMPLE = 0.05
+
+
+def measure(func, repeat, setup=None):
+    """Best and median time per call of ``func`` over ``repeat`` samples.
+
+    Without ``setup`` each sample calls ``func`` often enough to take at
+    least ``MIN_SAMPLE`` seconds. With it, ``setup()`` runs untimed before
+    every single call and its result is passed to ``func``.
+    """
+    number = 1
+    if setup is None:
+        number = timeit.Timer(func).autorange()[0]
+        while timeit.timeit(func, number=number) < MIN_SAMPLE:
+            number *= 2
+    runs = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        start = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        runs.append((time.perf_counter() - start) * 1000 / number)
+    return {"min_ms": min(runs), "median_ms": statistics.median(runs), "number": number, "runs_ms": runs}
+
+
+def git_revision():
+    """``(commit, dirty)`` of the working tree, or ``(None, None)`` outside git."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def stages(users, groups, tmp):
+    """``{stage: (func, setup)}`` for one dataset."""
+    tmp = Path(tmp)
+    write_json(tmp, users, groups)
+    store = Store(tmp / "smartsplit.db")
+    populate(store, users, groups)
+    ledgers = {name: build_ledger(group["expenses"]) for name, group in groups.items()}
+    names = {email: user["full_name"] for email, user in users.items()}
+    # One session's batch of pending expenses: the first group's
+    first = next(iter(groups.values()))
+    pending = pending_expenses(users, first["expenses"])
+    plan = plan_fanout(pending)
+    scratch = iter(range(sys.maxsize))
+
+    def fresh_store():
+        return Store(tmp / f"scratch{next(scratch)}.db")
+
+    def save(store):
+        populate(store, users, groups)
+        store.close()
+
+    def import_json(store):
+        store.migrate_from_json(tmp)
+        store.close()
+
+    def all_ledgers():
+        for group in groups.values():
+            build_ledger(group["expenses"])
+
+    def all_debt_rows(simplify):
+        for ledger in ledgers.values():
+            debt_rows(simplify_ledger(ledger) if simplify else ledger_debts(ledger), names.get)
+
+    def pending_summary():
+        summaries = plan_fanout(pending)
+        sum(expense["amount"] for expense in pending)
+        for summary in summaries.values():
+            list(summary.owes_to.items())
+
+    def render_all():
+        for summary in plan.values():
+            render_summary(summary, "Group 0", names, DATE)
+
+    def send_all():
+        messages = {email: build_summary_message("user0@example.com", summary, "Group 0", names, DATE)
+                    for email, summary in plan.items()}
+        for _ in MailDispatcher(FakeGmailService()).send_many(messages):
+            pass
+
+    model = FakeModel()
+
+    def extract(streamed):
+        on_item = (lambda item: None) if streamed else None
+        for _ in range(RECEIPTS):
+            extract_receipt(model, None, on_item=on_item)
+
+    return {
+        "store.save": (save, fresh_store),
+        "store.import_json": (import_json, fresh_store),
+        "store.load": (lambda: store.load(), None),
+        "store.load_ledgers": (lambda: store.load_ledgers(), None),
+        "ledger.build": (all_ledgers, None),
+        "debts.rows": (lambda: all_debt_rows(False), None),
+        "debts.simplified": (lambda: all_debt_rows(True), None),
+        "pending.summary": (pending_summary, None),
+        "email.render": (render_all, None),
+        "email.send": (send_all, None),
+        "receipt.parse_text": (lambda: [parse_receipt_text(CANNED_RECEIPT) for _ in range(RECEIPTS)], None),
+        "receipt.parse_json": (lambda: [parse_receipt_json(CANNED_RECEIPT_JSON) for _ in range(RECEIPTS)], None),
+        "receipt.extract": (lambda: extract(False), None),
+        "receipt.extract_stream": (lambda: extract(True), None),
+        "receipt.extract_json": (lambda: [extract_receipt_json(model, None) for _ in range(RECEIPTS)], None),
+    }, store
+
+
+def run_suite(size, repeat, only=()):
+    params = SIZES[size]
+    users, groups = generate(params["groups"], members_per_group=params["members_per_group"],
+                             expenses_per_group=params["expenses_per_group"])
+    commit, dirty = git_revision()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cases, store = stages(users, groups, tmp)
+        try:
+            for stage, (func, setup) in cases.items():
+                if only and not stage.startswith(tuple(only)):
+                    continue
+                # One untimed run so lazy imports and caches don't land in the first sample
+                func(*((setup(),) if setup else ()))
+                results[stage] = measure(func, repeat, setup)
+                print(f"  {stage:<24} {results[stage]['min_ms']:>10.2f} ms", file=sys.stderr)
+        finally:
+            store.close()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "size": size,
+        "params": dict(params, users=len(users), receipts=RECEIPTS),
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print both runs side by side; return the stages slower than ``threshold`` times the baseline."""
+    if baseline["params"] != current["params"]:
+        print(f"warning: comparing different datasets ({baseline['size']} against {current['size']})")
+    print(f"baseline {(baseline['commit'] or 'unknown')[:10]}{' (dirty)' if baseline['dirty'] else ''}, "
+          f"current {(current['commit'] or 'unknown')[:10]}{' (dirty)' if current['dirty'] else ''}")
+    print(f"{'stage':<24} {'base ms':>10} {'now ms':>10} {'ratio':>7}")
+    slower = []
+    for stage, result in current["results"].items():
+        before = baseline["results"].get(stage)
+        if before is None:
+            print(f"{stage:<24} {'-':>10} {result['min_ms']:>10.2f} {'new':>7}")
+            continue
+        ratio = result["min_ms"] / before["min_ms"] if before["min_ms"] else float("inf")
+        flag = "  slower" if ratio > threshold else ""
+        print(f"{stage:<24} {before['min_ms']:>10.2f} {result['min_ms']:>10.2f} {ratio:>6.2f}x{flag}")
+        if flag:
+            slower.append(stage)
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="small")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", default=(), metavar="PREFIX", help="run only stages with these prefixes")
+    parser.add_argument("--output", type=Path, help="write the results as JSON")
+    parser.add_argument("--compare", type=Path, metavar="BASELINE", help="results JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="with --compare, the slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    current = run_suite(args.size, args.repeat, args.only)
+    if args.output:
+        args.output.write_text(json.dumps(current, indent=2) + "\n")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        slower = compare(baseline, current, args.threshold)
+        if slower:
+            raise SystemExit(f"{len(slower)} stage(s) slower than {args.threshold}x: {', '.join(slower)}")
+        return
+    print(f"{'stage':<24} {'min ms':>10} {'median ms':>10}")
+    for stage, result in current["results"].items():
+        print(f"{stage:<24} {result['min_ms']:>10.2f} {result['median_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Seeded generator for users/groups/expenses in the app's data schema."""
+import json
+import random
+from datetime import datetime, timedelta
+
+from smartsplit.money import split_evenly
+
+ITEMS = ["Milk", "Bread", "Eggs", "Coffee", "Pizza", "Taxi", "Hotel", "Tickets", "Dinner", "Snacks"]
+
+
+def generate(num_groups, members_per_group=6, expenses_per_group=50, num_users=None, seed=0):
+    """Return ``(users, groups)`` shaped like ``data/users.json``/``groups.json``."""
+    rng = random.Random(seed)
+    num_users = num_users or max(members_per_group, num_groups * members_per_group // 3)
+    emails = [f"user{i}@example.com" for i in range(num_users)]
+    users = {
+        email: {"full_name": f"User {i}", "groups": [], "expenses": []}
+        for i, email in enumerate(emails)
+    }
+    start = datetime(2024, 1, 1)
+
+    groups = {}
+    for g in range(num_groups):
+        name = f"Group {g}"
+        members = rng.sample(emails, min(members_per_group, num_users))
+        expenses = []
+        for e in range(expenses_per_group):
+            amount = rng.randint(100, 20000)
+            assignees = rng.sample(members, rng.randint(1, len(members)))
+            expenses.append({
+                "id": f"{g}.{e}",
+                "item": rng.choice(ITEMS),
+                "amount": amount,
+                "payer": rng.choice(members),
+                "assignees": assignees,
+                "shares": split_evenly(amount, len(assignees)),
+                "date": (start + timedelta(minutes=g * expenses_per_group + e)).isoformat(),
+            })
+        groups[name] = {"members": members, "expenses": expenses}
+        for email in members:
+            users[email]["groups"].append(name)
+    return users, groups
+
+
+def populate(store, users, groups):
+    """Write a generated dataset into a ``smartsplit.storage.Store``."""
+    for email, user in users.items():
+        store.save_user(email, user["full_name"])
+    for name, group in groups.items():
+        members = group["members"]
+        store.create_group(name, members[0])
+        for email in members[1:]:
+            store.add_member(name, email)
+        store.add_expenses(name, group["expenses"])
+
+
+def write_json(data_dir, users, groups):
+    """Write a generated dataset as the legacy ``data/*.json`` files."""
+    for name, payload in (("users.json", users), ("groups.json", groups), ("expenses.json", {})):
+        with open(data_dir / name, "w") as f:
+            json.dump(payload, f)
+
+
+def pending_expenses(users, expenses):
+    """Stored expenses in the app's pending (not yet saved) format."""
+    return [{
+        "id": expense["id"],
+        "item": expense["item"],
+        "amount": expense["amount"],
+        "payer_email": expense["payer"],
+        "payer_name": users[expense["payer"]]["full_name"],
+        "assignee_emails": expense["assignees"],
+        "assignee_names": [users[email]["full_name"] for email in expense["assignees"]],
+        "shares": expense["shares"],
+        "date": expense["date"],
+    } for expense in expenses]
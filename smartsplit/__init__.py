@@ -0,0 +1 @@
+"""Support modules for the SmartSplit Streamlit app."""
@@ -0,0 +1,182 @@
+"""Google sign-in with cached, silently refreshed credentials.
+
+Each account that has logged in gets a token file under ``data/tokens``,
+holding its OAuth credentials together with the userinfo fetched at its
+first login. Logging in again as a saved account loads that file and, if
+the access token has expired, refreshes it against the token endpoint: one
+small POST, no browser and no consent screen, and no userinfo round trip.
+The interactive flow only runs for a new account, or when the saved refresh
+token has been revoked or lacks a scope the app now asks for.
+
+Saved logins belong to the browser that created them. The app gives each
+browser a random secret in a cookie, and ``browser_token_cache`` keeps that
+browser's token files in a directory named after a hash of the secret, so
+a browser only sees, and can only sign in with, the accounts saved from it.
+
+Token files contain refresh tokens, so they are created readable by the
+owner only. Logging out keeps them; ``TokenCache.forget`` removes one.
+
+The Google client libraries are imported when first needed. ``refresh``
+takes the ``google.auth`` transport request to use, so it can run against
+``smartsplit.fakes.FakeTokenEndpoint`` instead of Google.
+"""
+import hashlib
+import json
+import os
+import secrets
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from smartsplit.storage import DATA_DIR
+
+TOKEN_DIR = DATA_DIR / "tokens"
+
+
+class TokenCache:
+    """Per-account token files, with the account's cached userinfo."""
+
+    def __init__(self, directory=TOKEN_DIR):
+        self.directory = Path(directory)
+
+    def _path(self, email):
+        return self.directory / f"{quote(email.lower(), safe='@.')}.json"
+
+    def accounts(self):
+        """Saved accounts' userinfo, most recently used first."""
+        saved = []
+        for path in self.directory.glob("*.json"):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                saved.append((data["saved_at"], data["userinfo"]))
+            except (OSError, ValueError, KeyError):
+                continue
+        return [userinfo for _, userinfo in sorted(saved, key=lambda entry: -entry[0])]
+
+    def load(self, email):
+        """``(credentials, userinfo)`` saved for ``email``, or None."""
+        from google.oauth2.credentials import Credentials
+
+        try:
+            with open(self._path(email), "r") as f:
+                data = json.load(f)
+            return Credentials.from_authorized_user_info(data["token"]), data["userinfo"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, credentials, userinfo):
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        path = self._path(userinfo["email"])
+        tmp = path.with_suffix(".tmp")
+        data = {"token": json.loads(credentials.to_json()), "userinfo": userinfo, "saved_at": time.time()}
+        # Owner-only from the start; the file holds a refresh token
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def forget(self, email):
+        try:
+            self._path(email).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def new_browser_secret():
+    """A random secret identifying one browser's saved logins."""
+    return secrets.token_urlsafe(32)
+
+
+def browser_token_cache(secret, directory=TOKEN_DIR):
+    """The ``TokenCache`` of the browser holding ``secret``.
+
+    The directory name is a hash, so listing ``directory`` does not reveal
+    the secrets that open it.
+    """
+    return TokenCache(Path(directory) / hashlib.sha256(secret.encode()).hexdigest())
+
+
+def remove_unbound_tokens(directory=TOKEN_DIR):
+    """Delete token files saved before logins were bound to a browser.
+
+    Those lie directly in ``directory`` rather than in a browser's
+    subdirectory. No browser can reach them any more, but they still hold
+    refresh tokens. Returns how many were removed.
+    """
+    removed = 0
+    for path in Path(directory).glob("*.json"):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            continue
+        removed += 1
+    return removed
+
+
+def refresh(credentials, scopes, request=None):
+    """Make saved ``credentials`` usable without user interaction.
+
+    Returns them (refreshed if the access token had expired), or None if the
+    interactive flow is needed: a scope is missing, there is no refresh
+    token, or the token endpoint rejected it.
+    """
+    from google.auth.exceptions import RefreshError
+
+    if not credentials.has_scopes(scopes):
+        return None
+    if credentials.valid:
+        return credentials
+    if not credentials.refresh_token:
+        return None
+    if request is None:
+        from google.auth.transport.requests import Request
+        request = Request()
+    try:
+        credentials.refresh(request)
+    except RefreshError:
+        return None
+    return credentials
+
+
+def silent_login(cache, email, scopes, request=None):
+    """``(credentials, userinfo)`` for a saved account, or None if it has to sign in again."""
+    saved = cache.load(email)
+    if saved is None:
+        return None
+    credentials, userinfo = saved
+    token = credentials.token
+    credentials = refresh(credentials, scopes, request)
+    if credentials is None:
+        return None
+    if credentials.token != token:
+        cache.save(credentials, userinfo)
+    return credentials, userinfo
+
+
+def interactive_login(client_secrets_file, scopes, port=8080, login_hint=None):
+    """Run the browser consent flow and return the new credentials."""
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    flow = InstalledAppFlow.from_client_secrets_file(
+        client_secrets_file,
+        scopes,
+        redirect_uri=f'http://localhost:{port}'
+    )
+    options = {"login_hint": login_hint} if login_hint else {}
+    # Consent is what makes Google issue the refresh token that later logins reuse
+    return flow.run_local_server(
+        port=port,
+        prompt='consent',
+        authorization_prompt_message='Please login with your Google account',
+        **options
+    )
+
+
+def fetch_userinfo(credentials):
+    """The signed-in account's ``{"email", "name"}``; ``name`` falls back to the email."""
+    from googleapiclient.discovery import build
+
+    service = build('oauth2', 'v2', credentials=credentials, cache_discovery=False)
+    user_info = service.userinfo().get().execute()
+    return {"email": user_info['email'], "name": user_info.get('name', user_info['email'])}
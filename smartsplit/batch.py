@@ -0,0 +1,92 @@
+"""Concurrent extraction of many receipts with rate-limit-aware retries.
+
+``extract_many`` runs extractions on a bounded thread pool and yields each
+result as soon as it finishes, so the app can render receipts while others
+are still in flight. All workers share one ``Throttle``: it spaces out calls
+when a request budget is configured and, when the API answers 429, holds
+every worker back instead of letting them hammer the quota in parallel.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# HTTP statuses and google.api_core exception names worth another attempt
+RETRYABLE_CODES = {429, 500, 503}
+RETRYABLE_NAMES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+                   "InternalServerError", "DeadlineExceeded"}
+
+
+def is_rate_limited(exc):
+    return getattr(exc, "code", None) == 429 or type(exc).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable(exc):
+    return getattr(exc, "code", None) in RETRYABLE_CODES or type(exc).__name__ in RETRYABLE_NAMES
+
+
+class Throttle:
+    def __init__(self, requests_per_minute=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60 / requests_per_minute if requests_per_minute else 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._next_slot = 0
+        self._paused_until = 0
+
+    def wait(self):
+        """Block until this caller may send its next request."""
+        with self._lock:
+            now = self._clock()
+            slot = max(now, self._next_slot, self._paused_until)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            self._sleep(slot - now)
+
+    def pause(self, seconds):
+        """Hold back every caller for ``seconds`` (after a 429)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+
+def call_with_retry(func, throttle, retries=4, base_delay=1.0, max_delay=30.0, sleep=time.sleep):
+    """Call ``func()`` under ``throttle``, retrying transient failures with
+    jittered exponential backoff. The last error is re-raised."""
+    for attempt in range(retries + 1):
+        throttle.wait()
+        try:
+            return func()
+        except Exception as exc:
+            if attempt == retries or not is_retryable(exc):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            if is_rate_limited(exc):
+                throttle.pause(delay)
+            else:
+                sleep(delay)
+
+
+def extract_many(jobs, extract, max_workers=4, throttle=None, prepare=None, initializer=None, **retry_options):
+    """Extract ``jobs`` (``{key: image}``) concurrently.
+
+    ``prepare(image)``, if given, runs once per job on the worker before the
+    (retried) ``extract`` call. ``initializer()`` runs once on each worker
+    thread, e.g. to attach the caller's Streamlit script context. Yields ``(key, result, error)`` in completion
+    order; exactly one of ``result`` and ``error`` is None.
+    """
+    throttle = throttle or Throttle()
+
+    def run(image):
+        if prepare is not None:
+            image = prepare(image)
+        return call_with_retry(lambda: extract(image), throttle, **retry_options)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="extract",
+                            initializer=initializer) as pool:
+        futures = {pool.submit(run, image): key for key, image in jobs.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result(), None
+            except Exception as exc:
+                yield key, None, exc
@@ -0,0 +1,117 @@
+"""Columnar (struct-of-arrays) expenses and vectorized balance aggregation.
+
+``ExpenseColumns`` turns a list of expense dicts into flat NumPy arrays:
+one payer index and amount per expense, plus the assignee indexes and share
+of all expenses concatenated (CSR style, delimited by ``offsets``). Money is
+int64 cents, so totals are exact. Members are interned to dense integer ids,
+so every aggregation is a single ``np.bincount`` over the flattened
+(debtor, creditor) pairs instead of a Python dict update per expense per
+assignee.
+"""
+import numpy as np
+
+
+class ExpenseColumns:
+    def __init__(self, members, payer, amount, offsets, assignee, share):
+        self.members = members
+        self.payer = payer
+        self.amount = amount
+        self.offsets = offsets
+        self.assignee = assignee
+        self.share = share
+
+    @classmethod
+    def from_expenses(cls, expenses, members=(), payer_key="payer", assignees_key="assignees"):
+        """Build columns from stored (``payer``/``assignees``) or pending
+        (``payer_email``/``assignee_emails``) expense dicts.
+
+        ``members`` fixes the order of the first ids; anyone else who appears
+        in the expenses is appended after them.
+        """
+        members = list(members)
+        index = {email: i for i, email in enumerate(members)}
+
+        def intern(email):
+            i = index.get(email)
+            if i is None:
+                i = index[email] = len(members)
+                members.append(email)
+            return i
+
+        count = len(expenses)
+        payer = np.fromiter((intern(e[payer_key]) for e in expenses), dtype=np.int64, count=count)
+        amount = np.fromiter((e["amount"] for e in expenses), dtype=np.int64, count=count)
+        sizes = np.fromiter((len(e[assignees_key]) for e in expenses), dtype=np.int64, count=count)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+        assignee = np.fromiter(
+            (intern(a) for e in expenses for a in e[assignees_key]),
+            dtype=np.int64,
+            count=int(offsets[-1]),
+        )
+        share = np.fromiter(
+            (s for e in expenses for s in e["shares"]),
+            dtype=np.int64,
+            count=int(offsets[-1]),
+        )
+        return cls(members, payer, amount, offsets, assignee, share)
+
+    @classmethod
+    def from_table(cls, table):
+        """Build columns from an ``ExpenseTable`` without going through dicts.
+
+        The table's arrays already hold interned member ids; they are copied
+        into int64 arrays and renumbered densely, since the table's ids come
+        from a ``MemberIds`` shared with every other group.
+        """
+        payer = np.array(table.payers, dtype=np.int64)
+        assignee = np.array(table.assignees, dtype=np.int64)
+        used = np.zeros(len(table.members.emails), dtype=bool)
+        used[payer] = True
+        used[assignee] = True
+        ids = np.flatnonzero(used)
+        dense = np.cumsum(used) - 1
+        emails = table.members.emails
+        return cls(
+            [emails[i] for i in ids.tolist()],
+            dense[payer],
+            np.array(table.amounts, dtype=np.int64),
+            np.array(table.offsets, dtype=np.int64),
+            dense[assignee],
+            np.array(table.shares, dtype=np.int64),
+        )
+
+    def __len__(self):
+        return len(self.payer)
+
+    def index(self):
+        return {email: i for i, email in enumerate(self.members)}
+
+    def balance_matrix(self):
+        """Dense ``members x members`` matrix; ``[d, c]`` is what d owes c.
+
+        Self-assignments (the payer sharing their own item) are excluded.
+        """
+        n = len(self.members)
+        creditor = np.repeat(self.payer, np.diff(self.offsets))
+        keep = self.assignee != creditor
+        flat = self.assignee[keep] * n + creditor[keep]
+        return _sum_cents(flat, self.share[keep], n * n).reshape(n, n)
+
+    def paid_totals(self):
+        """Total amount paid by each member."""
+        return _sum_cents(self.payer, self.amount, len(self.members))
+
+
+def _sum_cents(bins, cents, length):
+    # bincount accumulates in float64, which is exact for integer sums below
+    # 2**53 cents, so the result converts back to int64 without loss
+    return np.bincount(bins, weights=cents, minlength=length).astype(np.int64)
+
+
+def matrix_to_ledger(matrix, members):
+    """Convert a balance matrix back into ``{debtor: {creditor: amount}}``."""
+    ledger = {}
+    for debtor, creditor in zip(*np.nonzero(matrix)):
+        ledger.setdefault(members[debtor], {})[members[creditor]] = int(matrix[debtor, creditor])
+    return ledger
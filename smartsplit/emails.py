@@ -0,0 +1,117 @@
+"""Expense summary emails rendered from Jinja2 templates.
+
+``plan_fanout`` walks the expenses once, collecting what every participant's
+email shows; ``build_summary_message`` renders one member's summary through
+the templates in ``smartsplit/templates`` into an HTML message with an
+optional plain-text alternative. Jinja2 is imported and the templates are
+compiled on first use, once per process, with the compiled bytecode cached
+on disk across restarts.
+"""
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+from smartsplit.money import format_cents
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+_environment = None
+
+
+def get_environment():
+    global _environment
+    if _environment is None:
+        # Loaded with the first email, not when the app starts
+        from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+
+        environment = Environment(
+            loader=FileSystemLoader(str(TEMPLATE_DIR)),
+            bytecode_cache=FileSystemBytecodeCache(),
+            # Item and member names come from receipts and users; escape them in HTML
+            autoescape=select_autoescape(["html"]),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,
+        )
+        environment.filters["cents"] = format_cents
+        _environment = environment
+    return _environment
+
+
+class ExpenseRow:
+    __slots__ = ("id", "item", "amount", "payer_name", "share")
+
+    def __init__(self, id, item, amount, payer_name, share):
+        self.id = id
+        self.item = item
+        self.amount = amount
+        self.payer_name = payer_name
+        self.share = share
+
+
+class MemberSummary:
+    """What one member paid and owes across a set of expenses, in cents."""
+
+    def __init__(self, email):
+        self.email = email
+        self.is_payer = False
+        self.paid = 0
+        self.owes = 0
+        self.owed_by = {}
+        self.owes_to = {}
+        self.rows = []
+
+
+def plan_fanout(expenses):
+    """Bucket pending-format expenses by participant in one pass.
+
+    Returns ``{email: MemberSummary}`` for everyone who paid for or shares in
+    any expense, in order of first appearance.
+    """
+    summaries = {}
+    for expense in expenses:
+        payer = expense['payer_email']
+        amount = expense['amount']
+        payer_summary = summaries.get(payer) or summaries.setdefault(payer, MemberSummary(payer))
+        payer_summary.is_payer = True
+        payer_summary.paid += amount
+        # A payer outside the split sees the whole amount as their share
+        payer_share = amount
+        for assignee, share in zip(expense['assignee_emails'], expense['shares']):
+            if assignee == payer:
+                payer_share = share
+                continue
+            summary = summaries.get(assignee) or summaries.setdefault(assignee, MemberSummary(assignee))
+            summary.owes += share
+            summary.owes_to[payer] = summary.owes_to.get(payer, 0) + share
+            payer_summary.owed_by[assignee] = payer_summary.owed_by.get(assignee, 0) + share
+            summary.rows.append(ExpenseRow(expense['id'], expense['item'], amount, expense['payer_name'], share))
+        payer_summary.rows.append(ExpenseRow(expense['id'], expense['item'], amount, expense['payer_name'],
+                                             payer_share))
+    return summaries
+
+
+def render_summary(summary, group_name, names, date, plain_text=True):
+    """Return ``(html, text)``; ``text`` is None without ``plain_text``.
+
+    ``names`` maps emails to display names.
+    """
+    environment = get_environment()
+    context = {"summary": summary, "group_name": group_name, "names": names, "date": date,
+               "is_payer": summary.is_payer}
+    html = environment.get_template("summary.html").render(context)
+    text = environment.get_template("summary.txt").render(context) if plain_text else None
+    return html, text
+
+
+def build_summary_message(sender, summary, group_name, names, date, plain_text=True):
+    html, text = render_summary(summary, group_name, names, date, plain_text)
+    message = MIMEMultipart('alternative')
+    message['to'] = summary.email
+    message['from'] = sender
+    message['subject'] = f'Expense Summary for {group_name}'
+    # Mail clients show the last alternative they support, so HTML goes last
+    if text is not None:
+        message.attach(MIMEText(text, 'plain'))
+    message.attach(MIMEText(html, 'html'))
+    return message
@@ -0,0 +1,417 @@
+"""Append-only expense event log with snapshots, as an alternative backend.
+
+Every change is one JSON line appended (and fsync'd) to the current log
+segment: user saved, group created/renamed/deleted, member added/removed,
+expenses added. ``EventStore`` keeps the replayed state in memory and
+mirrors the data-changing methods of ``smartsplit.storage.Store``, including
+the per-group versions and ``expected_version`` checks, so a database can be
+exported to a log and replayed, and the log read as a change feed. It is not
+a drop-in backend for the app: there is no ``load(expenses=False)``, no
+``group_heads`` for the snapshot, and no notification outbox.
+
+Every ``snapshot_every`` events the state is written to a compacted snapshot
+and a new segment is started. Opening the store loads the newest snapshot
+and replays only the segments after it; a torn last line left by a crash is
+cut off. Older segments stay on disk for consumers reading the stream with
+``read_events`` until ``compact`` removes them.
+
+    python -m smartsplit.eventlog export --db data/smartsplit.db --log data/events
+    python -m smartsplit.eventlog replay --log data/events
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from smartsplit.ledger import apply_expenses
+from smartsplit.storage import DATA_DIR, DB_FILE, ConflictError
+
+LOG_DIR = DATA_DIR / "events"
+SNAPSHOT_EVERY = 10000
+
+# Log lines are ASCII JSON; decoding str directly skips json.loads' encoding sniffing
+_decode = json.JSONDecoder().decode
+
+
+class State:
+    """Users, groups and ledgers in the shape ``Store.load`` returns."""
+
+    def __init__(self, users=None, groups=None, ledgers=None):
+        self.users = users if users is not None else {}
+        self.groups = groups if groups is not None else {}
+        self.ledgers = ledgers if ledgers is not None else {}
+        # Snapshots written before memberships became ordered sets hold lists
+        for user in self.users.values():
+            if isinstance(user["groups"], list):
+                user["groups"] = dict.fromkeys(user["groups"])
+        for group in self.groups.values():
+            if isinstance(group["members"], list):
+                group["members"] = dict.fromkeys(group["members"])
+
+    def apply(self, event):
+        handler = getattr(self, "_" + event["type"], None)
+        if handler is None:
+            raise ValueError(f"Unknown event type {event['type']!r}")
+        handler(event)
+
+    def _user_saved(self, event):
+        user = self.users.setdefault(event["email"], {"full_name": event["full_name"], "groups": {}, "expenses": []})
+        user["full_name"] = event["full_name"]
+
+    def _group_created(self, event):
+        self.groups[event["group"]] = {"members": {}, "expenses": [], "version": 0}
+        self._member_added({"group": event["group"], "email": event["owner"]})
+
+    def _advance(self, group_name):
+        group = self.groups[group_name]
+        group["version"] = group.get("version", 1) + 1
+
+    def _group_renamed(self, event):
+        old, new = event["group"], event["new_name"]
+        self.groups[new] = self.groups.pop(old)
+        self._advance(new)
+        if old in self.ledgers:
+            self.ledgers[new] = self.ledgers.pop(old)
+        for email in self.groups[new]["members"]:
+            if email in self.users:
+                # Rebuilt to keep the renamed group in its place
+                user = self.users[email]
+                user["groups"] = {new if name == old else name: None for name in user["groups"]}
+
+    def _group_deleted(self, event):
+        group = self.groups.pop(event["group"], None)
+        self.ledgers.pop(event["group"], None)
+        for email in group["members"] if group else ():
+            if email in self.users:
+                self.users[email]["groups"].pop(event["group"], None)
+
+    def _member_added(self, event):
+        if event.get("full_name") is not None and event["email"] not in self.users:
+            self._user_saved(event)
+        self._advance(event["group"])
+        members = self.groups[event["group"]]["members"]
+        if event["email"] not in members:
+            members[event["email"]] = None
+            if event["email"] in self.users:
+                self.users[event["email"]]["groups"][event["group"]] = None
+
+    def _member_removed(self, event):
+        self._advance(event["group"])
+        members = self.groups[event["group"]]["members"]
+        if event["email"] in members:
+            del members[event["email"]]
+            if event["email"] in self.users:
+                self.users[event["email"]]["groups"].pop(event["group"], None)
+
+    def _expenses_added(self, event):
+        self._advance(event["group"])
+        self.groups[event["group"]]["expenses"].extend(event["expenses"])
+        apply_expenses(self.ledgers.setdefault(event["group"], {}), event["expenses"])
+
+
+class EventStore:
+    def __init__(self, path=LOG_DIR, snapshot_every=SNAPSHOT_EVERY, sync=True):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.snapshot_every = snapshot_every
+        # fsync every append; turn off only for bulk imports and benchmarks
+        self.sync = sync
+        self._lock = threading.RLock()
+        self.state = State()
+        self.seq = 0
+        self.replayed = 0
+        self.snapshot_seq = 0
+        self._open()
+
+    # -- log files -----------------------------------------------------------
+
+    def _segment_path(self, first_seq):
+        return self.path / f"events-{first_seq:012d}.log"
+
+    def _snapshot_path(self, seq):
+        return self.path / f"snapshot-{seq:012d}.json"
+
+    def _segments(self):
+        return sorted((int(p.stem.split("-")[1]), p) for p in self.path.glob("events-*.log"))
+
+    def _snapshots(self):
+        return sorted((int(p.stem.split("-")[1]), p) for p in self.path.glob("snapshot-*.json"))
+
+    def _open(self):
+        snapshots = self._snapshots()
+        if snapshots:
+            self.snapshot_seq, snapshot_path = snapshots[-1]
+            with open(snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            self.state = State(snapshot["users"], snapshot["groups"], snapshot["ledgers"])
+            self.seq = snapshot["seq"]
+
+        segments = [(first, path) for first, path in self._segments() if first > self.snapshot_seq]
+        for first, path in segments:
+            self._replay_segment(path)
+        if not segments:
+            self._start_segment(self.seq + 1)
+        else:
+            self._file = open(segments[-1][1], "ab")
+
+    def _replay_segment(self, path):
+        good_bytes = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash; everything before it is intact
+                event = _decode(line.decode())
+                if event["seq"] > self.seq:
+                    self.state.apply(event)
+                    self.seq = event["seq"]
+                    self.replayed += 1
+                good_bytes += len(line)
+        if good_bytes < path.stat().st_size:
+            with open(path, "r+b") as f:
+                f.truncate(good_bytes)
+
+    def _start_segment(self, first_seq):
+        self._file = open(self._segment_path(first_seq), "ab")
+        _fsync_dir(self.path)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    # -- writing -------------------------------------------------------------
+
+    def append(self, event_type, **fields):
+        return self.append_many([dict(fields, type=event_type)])
+
+    def append_many(self, events):
+        """Durably append ``events`` (dicts with a ``type``), then apply them.
+
+        Nothing is applied until the lines are written and fsync'd, so the
+        in-memory state never shows a change the log could lose. A failed
+        write is cut back off the segment and raises.
+        """
+        with self._lock:
+            seq = self.seq
+            logged = []
+            for event in events:
+                if not hasattr(State, "_" + event["type"]):
+                    raise ValueError(f"Unknown event type {event['type']!r}")
+                seq += 1
+                logged.append(dict(event, seq=seq, time=time.time()))
+            data = b"".join(json.dumps(event, separators=(",", ":")).encode() + b"\n" for event in logged)
+            end = self._file.tell()
+            try:
+                self._file.write(data)
+                self._file.flush()
+                if self.sync:
+                    os.fsync(self._file.fileno())
+            except BaseException:
+                self._file.truncate(end)
+                raise
+            for event in logged:
+                self.state.apply(event)
+            self.seq = seq
+            if self.seq - self.snapshot_seq >= self.snapshot_every:
+                self.snapshot()
+            return self.seq
+
+    def snapshot(self):
+        """Write the current state as a snapshot and start a new segment."""
+        with self._lock:
+            path = self._snapshot_path(self.seq)
+            tmp = path.with_suffix(".tmp")
+            # dumps() uses the C encoder; dump() to a file would not
+            data = json.dumps({"seq": self.seq, "users": self.state.users, "groups": self.state.groups,
+                               "ledgers": self.state.ledgers}, separators=(",", ":"))
+            with open(tmp, "w") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            self.snapshot_seq = self.seq
+            self._file.close()
+            self._start_segment(self.seq + 1)
+            return path
+
+    def compact(self, keep_snapshots=1):
+        """Delete segments and snapshots older than the newest ``keep_snapshots`` snapshots."""
+        with self._lock:
+            snapshots = self._snapshots()
+            if len(snapshots) < keep_snapshots or not snapshots:
+                return 0
+            oldest_kept = snapshots[-keep_snapshots][0]
+            removed = 0
+            for seq, path in snapshots[:-keep_snapshots]:
+                path.unlink()
+                removed += 1
+            segments = self._segments()
+            for (first, path), (next_first, _) in zip(segments, segments[1:]):
+                # A segment is obsolete once the next one starts at or before the oldest kept snapshot
+                if next_first <= oldest_kept + 1:
+                    path.unlink()
+                    removed += 1
+            return removed
+
+    # -- reading -------------------------------------------------------------
+
+    def read_events(self, after=0):
+        """Yield logged events with ``seq > after``, oldest first (a change feed)."""
+        segments = self._segments()
+        for index, (first, path) in enumerate(segments):
+            next_first = segments[index + 1][0] if index + 1 < len(segments) else None
+            if next_first is not None and next_first <= after + 1:
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    event = _decode(line.decode())
+                    if event["seq"] > after:
+                        yield event
+
+    # -- the Store interface -------------------------------------------------
+
+    def data_version(self):
+        return self.seq
+
+    def load(self):
+        with self._lock:
+            return _copy(self.state.users), _copy(self.state.groups)
+
+    def load_ledgers(self):
+        with self._lock:
+            return _copy(self.state.ledgers)
+
+    def load_ledger(self, group_name):
+        with self._lock:
+            return _copy(self.state.ledgers.get(group_name, {}))
+
+    def load_group_expenses(self, group_name):
+        with self._lock:
+            return _copy(self.state.groups[group_name]["expenses"])
+
+    def group_version(self, group_name):
+        with self._lock:
+            group = self.state.groups.get(group_name)
+            return group.get("version", 1) if group else None
+
+    def _append_checked(self, group_name, expected_version, event_type, **fields):
+        # Check and append under one lock hold, like Store's single UPDATE
+        with self._lock:
+            actual = self.group_version(group_name)
+            if actual is None or (expected_version is not None and actual != expected_version):
+                raise ConflictError(group_name, expected_version, actual)
+            self.append(event_type, group=group_name, **fields)
+            return self.group_version(group_name)
+
+    def save_user(self, email, full_name):
+        self.append("user_saved", email=email, full_name=full_name)
+
+    def create_group(self, group_name, owner_email):
+        with self._lock:
+            if group_name in self.state.groups:
+                raise ConflictError(group_name, 0, self.group_version(group_name))
+            self.append("group_created", group=group_name, owner=owner_email)
+            return self.group_version(group_name)
+
+    def rename_group(self, group_name, new_name, expected_version=None):
+        with self._lock:
+            if new_name in self.state.groups:
+                raise ConflictError(new_name, 0, self.group_version(new_name))
+            self._append_checked(group_name, expected_version, "group_renamed", new_name=new_name)
+            return self.group_version(new_name)
+
+    def delete_group(self, group_name, expected_version=None):
+        self._append_checked(group_name, expected_version, "group_deleted")
+
+    def add_member(self, group_name, email, full_name=None, expected_version=None):
+        return self._append_checked(group_name, expected_version, "member_added", email=email, full_name=full_name)
+
+    def remove_member(self, group_name, email, expected_version=None):
+        return self._append_checked(group_name, expected_version, "member_removed", email=email)
+
+    def add_expenses(self, group_name, expenses, messages=(), expected_version=None):
+        """Like ``Store.add_expenses``; ``messages`` are logged in the same event.
+
+        There is no outbox here: consumers of ``read_events`` pick the
+        notifications up from the ``expenses_added`` event they came with.
+        """
+        fields = {"messages": list(messages)} if messages else {}
+        return self._append_checked(group_name, expected_version, "expenses_added", expenses=list(expenses),
+                                    **fields)
+
+
+def export_store(store, event_store):
+    """Write the contents of a SQLite ``Store`` into an empty ``EventStore``."""
+    users, groups = store.load()
+    events = [{"type": "user_saved", "email": email, "full_name": user["full_name"]}
+              for email, user in users.items()]
+    for group_name, group in groups.items():
+        members = list(group["members"])
+        if not members:
+            continue
+        events.append({"type": "group_created", "group": group_name, "owner": members[0]})
+        events.extend({"type": "member_added", "group": group_name, "email": email} for email in members[1:])
+        if group["expenses"]:
+            events.append({"type": "expenses_added", "group": group_name, "expenses": list(group["expenses"])})
+    event_store.append_many(events)
+    return len(events)
+
+
+def _copy(value):
+    # Callers get their own copy, like rows freshly read from SQLite
+    return json.loads(json.dumps(value))
+
+
+def _fsync_dir(path):
+    # Make a new file's directory entry durable (not supported on Windows)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartSplit expense event log")
+    parser.add_argument("--log", default=str(LOG_DIR))
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export = subcommands.add_parser("export", help="copy a SQLite store into a new event log")
+    export.add_argument("--db", default=str(DB_FILE))
+    subcommands.add_parser("replay", help="open the log and report what was replayed")
+    subcommands.add_parser("snapshot", help="write a snapshot and start a new segment")
+    compact = subcommands.add_parser("compact", help="delete segments covered by snapshots")
+    compact.add_argument("--keep", type=int, default=1, help="snapshots to keep")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    event_store = EventStore(args.log)
+    opened = time.perf_counter() - start
+    if args.command == "export":
+        from smartsplit.storage import Store
+        if event_store.seq:
+            parser.error(f"{args.log} already holds {event_store.seq} events")
+        store = Store(args.db)
+        print(f"Exported {export_store(store, event_store)} events from {store.path}")
+        store.close()
+    elif args.command == "replay":
+        users, groups = event_store.load()
+        print(f"seq {event_store.seq}: snapshot at {event_store.snapshot_seq}, "
+              f"replayed {event_store.replayed} events in {opened:.2f} s; "
+              f"{len(users)} users, {len(groups)} groups")
+    elif args.command == "snapshot":
+        print(f"Wrote {event_store.snapshot()}")
+    elif args.command == "compact":
+        print(f"Removed {event_store.compact(args.keep)} file(s)")
+    event_store.close()
+
+
+if __name__ == "__main__":
+    main()
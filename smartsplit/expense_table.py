@@ -0,0 +1,151 @@
+"""Compact in-memory storage for a group's saved expenses.
+
+An expense dict costs several hundred bytes: the dict itself, two lists
+repeating the assignees' email strings and their shares, an int object per
+amount and a 26-character ISO date. ``ExpenseTable`` keeps the same data as
+struct-of-arrays columns instead:
+
+- members are interned to small integer ids, in a ``MemberIds`` that the
+  tables of one load share, so each email is stored once per process;
+- payer, amount and date are one machine integer each in ``array``
+  columns; dates are microseconds since the epoch;
+- assignees and shares of all expenses are concatenated, CSR style,
+  delimited by ``offsets``;
+- item names are interned, since receipts repeat them.
+
+The table behaves like the list of expense dicts it replaces (``len``,
+iteration, indexing, ``append``/``extend``, ``==``); dicts are built on
+access. A date that would not come back as the identical string (another
+format, or a timezone) is kept as text.
+"""
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class MemberIds:
+    """Interns emails to dense integer ids."""
+
+    __slots__ = ("emails", "ids")
+
+    def __init__(self):
+        self.emails = []
+        self.ids = {}
+
+    def intern(self, email):
+        member_id = self.ids.get(email)
+        if member_id is None:
+            member_id = self.ids[email] = len(self.emails)
+            self.emails.append(email)
+        return member_id
+
+
+class ExpenseTable:
+    __slots__ = ("members", "ids", "items", "payers", "amounts", "dates", "offsets", "assignees", "shares",
+                 "text_dates")
+
+    def __init__(self, expenses=(), members=None):
+        self.members = members if members is not None else MemberIds()
+        self.ids = []
+        self.items = []
+        self.payers = array("i")
+        self.amounts = array("q")
+        self.dates = array("q")
+        self.offsets = array("q", [0])
+        self.assignees = array("i")
+        self.shares = array("q")
+        # Row -> date string, for dates that don't round-trip through an integer
+        self.text_dates = {}
+        self.extend(expenses)
+
+    def append_row(self, expense_id, item, amount, payer, assignees, shares, date):
+        intern = self.members.intern
+        micros = encode_date(date)
+        if micros is None:
+            self.text_dates[len(self.ids)] = date
+            micros = 0
+        self.ids.append(expense_id)
+        self.items.append(sys.intern(item))
+        self.payers.append(intern(payer))
+        self.amounts.append(amount)
+        self.dates.append(micros)
+        self.assignees.extend([intern(email) for email in assignees])
+        self.shares.extend(shares)
+        self.offsets.append(len(self.assignees))
+
+    def append(self, expense):
+        self.append_row(expense["id"], expense["item"], expense["amount"], expense["payer"],
+                        expense["assignees"], expense["shares"], expense["date"])
+
+    def extend(self, expenses):
+        for expense in expenses:
+            self.append(expense)
+
+    def copy(self):
+        """A table with its own copy of the columns, sharing ``members``."""
+        table = ExpenseTable(members=self.members)
+        table.ids = list(self.ids)
+        table.items = list(self.items)
+        for column in ("payers", "amounts", "dates", "offsets", "assignees", "shares"):
+            setattr(table, column, array(getattr(self, column).typecode, getattr(self, column)))
+        table.text_dates = dict(self.text_dates)
+        return table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._expense(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("expense index out of range")
+        return self._expense(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._expense(i)
+
+    def __eq__(self, other):
+        if not isinstance(other, (ExpenseTable, list)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<ExpenseTable of {len(self)} expenses>"
+
+    def _expense(self, i):
+        emails = self.members.emails
+        start, end = self.offsets[i], self.offsets[i + 1]
+        date = self.text_dates.get(i)
+        return {
+            "id": self.ids[i],
+            "item": self.items[i],
+            "amount": self.amounts[i],
+            "payer": emails[self.payers[i]],
+            "assignees": [emails[member_id] for member_id in self.assignees[start:end]],
+            "shares": self.shares[start:end].tolist(),
+            "date": date if date is not None else decode_date(self.dates[i]),
+        }
+
+
+def encode_date(text):
+    """Microseconds since the epoch for a naive ``isoformat()`` string, else None."""
+    try:
+        moment = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    # Naive and in isoformat()'s own spelling, so decode_date gives back the same text
+    if moment.tzinfo is not None or moment.isoformat() != text:
+        return None
+    return (moment - EPOCH) // MICROSECOND
+
+
+def decode_date(micros):
+    return (EPOCH + timedelta(microseconds=micros)).isoformat()
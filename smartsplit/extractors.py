@@ -0,0 +1,139 @@
+"""Pluggable receipt extraction backends.
+
+Every extractor turns a ``PreparedImage`` into the parsed-receipt dict
+described in ``smartsplit.receipts``, so the split UI does not care which
+one produced it:
+
+* ``GeminiExtractor`` asks Gemini for structured JSON, falling back to the
+  streamed text format when the JSON reply doesn't validate.
+* ``TesseractExtractor`` runs local OCR (``pytesseract`` plus the tesseract
+  binary, both optional) and the plain receipt-line parser. It needs no
+  network or API key and answers in well under a second.
+* ``ChainExtractor`` tries backends in order and accepts the first result
+  that passes its ``accept`` check; failures fall through to the next
+  backend, and the last backend's answer is taken as-is. Only the last
+  backend streams items as they arrive; the others report theirs once
+  their result is accepted.
+
+``build_extractor`` assembles one from a mode name (``RECEIPT_EXTRACTOR``).
+"""
+from smartsplit.metrics import timer
+from smartsplit.receipts import (
+    JSON_PROMPT, MODEL_NAME, PROMPT, ReceiptFormatError, extract_receipt, extract_receipt_json, looks_complete,
+    parse_receipt_lines,
+)
+
+MODES = ("gemini", "local", "local-first", "gemini-first")
+
+
+class ExtractorUnavailable(RuntimeError):
+    pass
+
+
+class GeminiExtractor:
+    name = "gemini"
+
+    def __init__(self, model=None, model_name=MODEL_NAME, structured=True):
+        self.model_name = model_name
+        self.structured = structured
+        self.prompt = JSON_PROMPT if structured else PROMPT
+        self.cache_id = model_name
+        self._model = model
+
+    def available(self):
+        return True
+
+    def extract(self, prepared, on_item=None):
+        if self._model is None:
+            import google.generativeai as genai
+            self._model = genai.GenerativeModel(self.model_name)
+        if self.structured:
+            try:
+                receipt = extract_receipt_json(self._model, prepared.blob())
+            except ReceiptFormatError:
+                pass  # ask again in the text format, which tolerates bad lines
+            else:
+                _report_items(receipt, on_item)
+                return receipt
+        return extract_receipt(self._model, prepared.blob(), PROMPT, on_item=on_item)
+
+
+class TesseractExtractor:
+    name = "tesseract"
+    cache_id = "tesseract"
+    prompt = ""
+
+    def __init__(self, config="--psm 6"):
+        # psm 6: treat the image as one uniform block of text lines
+        self.config = config
+
+    def available(self):
+        try:
+            import pytesseract
+            pytesseract.get_tesseract_version()
+        except Exception:
+            return False
+        return True
+
+    def extract(self, prepared, on_item=None):
+        try:
+            import pytesseract
+        except ImportError:
+            raise ExtractorUnavailable("pytesseract is not installed") from None
+        with timer("ocr.tesseract"):
+            text = pytesseract.image_to_string(prepared.image, config=self.config)
+        with timer("receipt.parse"):
+            receipt = parse_receipt_lines(text)
+        _report_items(receipt, on_item)
+        return receipt
+
+
+class ChainExtractor:
+    name = "chain"
+
+    def __init__(self, extractors, accept=looks_complete):
+        self.accept = accept
+        self.extractors = [extractor for extractor in extractors if extractor.available()]
+        if not self.extractors:
+            raise ExtractorUnavailable("No receipt extractor is available")
+        self.cache_id = "+".join(extractor.cache_id for extractor in self.extractors)
+        self.prompt = self.extractors[-1].prompt
+
+    def available(self):
+        return True
+
+    def extract(self, prepared, on_item=None):
+        for extractor in self.extractors[:-1]:
+            # Hold items back until the result is accepted, so a rejected
+            # backend's items are never shown next to the fallback's
+            items = []
+            try:
+                receipt = extractor.extract(prepared, items.append)
+            except Exception:
+                continue
+            if self.accept(receipt):
+                if on_item is not None:
+                    for item in items:
+                        on_item(item)
+                return receipt
+        return self.extractors[-1].extract(prepared, on_item)
+
+
+def build_extractor(mode="gemini", model=None, structured=True):
+    if mode == "gemini":
+        return GeminiExtractor(model, structured=structured)
+    if mode == "local":
+        return ChainExtractor([TesseractExtractor()])
+    if mode == "local-first":
+        return ChainExtractor([TesseractExtractor(), GeminiExtractor(model, structured=structured)])
+    if mode == "gemini-first":
+        return ChainExtractor([GeminiExtractor(model, structured=structured), TesseractExtractor()],
+                              accept=lambda receipt: bool(receipt["items"]))
+    raise ValueError(f"Unknown receipt extractor {mode!r}; expected one of {', '.join(MODES)}")
+
+
+def _report_items(receipt, on_item):
+    # Backends that parse the whole reply at once report every item at the end
+    if on_item is not None:
+        for item in receipt["items"]:
+            on_item(item)
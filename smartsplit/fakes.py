@@ -0,0 +1,221 @@
+"""Local stand-ins for the Google services, for tests and benchmarks."""
+import base64
+import email
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qs
+
+CANNED_RECEIPT = """ITEMS:
+Milk: $3.49
+Bread: $2.99
+Coffee Beans: $12.50
+
+TAXES:
+C-taxable: $0.95
+
+TOTALS:
+Subtotal: $18.98
+Total: $19.93"""
+
+CANNED_RECEIPT_JSON = json.dumps({
+    "items": [{"name": "Milk", "price": 3.49}, {"name": "Bread", "price": 2.99},
+              {"name": "Coffee Beans", "price": 12.5}],
+    "taxes": [{"name": "C-taxable", "amount": 0.95}],
+    "subtotal": 18.98,
+    "total": 19.93,
+})
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeRateLimitError(Exception):
+    """Shaped like ``google.api_core.exceptions.ResourceExhausted``."""
+
+    code = 429
+
+
+class FakeModel:
+    """Mimics ``genai.GenerativeModel`` and returns a canned reply.
+
+    ``json_text`` answers requests for ``application/json`` output and
+    ``text`` everything else; ``stream=True`` returns the reply in
+    ``chunk_size``-character chunks spread over the call. ``latency`` seconds
+    are spent per call. A call fails with a 429 when more than
+    ``max_in_flight`` calls are running at once, or at random with
+    probability ``rate_limit_rate``.
+    """
+
+    def __init__(self, text=CANNED_RECEIPT, latency=0.0, max_in_flight=None, rate_limit_rate=0.0, seed=0,
+                 json_text=CANNED_RECEIPT_JSON, chunk_size=16):
+        self.text = text
+        self.json_text = json_text
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+        self.rate_limit_rate = rate_limit_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self._in_flight = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        wants_json = (generation_config or {}).get("response_mime_type") == "application/json"
+        text = self.json_text if wants_json else self.text
+        with self._lock:
+            self.calls += 1
+            self._in_flight += 1
+            overloaded = self.max_in_flight is not None and self._in_flight > self.max_in_flight
+            unlucky = self._random.random() < self.rate_limit_rate
+            if overloaded or unlucky:
+                self.rate_limited += 1
+                self._in_flight -= 1
+                raise FakeRateLimitError("429 Resource has been exhausted")
+        if stream:
+            return self._stream(text)
+        try:
+            time.sleep(self.latency)
+            return FakeResponse(text)
+        finally:
+            self._done()
+
+    def _stream(self, text):
+        try:
+            chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+            for chunk in chunks:
+                time.sleep(self.latency / len(chunks))
+                yield FakeResponse(chunk)
+        finally:
+            self._done()
+
+    def _done(self):
+        with self._lock:
+            self._in_flight -= 1
+
+
+class FakeHttpError(Exception):
+    """Shaped like ``googleapiclient.errors.HttpError``."""
+
+    def __init__(self, status_code, reason):
+        super().__init__(f"<HttpError {status_code}: {reason}>")
+        self.status_code = status_code
+
+
+class FakeGmailService:
+    """Mimics the Gmail API client's ``users().messages().send`` and batch
+    requests. Sent messages are parsed back into ``sent``; ``latency``
+    seconds are spent per message. Messages addressed to ``fail_for`` fail
+    with a 400, and any message fails with a 503 with probability
+    ``error_rate``.
+    """
+
+    def __init__(self, latency=0.0, fail_for=(), error_rate=0.0, seed=0):
+        self.latency = latency
+        self.fail_for = set(fail_for)
+        self.error_rate = error_rate
+        self.sent = []
+        self.batches = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def send(self, userId, body):
+        return _FakeSendRequest(self, body)
+
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatchRequest(self, callback)
+
+    def _deliver(self, body, delay=True):
+        message = email.message_from_bytes(base64.urlsafe_b64decode(body['raw']))
+        if delay:
+            time.sleep(self.latency)
+        if message['to'] in self.fail_for:
+            raise FakeHttpError(400, f"Invalid To header: {message['to']}")
+        with self._lock:
+            if self._random.random() < self.error_rate:
+                raise FakeHttpError(503, "The service is currently unavailable.")
+            self.sent.append(message)
+            return {"id": str(len(self.sent)), "labelIds": ["SENT"]}
+
+
+class _FakeSendRequest:
+    def __init__(self, service, body):
+        self.service = service
+        self.body = body
+
+    def execute(self, http=None, num_retries=0):
+        return self.service._deliver(self.body)
+
+
+class _FakeBatchRequest:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback or self.callback, request_id or str(len(self.requests) + 1)))
+
+    def execute(self, http=None):
+        # One round trip for the whole batch
+        with self.service._lock:
+            self.service.batches += 1
+        time.sleep(self.service.latency)
+        for request, callback, request_id in self.requests:
+            try:
+                response, exc = self.service._deliver(request.body, delay=False), None
+            except Exception as error:
+                response, exc = None, error
+            if callback is not None:
+                callback(request_id, response, exc)
+
+
+class FakeTokenEndpoint:
+    """Google's OAuth token endpoint, as a ``google.auth`` transport request.
+
+    Pass it wherever a ``google.auth.transport.requests.Request()`` goes,
+    e.g. ``credentials.refresh(endpoint)``. Refresh grants get a new access
+    token valid for ``expires_in`` seconds, after ``latency`` seconds;
+    refresh tokens in ``revoked`` get Google's ``invalid_grant`` error.
+    ``requests`` records the form fields of every call.
+    """
+
+    def __init__(self, expires_in=3600, revoked=(), latency=0.0):
+        self.expires_in = expires_in
+        self.revoked = set(revoked)
+        self.latency = latency
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if isinstance(body, bytes):
+            body = body.decode()
+        fields = {key: values[0] for key, values in parse_qs(body or "").items()}
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests.append(fields)
+            issued = len(self.requests)
+        if fields.get("grant_type") != "refresh_token":
+            return _FakeTokenResponse(400, {"error": "unsupported_grant_type"})
+        if fields.get("refresh_token") in self.revoked:
+            return _FakeTokenResponse(400, {"error": "invalid_grant",
+                                            "error_description": "Token has been expired or revoked."})
+        return _FakeTokenResponse(200, {"access_token": f"fake-access-token-{issued}", "token_type": "Bearer",
+                                        "expires_in": self.expires_in, "scope": fields.get("scope", "")})
+
+
+class _FakeTokenResponse:
+    def __init__(self, status, payload):
+        self.status = status
+        self.headers = {"content-type": "application/json"}
+        self.data = json.dumps(payload).encode()
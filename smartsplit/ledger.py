@@ -0,0 +1,58 @@
+"""Per-group "who owes whom" balances.
+
+A ledger maps ``debtor_email -> {creditor_email: cents}``. It is kept up to
+date incrementally as expenses are saved, so the summary never has to walk a
+group's full expense history; ``build_ledger`` and ``verify_ledger`` recompute
+it from scratch to check the stored copy.
+"""
+from smartsplit.expense_table import ExpenseTable
+
+
+def apply_expenses(ledger, expenses):
+    """Add the debts created by ``expenses`` to ``ledger`` in place."""
+    for expense in expenses:
+        payer = expense["payer"]
+        for assignee, share in zip(expense["assignees"], expense["shares"]):
+            if assignee != payer:  # Don't count if someone owes themselves
+                owes_to = ledger.setdefault(assignee, {})
+                owes_to[payer] = owes_to.get(payer, 0) + share
+    return ledger
+
+
+# Above this many rows an ExpenseTable is rebuilt through the NumPy aggregation
+VECTORIZE_THRESHOLD = 256
+
+
+def build_ledger(expenses):
+    """Ledger of ``expenses`` from scratch.
+
+    Only an ``ExpenseTable`` is vectorized: its columns convert to NumPy
+    without building a dict per row. Turning a list of dicts into columns
+    costs more than the Python loop it would replace.
+    """
+    if not isinstance(expenses, ExpenseTable) or len(expenses) < VECTORIZE_THRESHOLD:
+        return apply_expenses({}, expenses)
+    from smartsplit.columnar import ExpenseColumns, matrix_to_ledger
+
+    columns = ExpenseColumns.from_table(expenses)
+    return matrix_to_ledger(columns.balance_matrix(), columns.members)
+
+
+def verify_ledger(ledger, expenses):
+    """Compare ``ledger`` with one rebuilt from ``expenses``.
+
+    Amounts are integer cents, so they must match exactly. Returns a list of
+    ``(debtor, creditor, stored, expected)`` tuples for every pair that
+    differs; an empty list means the ledger is consistent.
+    """
+    expected = build_ledger(expenses)
+    mismatches = []
+    for debtor in ledger.keys() | expected.keys():
+        stored_row = ledger.get(debtor, {})
+        expected_row = expected.get(debtor, {})
+        for creditor in stored_row.keys() | expected_row.keys():
+            stored = stored_row.get(creditor, 0)
+            wanted = expected_row.get(creditor, 0)
+            if stored != wanted:
+                mismatches.append((debtor, creditor, stored, wanted))
+    return mismatches
@@ -0,0 +1,86 @@
+"""Sending notification emails through the Gmail API.
+
+A ``MailDispatcher`` wraps one Gmail service client, built once per login
+instead of once per message. ``send_many`` pushes messages through a bounded
+thread pool; the service's httplib2 transport is not thread-safe, so each
+worker executes requests on its own ``Http`` from ``http_factory``.
+``send_batch`` instead packs them into Gmail batch HTTP requests. Both yield
+``(recipient, response, error)`` per message, in completion order.
+"""
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from smartsplit.metrics import timed
+
+# Gmail accepts up to 100 calls per batch but recommends staying under 50
+BATCH_SIZE = 50
+
+
+def build_gmail_service(credentials):
+    from googleapiclient.discovery import build
+    return build('gmail', 'v1', credentials=credentials, cache_discovery=False)
+
+
+def authorized_http_factory(credentials):
+    """A factory of per-thread authorized transports for ``credentials``."""
+    import google_auth_httplib2
+    import httplib2
+    return lambda: google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+
+
+def encode_message(message):
+    """The ``messages.send`` body for an ``email.message.Message``."""
+    return {'raw': base64.urlsafe_b64encode(message.as_bytes()).decode()}
+
+
+class MailDispatcher:
+    def __init__(self, service, http_factory=None, max_workers=8, num_retries=3):
+        self.service = service
+        self.http_factory = http_factory
+        self.max_workers = max_workers
+        # The client library retries 429 and 5xx responses itself, with backoff
+        self.num_retries = num_retries
+        self._local = threading.local()
+
+    @timed("gmail.send")
+    def send(self, message):
+        request = self._request(message)
+        if self.http_factory is None:
+            return request.execute(num_retries=self.num_retries)
+        if not hasattr(self._local, "http"):
+            self._local.http = self.http_factory()
+        return request.execute(http=self._local.http, num_retries=self.num_retries)
+
+    def send_many(self, messages):
+        """Send ``messages`` (``{recipient: message}``) on a worker pool."""
+        workers = max(1, min(self.max_workers, len(messages)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mail") as pool:
+            futures = {pool.submit(self.send, message): recipient for recipient, message in messages.items()}
+            for future in as_completed(futures):
+                recipient = futures[future]
+                try:
+                    yield recipient, future.result(), None
+                except Exception as exc:
+                    yield recipient, None, exc
+
+    def send_batch(self, messages, batch_size=BATCH_SIZE):
+        """Send ``messages`` (``{recipient: message}``) as Gmail batch requests."""
+        recipients = list(messages)
+        for start in range(0, len(recipients), batch_size):
+            results = []
+            batch = self.service.new_batch_http_request(
+                callback=lambda request_id, response, exc: results.append((request_id, response, exc)))
+            for recipient in recipients[start:start + batch_size]:
+                batch.add(self._request(messages[recipient]), request_id=recipient)
+            try:
+                batch.execute()
+            except Exception as exc:
+                # The whole batch call failed; report it against every message in it
+                answered = {request_id for request_id, _, _ in results}
+                results.extend((recipient, None, exc) for recipient in recipients[start:start + batch_size]
+                               if recipient not in answered)
+            yield from results
+
+    def _request(self, message):
+        return self.service.users().messages().send(userId='me', body=encode_message(message))
@@ -0,0 +1,253 @@
+"""Lightweight timings and counters for the app's hot paths.
+
+``with timer("stage"):`` and ``@timed("stage")`` record how long a stage
+took into a per-stage histogram; ``count("name")`` bumps a counter. The
+registry is process-wide and thread-safe, since sessions, the extraction
+pool and the outbox worker all record into it.
+
+Recording is off until ``configure(enabled=True)`` (the app does this when
+``SMARTSPLIT_METRICS`` is set). While it is off, ``timer`` returns a shared
+no-op and ``timed`` costs one attribute check per call. With a ``trace``
+path every timing is also appended to a JSONL file, one
+``{"ts", "stage", "seconds", "thread"}`` object per line.
+
+``prometheus_text()`` renders the registry in the Prometheus text format and
+``summary()`` gives count and p50/p95/p99 per stage. For a recorded trace:
+
+    python -m smartsplit.metrics summarize data/metrics.jsonl
+    python -m smartsplit.metrics summarize data/metrics.jsonl --prometheus
+"""
+import argparse
+import functools
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Histogram bucket upper bounds in seconds, for the Prometheus export
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Most recent samples kept per stage for the percentiles
+WINDOW = 2048
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "sum", "max", "recent")
+
+    def __init__(self):
+        # One slot per bound plus +Inf; not cumulative until exported
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        """Nearest-rank percentile over the recent window, or None without samples."""
+        if not self.recent:
+            return None
+        values = sorted(self.recent)
+        return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._trace = None
+
+    def configure(self, enabled=True, trace=None):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+            self.enabled = enabled
+            # Line-buffered, so the trace is readable while the app runs
+            self._trace = open(trace, "a", buffering=1) if enabled and trace else None
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+            if self._trace is not None:
+                self._trace.write(json.dumps({
+                    "ts": round(time.time(), 6), "stage": stage, "seconds": seconds,
+                    "thread": threading.current_thread().name,
+                }) + "\n")
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def summary(self):
+        """Per-stage ``{stage, count, total, p50, p95, p99, max}`` dicts, most total time first."""
+        with self._lock:
+            rows = [{
+                "stage": stage, "count": histogram.count, "total": histogram.sum,
+                "p50": histogram.percentile(0.50), "p95": histogram.percentile(0.95),
+                "p99": histogram.percentile(0.99), "max": histogram.max,
+            } for stage, histogram in self.histograms.items()]
+        rows.sort(key=lambda row: -row["total"])
+        return rows
+
+    def prometheus_text(self):
+        lines = []
+        with self._lock:
+            if self.histograms:
+                lines.append("# HELP smartsplit_stage_seconds Time spent in each instrumented stage.")
+                lines.append("# TYPE smartsplit_stage_seconds histogram")
+            for stage, histogram in sorted(self.histograms.items()):
+                label = _label(stage)
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.buckets):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else repr(bound)
+                    lines.append(f'smartsplit_stage_seconds_bucket{{stage="{label}",le="{le}"}} {cumulative}')
+                lines.append(f'smartsplit_stage_seconds_sum{{stage="{label}"}} {histogram.sum!r}')
+                lines.append(f'smartsplit_stage_seconds_count{{stage="{label}"}} {histogram.count}')
+            if self.counters:
+                lines.append("# HELP smartsplit_events_total Events counted by the app.")
+                lines.append("# TYPE smartsplit_events_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'smartsplit_events_total{{name="{_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n" if lines else ""
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Timer:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.observe(self.stage, time.perf_counter() - self.start)
+        if exc_type is not None:
+            REGISTRY.count(f"{self.stage}.errors")
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return None
+
+
+REGISTRY = Registry()
+_NO_TIMER = _NoTimer()
+
+
+def configure(enabled=True, trace=None):
+    REGISTRY.configure(enabled, trace)
+
+
+def enabled():
+    return REGISTRY.enabled
+
+
+def timer(stage):
+    """Context manager timing its block as ``stage`` (a no-op while metrics are off)."""
+    if not REGISTRY.enabled:
+        return _NO_TIMER
+    return _Timer(stage)
+
+
+def timed(stage):
+    """Decorator timing every call of the function as ``stage``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not REGISTRY.enabled:
+                return func(*args, **kwargs)
+            with _Timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe(stage, seconds):
+    """Record a duration measured elsewhere."""
+    if REGISTRY.enabled:
+        REGISTRY.observe(stage, seconds)
+
+
+def count(name, value=1):
+    if REGISTRY.enabled:
+        REGISTRY.count(name, value)
+
+
+def counters():
+    with REGISTRY._lock:
+        return dict(REGISTRY.counters)
+
+
+def summary():
+    return REGISTRY.summary()
+
+
+def prometheus_text():
+    return REGISTRY.prometheus_text()
+
+
+def reset():
+    REGISTRY.reset()
+
+
+def read_trace(path):
+    """Replay a JSONL trace into a fresh ``Registry``."""
+    registry = Registry()
+    with open(path, "r") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                registry.observe(record["stage"], record["seconds"])
+    return registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartSplit timing metrics")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    summarize = subcommands.add_parser("summarize", help="percentiles per stage from a JSONL trace")
+    summarize.add_argument("trace")
+    summarize.add_argument("--prometheus", action="store_true", help="print the Prometheus text format instead")
+    args = parser.parse_args()
+
+    registry = read_trace(args.trace)
+    if args.prometheus:
+        print(registry.prometheus_text(), end="")
+        return
+    print(f"{'stage':<28} {'count':>7} {'total s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for row in registry.summary():
+        print(f"{row['stage']:<28} {row['count']:>7} {row['total']:>9.2f} {row['p50'] * 1000:>8.1f} "
+              f"{row['p95'] * 1000:>8.1f} {row['p99'] * 1000:>8.1f} {row['max'] * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Integer-cents money helpers.
+
+All amounts in the app (receipt prices, expense amounts, per-person shares,
+balances) are plain ``int`` cents. Parsing goes through ``Decimal`` so text
+like ``"$1,234.56"`` converts exactly, and splitting uses largest-remainder
+allocation so the parts always add back up to the whole.
+"""
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+_NON_NUMERIC = re.compile(r"[^0-9.\-]")
+
+
+def parse_cents(text):
+    """Parse a price such as ``"$1,234.56"``, ``"12"`` or ``"-3.5"`` into cents."""
+    cleaned = _NON_NUMERIC.sub("", str(text))
+    try:
+        return to_cents(Decimal(cleaned))
+    except InvalidOperation:
+        raise ValueError(f"Not a price: {text!r}") from None
+
+
+def to_cents(amount):
+    """Convert a dollar amount (``Decimal``, ``int`` or ``float``) to cents."""
+    if isinstance(amount, float):
+        amount = Decimal(repr(amount))
+    return int((Decimal(amount) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_cents(cents):
+    """Render cents as ``$12.34`` (``-$12.34`` for negative amounts)."""
+    sign = "-" if cents < 0 else ""
+    dollars, remainder = divmod(abs(cents), 100)
+    return f"{sign}${dollars}.{remainder:02d}"
+
+
+def allocate(total, weights):
+    """Split ``total`` cents in proportion to ``weights``.
+
+    Uses the largest-remainder method: every part gets its floored share and
+    the leftover cents go to the parts with the largest fractional remainders
+    (earlier parts win ties), so ``sum(result) == total`` exactly.
+    """
+    weights = list(weights)
+    weight_sum = sum(weights)
+    if not weights:
+        return []
+    if weight_sum == 0:
+        weights = [1] * len(weights)
+        weight_sum = len(weights)
+    sign = -1 if total < 0 else 1
+    total = abs(total)
+    parts = []
+    remainders = []
+    for i, weight in enumerate(weights):
+        part, remainder = divmod(total * weight, weight_sum)
+        parts.append(part)
+        remainders.append((-remainder, i))
+    for _, i in sorted(remainders)[:total - sum(parts)]:
+        parts[i] += 1
+    return [sign * part for part in parts]
+
+
+def split_evenly(total, count):
+    """Split ``total`` cents into ``count`` shares that differ by at most a cent."""
+    return allocate(total, [1] * count)
@@ -0,0 +1,197 @@
+"""Durable queue of notification emails.
+
+Saving expenses writes their summary emails to the store's ``outbox`` table
+in the same transaction; an ``OutboxWorker`` thread delivers them later, so
+the save never waits on mail. Failed sends are retried with jittered
+exponential backoff. A message that fails permanently (a 4xx other than 429,
+or a rejected SMTP recipient) or runs out of attempts is dead-lettered and
+kept for inspection and ``retry-dead``.
+
+    python -m smartsplit.outbox status
+    python -m smartsplit.outbox retry-dead
+    python -m smartsplit.outbox run --smtp localhost:1025
+    python -m smartsplit.outbox run --fake --error-rate 0.3
+"""
+import argparse
+import email
+import hashlib
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from smartsplit import metrics
+from smartsplit.storage import DB_FILE, Store
+
+
+def outbox_key(sender, recipient, expense_ids):
+    """Idempotency key: one notification per recipient per set of expenses."""
+    digest = hashlib.sha256("\n".join(sorted(expense_ids)).encode()).hexdigest()[:32]
+    return f"{sender}>{recipient}:{digest}"
+
+
+def outbox_message(sender, recipient, message, expense_ids):
+    """An outbox row for ``message`` (an ``email.message.Message``)."""
+    return {
+        "key": outbox_key(sender, recipient, expense_ids),
+        "sender": sender,
+        "recipient": recipient,
+        "payload": message.as_string(),
+    }
+
+
+class SenderUnavailable(Exception):
+    """Nothing can send as this sender right now (e.g. nobody has logged in
+    as them since a restart). The message waits without using an attempt."""
+
+
+def is_permanent(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    if getattr(exc, "smtp_code", 0) >= 500:
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+class GmailSenders:
+    """Delivers outbox messages through each sender's ``MailDispatcher``,
+    registered as users log in."""
+
+    def __init__(self):
+        self._dispatchers = {}
+        self._lock = threading.Lock()
+
+    def register(self, sender, dispatcher):
+        with self._lock:
+            self._dispatchers[sender] = dispatcher
+
+    def __call__(self, message):
+        with self._lock:
+            dispatcher = self._dispatchers.get(message["sender"])
+        if dispatcher is None:
+            raise SenderUnavailable(f"No Gmail credentials for {message['sender']}")
+        return dispatcher.send(email.message_from_string(message["payload"]))
+
+
+def smtp_sender(host="localhost", port=1025):
+    """Deliver outbox messages to an SMTP server, e.g. a local mail catcher."""
+    def deliver(message):
+        with smtplib.SMTP(host, port, timeout=30) as smtp:
+            smtp.send_message(email.message_from_string(message["payload"]),
+                              from_addr=message["sender"], to_addrs=[message["recipient"]])
+    return deliver
+
+
+class OutboxWorker(threading.Thread):
+    """Background thread draining the outbox through ``deliver(message)``."""
+
+    def __init__(self, store, deliver, max_workers=4, max_attempts=6, base_delay=5.0, max_delay=900.0,
+                 poll_interval=2.0, defer_delay=30.0, lease=120.0, batch_size=20):
+        super().__init__(name="outbox", daemon=True)
+        self.store = store
+        self.deliver = deliver
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.defer_delay = defer_delay
+        self.lease = lease
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def notify(self):
+        """Check the queue now rather than at the next poll."""
+        self._wake.set()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="outbox") as pool:
+            while not self._stopping:
+                if not self.drain_once(pool):
+                    self._wake.wait(self.poll_interval)
+                    self._wake.clear()
+
+    def drain_once(self, pool=None):
+        """Deliver one batch of due messages; returns how many were handled."""
+        messages = self.store.claim_messages(self.lease, self.batch_size)
+        if pool is None:
+            for message in messages:
+                self._deliver(message)
+        else:
+            list(pool.map(self._deliver, messages))
+        return len(messages)
+
+    def backoff(self, attempts):
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+
+    def _deliver(self, message):
+        start = time.perf_counter()
+        try:
+            self.deliver(message)
+        except SenderUnavailable as exc:
+            # Not an attempt: nobody could send it yet
+            metrics.count("outbox.deferred")
+            self.store.retry_message(message["key"], self.defer_delay, str(exc), attempted=False)
+        except Exception as exc:
+            metrics.observe("outbox.deliver", time.perf_counter() - start)
+            attempts = message["attempts"] + 1
+            if is_permanent(exc) or attempts >= self.max_attempts:
+                metrics.count("outbox.dead")
+                self.store.dead_letter_message(message["key"], str(exc))
+            else:
+                metrics.count("outbox.retried")
+                self.store.retry_message(message["key"], self.backoff(attempts), str(exc))
+        else:
+            metrics.observe("outbox.deliver", time.perf_counter() - start)
+            metrics.count("outbox.sent")
+            self.store.mark_message_sent(message["key"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartSplit notification outbox")
+    parser.add_argument("--db", default=str(DB_FILE))
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    subcommands.add_parser("status", help="count messages by status and list dead letters")
+    subcommands.add_parser("retry-dead", help="requeue dead-lettered messages")
+    run = subcommands.add_parser("run", help="drain the outbox until interrupted")
+    target = run.add_mutually_exclusive_group(required=True)
+    target.add_argument("--smtp", metavar="HOST:PORT", help="deliver to an SMTP server")
+    target.add_argument("--fake", action="store_true", help="deliver to an in-memory fake Gmail service")
+    run.add_argument("--error-rate", type=float, default=0.0, help="transient failure rate of the fake")
+    args = parser.parse_args()
+
+    store = Store(args.db)
+    if args.command == "status":
+        counts = store.outbox_counts()
+        print(", ".join(f"{status}: {count}" for status, count in sorted(counts.items())) or "Outbox is empty")
+        for message in store.dead_messages():
+            print(f"dead  {message['recipient']} after {message['attempts']} attempt(s): {message['last_error']}")
+    elif args.command == "retry-dead":
+        print(f"Requeued {store.requeue_dead_messages()} message(s)")
+    elif args.command == "run":
+        if args.fake:
+            from smartsplit.fakes import FakeGmailService
+            from smartsplit.mail import MailDispatcher
+            dispatcher = MailDispatcher(FakeGmailService(error_rate=args.error_rate))
+            deliver = lambda message: dispatcher.send(email.message_from_string(message["payload"]))
+        else:
+            host, _, port = args.smtp.rpartition(":")
+            deliver = smtp_sender(host or "localhost", int(port))
+        worker = OutboxWorker(store, deliver, base_delay=1.0, max_delay=30.0)
+        worker.start()
+        try:
+            worker.join()
+        except KeyboardInterrupt:
+            worker.stop()
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Search and pagination for long lists in the UI.
+
+The app renders at most one page of members, groups or debts per rerun, so
+the number of widgets and the size of each rerun's output stay constant
+however large a group gets. These helpers
+are pure; the Streamlit controls that drive them live in the app.
+"""
+
+# Rows of widgets per page (members) and rows per page of a table (debts)
+PAGE_SIZE = 10
+TABLE_PAGE_SIZE = 200
+
+
+def search(items, query, text=str):
+    """Items whose ``text(item)`` contains ``query``, ignoring case; all of them for an empty query."""
+    query = query.strip().casefold() if query else ""
+    if not query:
+        return list(items)
+    return [item for item in items if query in text(item).casefold()]
+
+
+def page_count(total, page_size=PAGE_SIZE):
+    """Number of pages for ``total`` items; an empty list still has one (empty) page."""
+    return max(1, -(-total // page_size))
+
+
+def page_slice(items, page, page_size=PAGE_SIZE):
+    """The 1-based ``page`` of ``items``, clamped to the pages that exist."""
+    page = min(max(page, 1), page_count(len(items), page_size))
+    start = (page - 1) * page_size
+    return items[start:start + page_size]
+
+
+def debt_rows(debts, name=str):
+    """Turn ``(debtor, creditor, cents)`` triples into rows for one table.
+
+    ``name`` maps an email to its display name and is called once per
+    distinct email. Rows are grouped by debtor, largest debt first; zero
+    balances are left out.
+    """
+    names = {}
+
+    def lookup(email):
+        if email not in names:
+            names[email] = name(email)
+        return names[email]
+
+    rows = [(lookup(debtor), lookup(creditor), amount) for debtor, creditor, amount in debts if amount]
+    rows.sort(key=lambda row: (row[0].casefold(), -row[2]))
+    return rows
+
+
+def ledger_debts(ledger):
+    """Yield a ledger's ``(debtor, creditor, cents)`` triples."""
+    for debtor, owes_to in ledger.items():
+        for creditor, amount in owes_to.items():
+            yield debtor, creditor, amount
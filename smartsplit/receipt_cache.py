@@ -0,0 +1,116 @@
+"""Persistent, size-bounded LRU cache of parsed receipt extractions.
+
+Entries are keyed by a SHA-256 over the normalized image pixels plus the
+prompt, model name and cache format version, so re-uploading the same photo
+(or rerunning the script) skips the model call, while changing the prompt or
+model naturally misses. Entries live in a small SQLite file and the least
+recently used ones are evicted once the entry or byte budget is exceeded.
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from smartsplit.storage import DATA_DIR
+
+CACHE_FILE = DATA_DIR / "receipt_cache.db"
+# Bump when the shape of the cached parse result changes
+CACHE_VERSION = 1
+
+
+def cache_key(image, prompt, model_name):
+    """Hash an image the way the model will see it, plus what we ask of it."""
+    # Callers already hold a PIL image; importing here keeps PIL off the startup path
+    from PIL import ImageOps
+
+    normalized = ImageOps.exif_transpose(image).convert("RGB")
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}\0{model_name}\0{prompt}\0".encode())
+    digest.update(f"{normalized.width}x{normalized.height}\0".encode())
+    digest.update(normalized.tobytes())
+    return digest.hexdigest()
+
+
+class ReceiptCache:
+    def __init__(self, path=CACHE_FILE, max_entries=1000, max_bytes=20 * 1024 * 1024):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_by_last_used ON entries(last_used)")
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT payload FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, receipt):
+        payload = json.dumps(receipt)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time()),
+            )
+            self._evict()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            evict.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", evict)
+
+    def get_or_extract(self, image, extract, prompt, model_name):
+        """Return the cached parse for ``image`` or call ``extract(image)`` and store it.
+
+        ``extract`` is any callable returning a parsed receipt, which keeps the
+        cache testable with a stubbed model. A receipt with no items is
+        returned but not stored: it usually means the model failed or
+        replied in an unexpected shape, and a retry may do better.
+        """
+        key = cache_key(image, prompt, model_name)
+        receipt = self.get(key)
+        if receipt is None:
+            receipt = extract(image)
+            if receipt and receipt.get("items"):
+                self.put(key, receipt)
+        return receipt
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entries")
@@ -0,0 +1,296 @@
+"""Receipt extraction with Gemini and parsing of the model's response.
+
+A parsed receipt is a dict with ``items`` (``[{"name", "price"}]``),
+``taxes`` (``{tax_type: amount}``), ``subtotal`` and ``total``, all in cents.
+
+Gemini can answer in two formats: structured JSON against ``RECEIPT_SCHEMA``
+(validated strictly), or the ``ITEMS:/TAXES:/TOTALS:`` text of ``PROMPT``,
+which is parsed line by line as it streams in and skips lines it can't read.
+"""
+import json
+import re
+
+from smartsplit.metrics import timer
+from smartsplit.money import allocate, parse_cents, to_cents
+
+MODEL_NAME = "gemini-1.5-flash-latest"
+
+PROMPT = """Extract items, prices, and tax information from this receipt.
+Look for:
+1. Individual items and their prices
+2. Subtotal amount
+3. Tax amounts (C-taxable, A-taxable, etc.)
+4. Total amount
+
+Format the response as:
+ITEMS:
+Item1: $Price1
+Item2: $Price2
+...
+
+TAXES:
+C-taxable: $Amount
+A-taxable: $Amount
+...
+
+TOTALS:
+Subtotal: $Amount
+Total: $Amount"""
+
+JSON_PROMPT = """Extract the items, prices, taxes and totals from this receipt.
+Give every amount in dollars as a number. List each tax line separately,
+named as printed on the receipt (e.g. C-taxable). Use 0 for a subtotal or
+total that is not printed."""
+
+# Structured-output schema for JSON_PROMPT (the subset of OpenAPI Gemini accepts)
+RECEIPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"name": {"type": "string"}, "price": {"type": "number"}},
+                "required": ["name", "price"],
+            },
+        },
+        "taxes": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"name": {"type": "string"}, "amount": {"type": "number"}},
+                "required": ["name", "amount"],
+            },
+        },
+        "subtotal": {"type": "number"},
+        "total": {"type": "number"},
+    },
+    "required": ["items", "taxes", "subtotal", "total"],
+}
+
+_SECTIONS = {"ITEMS": "items", "TAXES": "taxes", "TOTALS": "totals"}
+# "Name: $1,234.56"; the price follows the last colon, so names may contain colons
+_LABELLED_PRICE = re.compile(r"^(?P<label>.+):\s*(?P<price>-?\s*\$\s*-?\d[\d,]*(?:\.\d+)?|-?\d[\d,]*\.\d{2})$")
+
+
+class ReceiptFormatError(ValueError):
+    """A structured reply that doesn't match ``RECEIPT_SCHEMA``."""
+
+
+def extract_receipt(model, image, prompt=PROMPT, on_item=None):
+    """Run ``model.generate_content`` on the image and parse the reply.
+
+    With ``on_item`` the reply is streamed and ``on_item(item)`` is called as
+    soon as each item line has arrived.
+    """
+    if on_item is None:
+        with timer("gemini.generate"):
+            text = model.generate_content([prompt, image]).text
+        with timer("receipt.parse"):
+            return parse_receipt_text(text)
+    parser = ReceiptParser()
+    # Streamed: lines are parsed as they arrive, so this includes parsing
+    with timer("gemini.generate_stream"):
+        for chunk in model.generate_content([prompt, image], stream=True):
+            for item in parser.feed(_chunk_text(chunk)):
+                on_item(item)
+        for item in parser.flush():
+            on_item(item)
+    return parser.receipt()
+
+
+def extract_receipt_json(model, image, prompt=JSON_PROMPT):
+    """Ask for the receipt as JSON matching ``RECEIPT_SCHEMA`` and validate it."""
+    with timer("gemini.generate"):
+        text = model.generate_content([prompt, image], generation_config={
+            "response_mime_type": "application/json",
+            "response_schema": RECEIPT_SCHEMA,
+        }).text
+    with timer("receipt.parse"):
+        return parse_receipt_json(text)
+
+
+def parse_receipt_text(text):
+    parser = ReceiptParser()
+    parser.feed(text)
+    parser.flush()
+    return parser.receipt()
+
+
+def parse_receipt_json(text):
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise ReceiptFormatError(f"Reply is not valid JSON: {e}") from None
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+        raise ReceiptFormatError("Reply has no list of items")
+
+    items = [{"name": _json_name(entry, "name"), "price": _json_cents(entry, "price")} for entry in data["items"]]
+    taxes = {}
+    for entry in data.get("taxes") or []:
+        taxes[_json_name(entry, "name")] = _json_cents(entry, "amount")
+    return {
+        "items": items,
+        "taxes": taxes,
+        "subtotal": _json_cents(data, "subtotal", required=False),
+        "total": _json_cents(data, "total", required=False),
+    }
+
+
+class ReceiptParser:
+    """Incremental parser for replies in the ``PROMPT`` format.
+
+    ``feed`` takes text chunks as they stream in and returns the items
+    completed by that chunk; ``flush`` handles a final line without a
+    newline. A line that doesn't parse is recorded in ``skipped`` instead of
+    failing the whole receipt.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.taxes = {}
+        self.subtotal = 0
+        self.total = 0
+        self.skipped = []
+        self._section = None
+        self._pending = ""
+
+    def feed(self, chunk):
+        *lines, self._pending = (self._pending + chunk).split('\n')
+        return [item for item in map(self._parse_line, lines) if item is not None]
+
+    def flush(self):
+        line, self._pending = self._pending, ""
+        item = self._parse_line(line)
+        return [] if item is None else [item]
+
+    def receipt(self):
+        return {"items": self.items, "taxes": self.taxes, "subtotal": self.subtotal, "total": self.total}
+
+    def _parse_line(self, line):
+        # Tolerate markdown the model sometimes adds: "**ITEMS:**", "- Milk: $3.49"
+        line = line.strip().strip('*#').strip().lstrip('-•*').strip()
+        if not line:
+            return None
+        header = line.rstrip(':').strip().upper()
+        if header in _SECTIONS:
+            self._section = _SECTIONS[header]
+            return None
+        if self._section is None:
+            return None
+
+        match = _LABELLED_PRICE.match(line)
+        if not match:
+            self.skipped.append(line)
+            return None
+        label = match.group("label").strip(' *')
+        try:
+            amount = parse_cents(match.group("price"))
+        except ValueError:
+            self.skipped.append(line)
+            return None
+
+        if self._section == "items":
+            item = {"name": label, "price": amount}
+            self.items.append(item)
+            return item
+        if self._section == "taxes":
+            self.taxes[label] = amount
+        elif "subtotal" in label.lower():
+            self.subtotal = amount
+        elif "total" in label.lower():
+            self.total = amount
+        return None
+
+
+def _chunk_text(chunk):
+    # Chunks without text parts (e.g. the closing one) raise on ``.text``
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+
+def _json_name(entry, key):
+    value = entry.get(key) if isinstance(entry, dict) else None
+    if not isinstance(value, str) or not value.strip():
+        raise ReceiptFormatError(f"Missing {key} in {entry!r}")
+    return value.strip()
+
+
+def _json_cents(entry, key, required=True):
+    value = entry.get(key) if isinstance(entry, dict) else None
+    if value is None and not required:
+        return 0
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ReceiptFormatError(f"Missing {key} in {entry!r}")
+    try:
+        return parse_cents(value) if isinstance(value, str) else to_cents(value)
+    except ValueError:
+        raise ReceiptFormatError(f"Bad {key} in {entry!r}") from None
+
+
+# A receipt line ending in a price, optionally followed by a tax flag ("3.49 A")
+_PRICE_LINE = re.compile(r"^(?P<label>.*?)[\s.:]*(?P<price>-?\$?\d{1,3}(?:,\d{3})*\.\d{2})(?:\s+[A-Z]{1,2})?$")
+# Payment lines that carry a price but are not part of the bill
+_PAYMENT_WORDS = ("change", "cash", "tender", "visa", "mastercard", "amex", "debit", "credit", "card", "paid")
+
+
+def parse_receipt_lines(text):
+    """Parse raw receipt text (as OCR reads it) into the same shape as
+    ``parse_receipt_text``: one price per line, classified by its label."""
+    items = []
+    taxes = {}
+    subtotal = 0
+    total = 0
+    for line in text.split('\n'):
+        match = _PRICE_LINE.match(line.strip())
+        if not match:
+            continue
+        label = match.group("label").strip()
+        lowered = label.lower()
+        amount = parse_cents(match.group("price"))
+        if not label or any(word in lowered for word in _PAYMENT_WORDS):
+            continue
+        if "subtotal" in lowered or "sub total" in lowered:
+            subtotal = amount
+        elif "tax" in lowered:
+            taxes[label] = amount
+        elif "total" in lowered or "balance" in lowered or "amount due" in lowered:
+            total = amount
+        else:
+            items.append({"name": label, "price": amount})
+    return {"items": items, "taxes": taxes, "subtotal": subtotal, "total": total}
+
+
+def looks_complete(receipt):
+    """Whether the items add up to the printed subtotal or total (within a
+    cent per item), i.e. nothing was obviously missed or misread."""
+    items = receipt["items"]
+    if not items:
+        return False
+    items_total = sum(item["price"] for item in items)
+    if receipt["subtotal"]:
+        return abs(items_total - receipt["subtotal"]) <= len(items)
+    if receipt["total"]:
+        return abs(items_total + sum(receipt["taxes"].values()) - receipt["total"]) <= len(items)
+    return False
+
+
+def amount_due(receipt):
+    # Use total amount if available, otherwise use subtotal
+    return receipt["total"] if receipt["total"] > 0 else receipt["subtotal"]
+
+
+def scale_items(items, amount):
+    """Rescale item prices so they add up to ``amount`` exactly.
+
+    Tax and rounding are spread over the items in proportion to their price,
+    with leftover cents allocated by largest remainder. Returns new dicts.
+    """
+    items = [dict(item) for item in items]
+    if sum(item["price"] for item in items) > 0:
+        prices = allocate(amount, [item["price"] for item in items])
+        for item, price in zip(items, prices):
+            item["price"] = price
+    return items
@@ -0,0 +1,109 @@
+"""Debt simplification: settle a group with as few transfers as possible.
+
+Pairwise balances are first collapsed into one net position per member. Any
+set of transfers that zeroes every position settles the group, so the
+problem is choosing few of them. ``settle`` uses an exact solver for small
+groups and a greedy one (at most ``n - 1`` transfers, O(n log n)) otherwise.
+Amounts are integer cents. Everything here is pure and can be called from
+batch jobs as well as the app.
+"""
+import heapq
+
+# Largest number of non-zero members handed to the exponential exact solver
+EXACT_LIMIT = 12
+
+
+def net_balances(ledger):
+    """Collapse a ledger into ``{email: cents}``; positive means the member is owed."""
+    balances = {}
+    for debtor, owes_to in ledger.items():
+        for creditor, amount in owes_to.items():
+            balances[debtor] = balances.get(debtor, 0) - amount
+            balances[creditor] = balances.get(creditor, 0) + amount
+    return balances
+
+
+def settle(balances, exact_limit=EXACT_LIMIT):
+    """Return ``[(debtor, creditor, cents), ...]`` transfers clearing ``balances``."""
+    positions = _positions(balances)
+    if len(positions) <= exact_limit:
+        return _settle_exact(positions)
+    return _settle_greedy(positions)
+
+
+def settle_greedy(balances):
+    return _settle_greedy(_positions(balances))
+
+
+def settle_exact(balances):
+    return _settle_exact(_positions(balances))
+
+
+def simplify_ledger(ledger, exact_limit=EXACT_LIMIT):
+    return settle(net_balances(ledger), exact_limit)
+
+
+def _positions(balances):
+    if sum(balances.values()) != 0:
+        raise ValueError("Balances must sum to zero to be settled")
+    return {email: amount for email, amount in balances.items() if amount}
+
+
+def _settle_greedy(positions):
+    # Repeatedly match the largest creditor with the largest debtor
+    creditors = [(-amount, email) for email, amount in positions.items() if amount > 0]
+    debtors = [(amount, email) for email, amount in positions.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
+
+
+def _settle_exact(positions):
+    # A subset of members whose positions sum to zero can be settled among
+    # themselves with (size - 1) transfers, so the minimum number of
+    # transfers is n minus the largest number of disjoint zero-sum subsets.
+    # best[mask] is that number for the members in mask.
+    emails = list(positions)
+    amounts = [positions[email] for email in emails]
+    n = len(emails)
+    full = (1 << n) - 1
+    sums = [0] * (full + 1)
+    best = [0] * (full + 1)
+    for mask in range(1, full + 1):
+        low = mask & -mask
+        sums[mask] = sums[mask ^ low] + amounts[low.bit_length() - 1]
+        best[mask] = max(best[mask ^ (1 << i)] for i in range(n) if mask >> i & 1)
+        if sums[mask] == 0:
+            best[mask] += 1
+
+    # Walk back from the full set, cutting it into zero-sum blocks
+    blocks = []
+    block = {}
+    mask = full
+    while mask:
+        target = best[mask] - (1 if sums[mask] == 0 else 0)
+        if sums[mask] == 0 and block:
+            blocks.append(block)
+            block = {}
+        for i in range(n):
+            if mask >> i & 1 and best[mask ^ (1 << i)] == target:
+                block[emails[i]] = amounts[i]
+                mask ^= 1 << i
+                break
+    if block:
+        blocks.append(block)
+
+    transfers = []
+    for block in blocks:
+        transfers.extend(_settle_greedy(block))
+    return transfers
@@ -0,0 +1,156 @@
+"""Process-wide, in-memory view of the dataset shared by all sessions.
+
+Streamlit reruns the whole script on every widget interaction. Instead of
+re-reading the database each time, the app keeps one loaded copy per process
+(see ``get_shared_data`` in the app) and only reloads it when another process
+has committed to the database since the last load.
+
+Sessions write to the store first, with the group version they last saw
+(``ConflictError`` if it has moved on), and only then apply the change to
+the shared dicts while holding ``lock``, so two sessions saving at once can
+neither lose each other's updates nor apply them in a different order than
+the store did.
+
+A reload never changes the loaded dicts in place: it builds new ones and
+swaps them in as one ``data`` tuple, so a session reading without the lock
+sees either the old or the new state in full, never a half-cleared one.
+Readers take ``data`` once and use that triple; writers apply their change
+to the current ``data`` (re-read after taking ``lock``), since a reload may
+have replaced the tuple the session started with.
+
+With a ``snapshot_path``, a load reads users, memberships, versions and
+balances from the store, which is quick, but takes each group's expenses,
+the bulk of the data, from the binary snapshot (``smartsplit.snapshot``).
+A group is only read from the snapshot's memory map the first time its
+``expenses`` are used, and writing a new snapshot does not change that. Groups the snapshot has no current copy of, by
+``Store.group_heads``, are read from the store and listed in ``stale``;
+``write_snapshot`` then brings the file up to date for the next start.
+"""
+import threading
+
+from smartsplit.expense_table import MemberIds
+from smartsplit.metrics import timer
+from smartsplit.snapshot import Snapshot, write_snapshot
+
+
+class SnapshotGroup(dict):
+    """A group dict whose ``expenses`` are read from a snapshot on first access.
+
+    With ``keep=False`` they are read again on every access instead of being
+    stored, for a one-off pass over many groups.
+    """
+
+    __slots__ = ("_read", "_keep")
+
+    def __init__(self, group, read, keep=True):
+        super().__init__(group)
+        self._read = read
+        self._keep = keep
+
+    def __missing__(self, key):
+        if key != "expenses":
+            raise KeyError(key)
+        with timer("snapshot.group"):
+            expenses = self._read()
+        if not self._keep:
+            return expenses
+        # Two sessions may get here at once; both keep the table that was stored first
+        return self.setdefault("expenses", expenses)
+
+
+class SharedData:
+    def __init__(self, store, snapshot_path=None):
+        self.store = store
+        self.snapshot_path = snapshot_path
+        # (users, groups, ledgers), replaced as a whole on reload
+        self.data = ({}, {}, {})
+        self.version = None
+        # Groups the last load could not take from the snapshot
+        self.stale = []
+        self.lock = threading.RLock()
+        self.refresh()
+
+    @property
+    def users(self):
+        return self.data[0]
+
+    @property
+    def groups(self):
+        return self.data[1]
+
+    @property
+    def ledgers(self):
+        return self.data[2]
+
+    def refresh(self, force=False):
+        """Reload from the store if it was changed by another connection.
+
+        Returns True if a reload happened. Writes made through ``self.store``
+        are applied to the in-memory dicts by the caller, so they do not count
+        as external changes; ``force`` reloads regardless, e.g. after a
+        ``ConflictError``.
+        """
+        version = self.store.data_version()
+        if version == self.version and not force:
+            return False
+        with self.lock:
+            if version == self.version and not force:
+                return False
+            users, groups = self._load()
+            ledgers = self.store.load_ledgers()
+            self.data = (users, groups, ledgers)
+            self.version = version
+        return True
+
+    def _load(self):
+        snapshot = self._open_snapshot()
+        if snapshot is None:
+            users, groups = self.store.load()
+            self.stale = list(groups) if self.snapshot_path is not None else []
+            return users, groups
+        heads = self.store.group_heads()
+        users, groups = self.store.load(expenses=False)
+        member_ids = MemberIds()
+        stale = []
+        for name, group in groups.items():
+            head = heads.get(name)
+            if head is not None and head[0] == group["version"] and snapshot.head(name) == head:
+                groups[name] = SnapshotGroup(group, lambda name=name: snapshot.expenses(name))
+            else:
+                group["expenses"] = self.store.load_group_expenses(name, member_ids)
+                stale.append(name)
+        self.stale = stale
+        return users, groups
+
+    def _open_snapshot(self):
+        if self.snapshot_path is None:
+            return None
+        try:
+            return Snapshot(self.snapshot_path)
+        except (OSError, ValueError):
+            # Missing, unreadable or from another format: the store has everything
+            return None
+
+    def write_snapshot(self):
+        """Write the loaded data to ``snapshot_path``, for the next process to start from.
+
+        Only copying the data happens under ``lock``; the file is written
+        from the copy. Groups whose expenses were never used are read from
+        the old snapshot one at a time while writing, and stay unloaded.
+        """
+        with self.lock:
+            users, groups, ledgers = self.data
+            heads = self.store.group_heads()
+            users = {email: {"full_name": user["full_name"]} for email, user in users.items()}
+            copies = {}
+            for name, group in groups.items():
+                copy = {"members": list(group["members"]), "version": group["version"]}
+                if "expenses" in group:
+                    copy["expenses"] = group["expenses"].copy()
+                    copies[name] = copy
+                else:
+                    copies[name] = SnapshotGroup(copy, group._read, keep=False)
+            ledgers = {name: {debtor: dict(owes_to) for debtor, owes_to in ledger.items()}
+                       for name, ledger in ledgers.items()}
+        write_snapshot(self.snapshot_path, users, copies, ledgers, heads)
+        self.stale = []
@@ -0,0 +1,334 @@
+"""Binary, memory-mapped snapshots of the users/groups/expenses dataset.
+
+A snapshot file holds each group's expenses in the ``ExpenseTable`` column
+layout, written out as raw little-endian arrays, so reading a group is a
+few memory copies instead of parsing JSON. The file is::
+
+    header     magic, directory offset and length
+    blocks     per group: the expense and balance columns, ids and item names
+    directory  JSON: users, the member id table, and per group its version,
+               head, member ids and where each of its columns lies in the file
+
+``Snapshot`` maps the file and parses only the header and the directory,
+whose size depends on the number of users and groups, not on the history.
+``expenses(group)`` and ``ledger(group)`` then read just that group's block,
+so opening a snapshot and showing one group only touches that group's
+pages. ``load()`` reads everything into the shapes ``Store.load`` and
+``Store.load_ledgers`` return.
+
+    python -m smartsplit.snapshot export --db data/smartsplit.db data/smartsplit.snap
+    python -m smartsplit.snapshot to-json data/smartsplit.snap data/export
+    python -m smartsplit.snapshot from-json data/export data/smartsplit.snap
+    python -m smartsplit.snapshot info data/smartsplit.snap
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from smartsplit.expense_table import ExpenseTable, MemberIds
+from smartsplit.ledger import build_ledger
+from smartsplit.storage import DATA_DIR, DB_FILE, Store
+
+SNAPSHOT_FILE = DATA_DIR / "smartsplit.snap"
+
+MAGIC = b"SSPLSNAP"
+FORMAT = 1
+HEADER = struct.Struct("<8sIQQ")
+# Column name and array type code of a group block, in file order
+COLUMNS = (
+    ("payers", "i"), ("amounts", "q"), ("dates", "q"), ("offsets", "q"),
+    ("assignees", "i"), ("shares", "q"), ("item_codes", "i"),
+    ("debtors", "i"), ("creditors", "i"), ("balances", "q"),
+)
+# Expense ids and item names are stored joined with this separator
+SEPARATOR = "\0"
+
+
+class SnapshotError(ValueError):
+    """Not a snapshot file, or one written by an incompatible version."""
+
+
+def write_snapshot(path, users, groups, ledgers, heads=None):
+    """Write ``(users, groups)`` as ``Store.load`` returns them, plus ``ledgers``.
+
+    Expenses may be ``ExpenseTable``s or lists of expense dicts. ``heads`` is
+    ``Store.group_heads()``; a group whose version matches its head there is
+    recorded with it, so a reader can tell that its block is still current
+    (see ``Snapshot.head``). The file is written next to ``path`` and renamed
+    into place.
+    """
+    heads = heads or {}
+    path = Path(path)
+    member_ids = MemberIds()
+    for email in users:
+        member_ids.intern(email)
+    directory = {"format": FORMAT, "members": member_ids.emails,
+                 "users": {email: user["full_name"] for email, user in users.items()}, "groups": {}}
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(bytes(HEADER.size))
+        for name, group in groups.items():
+            table = _with_member_ids(group["expenses"], member_ids)
+            entry = directory["groups"][name] = {
+                "version": group.get("version", 1),
+                "members": [member_ids.intern(email) for email in group["members"]],
+                "count": len(table),
+                "text_dates": table.text_dates,
+            }
+            head = heads.get(name)
+            if head is not None and head[0] == entry["version"]:
+                entry["head"] = list(head)
+            vocabulary = {}
+            item_codes = array("i", [vocabulary.setdefault(item, len(vocabulary)) for item in table.items])
+            debtors, creditors, balances = array("i"), array("i"), array("q")
+            for debtor, owes_to in ledgers.get(name, {}).items():
+                for creditor, cents in owes_to.items():
+                    debtors.append(member_ids.intern(debtor))
+                    creditors.append(member_ids.intern(creditor))
+                    balances.append(cents)
+            columns = {"payers": table.payers, "amounts": table.amounts, "dates": table.dates,
+                       "offsets": table.offsets, "assignees": table.assignees, "shares": table.shares,
+                       "item_codes": item_codes, "debtors": debtors, "creditors": creditors, "balances": balances}
+            entry["columns"] = {column: _write_array(f, columns[column]) for column, _ in COLUMNS}
+            entry["ids"] = _write_strings(f, table.ids)
+            entry["items"] = _write_strings(f, vocabulary)
+        data = json.dumps(directory, separators=(",", ":")).encode()
+        offset = f.tell()
+        f.write(data)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT, offset, len(data)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def _with_member_ids(expenses, member_ids):
+    """``expenses`` as an ``ExpenseTable`` numbered by ``member_ids``."""
+    if not isinstance(expenses, ExpenseTable):
+        return ExpenseTable(expenses, members=member_ids)
+    # Renumber the id columns rather than going through a dict per expense
+    ids = [member_ids.intern(email) for email in expenses.members.emails]
+    table = ExpenseTable(members=member_ids)
+    table.payers = array("i", [ids[i] for i in expenses.payers])
+    table.assignees = array("i", [ids[i] for i in expenses.assignees])
+    for column in ("ids", "items", "amounts", "dates", "offsets", "shares", "text_dates"):
+        setattr(table, column, getattr(expenses, column))
+    return table
+
+
+def _write_array(f, values):
+    # Columns start 8-byte aligned and are little-endian on disk
+    f.write(bytes(-f.tell() % 8))
+    offset = f.tell()
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(f)
+    return [offset, len(values)]
+
+
+def _write_strings(f, strings):
+    if any(SEPARATOR in value for value in strings):
+        raise ValueError("expense ids and item names can't contain NUL characters")
+    data = SEPARATOR.join(strings).encode()
+    offset = f.tell()
+    f.write(data)
+    return [offset, len(data)]
+
+
+class Snapshot:
+    """Read-only view of a snapshot file; groups are decoded on demand."""
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise SnapshotError(f"{self.path} is not a snapshot")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, offset, length = HEADER.unpack_from(self._map)
+            if magic != MAGIC:
+                raise SnapshotError(f"{self.path} is not a snapshot")
+            if version != FORMAT:
+                raise SnapshotError(f"{self.path} has snapshot format {version}, expected {FORMAT}")
+            directory = json.loads(self._map[offset:offset + length])
+        except Exception:
+            self._map.close()
+            raise
+        self._emails = directory["members"]
+        self._users = directory["users"]
+        self._groups = directory["groups"]
+        self._member_ids = None
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def group_names(self):
+        return list(self._groups)
+
+    def version(self, group_name):
+        return self._groups[group_name]["version"]
+
+    def members(self, group_name):
+        return [self._emails[member_id] for member_id in self._groups[group_name]["members"]]
+
+    def head(self, group_name):
+        """The group's ``(version, last expense seq)`` when written, if known.
+
+        Equal to the database's ``Store.group_heads()`` entry exactly when the
+        group's expenses in this snapshot are still current.
+        """
+        entry = self._groups.get(group_name)
+        head = entry.get("head") if entry else None
+        return tuple(head) if head else None
+
+    def expense_count(self, group_name):
+        return self._groups[group_name]["count"]
+
+    def users(self):
+        """Users in the shape ``Store.load`` returns, with their group index."""
+        users = {email: {"full_name": full_name, "groups": {}, "expenses": []}
+                 for email, full_name in self._users.items()}
+        for group_name, entry in self._groups.items():
+            for member_id in entry["members"]:
+                user = users.get(self._emails[member_id])
+                if user is not None:
+                    user["groups"][group_name] = None
+        return users
+
+    def expenses(self, group_name):
+        """The group's expenses as an ``ExpenseTable``, read from its block only."""
+        if self._member_ids is None:
+            # Tables share the snapshot's id numbering, so the columns need no remapping
+            member_ids = MemberIds()
+            member_ids.emails = list(self._emails)
+            member_ids.ids = {email: i for i, email in enumerate(member_ids.emails)}
+            self._member_ids = member_ids
+        entry = self._groups[group_name]
+        table = ExpenseTable(members=self._member_ids)
+        for column in ("payers", "amounts", "dates", "offsets", "assignees", "shares"):
+            setattr(table, column, self._array(entry, column))
+        table.ids = self._strings(entry["ids"]) if entry["count"] else []
+        vocabulary = [sys.intern(item) for item in self._strings(entry["items"])]
+        table.items = [vocabulary[code] for code in self._array(entry, "item_codes")]
+        table.text_dates = {int(row): date for row, date in entry["text_dates"].items()}
+        return table
+
+    def ledger(self, group_name):
+        entry = self._groups[group_name]
+        ledger = {}
+        for debtor, creditor, cents in zip(self._array(entry, "debtors"), self._array(entry, "creditors"),
+                                           self._array(entry, "balances")):
+            ledger.setdefault(self._emails[debtor], {})[self._emails[creditor]] = cents
+        return ledger
+
+    def group(self, group_name):
+        return {"members": dict.fromkeys(self.members(group_name)), "expenses": self.expenses(group_name),
+                "version": self.version(group_name)}
+
+    def load(self):
+        """Read everything: ``(users, groups)`` like ``Store.load``."""
+        return self.users(), {name: self.group(name) for name in self._groups}
+
+    def load_ledgers(self):
+        ledgers = {name: self.ledger(name) for name in self._groups}
+        return {name: ledger for name, ledger in ledgers.items() if ledger}
+
+    def _array(self, entry, column):
+        offset, count = entry["columns"][column]
+        values = array(dict(COLUMNS)[column])
+        values.frombytes(self._map[offset:offset + count * values.itemsize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values
+
+    def _strings(self, location):
+        offset, length = location
+        return self._map[offset:offset + length].decode().split(SEPARATOR)
+
+
+def write_json(data_dir, users, groups, ledgers):
+    """Write a dataset as ``users.json``, ``groups.json`` and ``ledgers.json`` (amounts in cents)."""
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    payloads = {
+        "users.json": {email: {"full_name": user["full_name"], "groups": list(user["groups"])}
+                       for email, user in users.items()},
+        "groups.json": {name: {"members": list(group["members"]), "expenses": list(group["expenses"]),
+                               "version": group["version"]} for name, group in groups.items()},
+        "ledgers.json": ledgers,
+    }
+    for name, payload in payloads.items():
+        with open(data_dir / name, "w") as f:
+            json.dump(payload, f)
+
+
+def read_json(data_dir):
+    """Read files written by ``write_json``; balances are rebuilt if ``ledgers.json`` is missing."""
+    data_dir = Path(data_dir)
+    with open(data_dir / "users.json", "r") as f:
+        users = json.load(f)
+    with open(data_dir / "groups.json", "r") as f:
+        groups = json.load(f)
+    try:
+        with open(data_dir / "ledgers.json", "r") as f:
+            ledgers = json.load(f)
+    except FileNotFoundError:
+        ledgers = {name: build_ledger(group["expenses"]) for name, group in groups.items()}
+    return users, groups, ledgers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartSplit binary snapshots")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export = subcommands.add_parser("export", help="write a snapshot of the SQLite database")
+    export.add_argument("--db", default=str(DB_FILE))
+    export.add_argument("snapshot", nargs="?", default=str(SNAPSHOT_FILE))
+    to_json = subcommands.add_parser("to-json", help="write a snapshot out as JSON files (amounts in cents)")
+    to_json.add_argument("snapshot")
+    to_json.add_argument("data_dir")
+    from_json = subcommands.add_parser("from-json", help="build a snapshot from files written by to-json")
+    from_json.add_argument("data_dir")
+    from_json.add_argument("snapshot")
+    info = subcommands.add_parser("info", help="summarize a snapshot")
+    info.add_argument("snapshot", nargs="?", default=str(SNAPSHOT_FILE))
+    args = parser.parse_args()
+
+    if args.command == "export":
+        store = Store(args.db)
+        users, groups = store.load()
+        write_snapshot(args.snapshot, users, groups, store.load_ledgers(), store.group_heads())
+        store.close()
+        print(f"Wrote {len(groups)} groups to {args.snapshot}")
+    elif args.command == "to-json":
+        with Snapshot(args.snapshot) as snapshot:
+            users, groups = snapshot.load()
+            write_json(args.data_dir, users, groups, snapshot.load_ledgers())
+        print(f"Wrote {len(users)} users and {len(groups)} groups to {args.data_dir}")
+    elif args.command == "from-json":
+        users, groups, ledgers = read_json(args.data_dir)
+        write_snapshot(args.snapshot, users, groups, ledgers)
+        print(f"Wrote {len(groups)} groups to {args.snapshot}")
+    elif args.command == "info":
+        with Snapshot(args.snapshot) as snapshot:
+            names = snapshot.group_names()
+            expenses = sum(snapshot.expense_count(name) for name in names)
+            print(f"{args.snapshot}: {os.path.getsize(args.snapshot) / 1e6:.1f} MB, "
+                  f"{len(snapshot.users())} users, {len(names)} groups, {expenses} expenses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,637 @@
+"""SQLite persistence for users, groups, memberships and expenses.
+
+Every mutation is a small transaction touching only the affected rows, so
+the cost of a click no longer grows with the size of the whole dataset.
+Money columns hold integer cents (see ``smartsplit.money``). Notification
+emails are queued in the ``outbox`` table in the same transaction as the
+expenses they describe (see ``smartsplit.outbox``).
+
+Each group carries a version number that every write to it advances. Group
+writes take an optional ``expected_version``: if the group has moved on
+since the caller read it, the write is rejected with ``ConflictError``
+instead of silently building on stale data (compare-and-swap).
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from smartsplit.expense_table import ExpenseTable, MemberIds
+from smartsplit.ledger import build_ledger, verify_ledger
+from smartsplit.metrics import timed
+from smartsplit.money import format_cents, split_evenly, to_cents
+
+DATA_DIR = Path("data")
+DB_FILE = DATA_DIR / "smartsplit.db"
+
+EXPENSE_COLUMNS = "id, item, amount, payer, assignees, shares, date"
+
+
+def _expenses_to_cents(conn):
+    # Float dollar amounts become integer cents; each expense's single float
+    # share becomes a per-assignee list that sums exactly to the amount.
+    conn.execute("""
+        CREATE TABLE expenses_cents (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            group_name TEXT NOT NULL REFERENCES groups(name) ON DELETE CASCADE,
+            id TEXT NOT NULL,
+            item TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            payer TEXT NOT NULL,
+            assignees TEXT NOT NULL,
+            shares TEXT NOT NULL,
+            date TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE balances_cents (
+            group_name TEXT NOT NULL REFERENCES groups(name) ON DELETE CASCADE,
+            debtor TEXT NOT NULL,
+            creditor TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            PRIMARY KEY (group_name, debtor, creditor)
+        )
+    """)
+    converted = {}
+    for seq, group_name, expense_id, item, amount, payer, assignees, date in conn.execute(
+        "SELECT seq, group_name, id, item, amount, payer, assignees, date FROM expenses ORDER BY seq"
+    ).fetchall():
+        expense = _legacy_expense({
+            "id": expense_id, "item": item, "amount": amount, "payer": payer,
+            "assignees": json.loads(assignees), "date": date,
+        })
+        converted.setdefault(group_name, []).append(expense)
+        conn.execute(
+            f"INSERT INTO expenses_cents (seq, group_name, {EXPENSE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (seq, group_name, *_expense_to_row(expense)),
+        )
+    for group_name, expenses in converted.items():
+        _add_balances(conn, group_name, build_ledger(expenses), table="balances_cents")
+    # executescript() would commit the surrounding migration transaction
+    conn.execute("DROP TABLE expenses")
+    conn.execute("ALTER TABLE expenses_cents RENAME TO expenses")
+    conn.execute("CREATE INDEX expenses_by_group ON expenses(group_name, seq)")
+    conn.execute("DROP TABLE balances")
+    conn.execute("ALTER TABLE balances_cents RENAME TO balances")
+
+
+# Schema upgrades, applied in order: SQL scripts or functions taking the
+# connection. The number of applied entries is kept in PRAGMA user_version,
+# so new steps must only ever be appended.
+MIGRATIONS = [
+    """
+    CREATE TABLE users (
+        email TEXT PRIMARY KEY,
+        full_name TEXT NOT NULL
+    );
+    CREATE TABLE groups (
+        name TEXT PRIMARY KEY
+    );
+    CREATE TABLE memberships (
+        group_name TEXT NOT NULL REFERENCES groups(name) ON DELETE CASCADE,
+        email TEXT NOT NULL,
+        PRIMARY KEY (group_name, email)
+    );
+    CREATE INDEX memberships_by_email ON memberships(email);
+    CREATE TABLE expenses (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        group_name TEXT NOT NULL REFERENCES groups(name) ON DELETE CASCADE,
+        id TEXT NOT NULL,
+        item TEXT NOT NULL,
+        amount REAL NOT NULL,
+        payer TEXT NOT NULL,
+        assignees TEXT NOT NULL,
+        share REAL NOT NULL,
+        date TEXT NOT NULL
+    );
+    CREATE INDEX expenses_by_group ON expenses(group_name, seq);
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE balances (
+        group_name TEXT NOT NULL REFERENCES groups(name) ON DELETE CASCADE,
+        debtor TEXT NOT NULL,
+        creditor TEXT NOT NULL,
+        amount REAL NOT NULL,
+        PRIMARY KEY (group_name, debtor, creditor)
+    );
+    INSERT INTO balances (group_name, debtor, creditor, amount)
+    SELECT e.group_name, a.value, e.payer, SUM(e.share)
+    FROM expenses e, json_each(e.assignees) a
+    WHERE a.value != e.payer
+    GROUP BY e.group_name, a.value, e.payer
+    ORDER BY MIN(e.seq);
+    """,
+    _expenses_to_cents,
+    """
+    CREATE TABLE outbox (
+        key TEXT PRIMARY KEY,
+        sender TEXT NOT NULL,
+        recipient TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        last_error TEXT,
+        created REAL NOT NULL,
+        sent REAL
+    );
+    CREATE INDEX outbox_due ON outbox(status, next_attempt);
+    """,
+    """
+    ALTER TABLE groups ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+    """,
+]
+
+OUTBOX_COLUMNS = "key, sender, recipient, payload, attempts"
+
+
+class ConflictError(Exception):
+    """A group write expected a version the group is no longer at."""
+
+    def __init__(self, group_name, expected, actual):
+        if actual is None:
+            message = f"Group {group_name!r} no longer exists"
+        elif expected == 0:
+            message = f"Group {group_name!r} already exists"
+        else:
+            message = f"Group {group_name!r} changed: expected version {expected}, found {actual}"
+        super().__init__(message)
+        self.group_name = group_name
+        self.expected = expected
+        self.actual = actual
+
+
+class Store:
+    def __init__(self, path=DB_FILE):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        # Streamlit serves each session from its own thread, so the connection
+        # is shared and access to it is serialized with a lock.
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.RLock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._upgrade_schema()
+
+    def _upgrade_schema(self):
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+                if callable(step):
+                    self._conn.execute("BEGIN")
+                    try:
+                        step(self._conn)
+                        self._conn.execute(f"PRAGMA user_version = {number}")
+                        self._conn.commit()
+                    except BaseException:
+                        self._conn.rollback()
+                        raise
+                else:
+                    self._conn.executescript(f"BEGIN; {step}; PRAGMA user_version = {number}; COMMIT;")
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock, self._conn:
+            yield self._conn
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def data_version(self):
+        """Counter that changes whenever another connection commits."""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    @timed("store.load")
+    def load(self, expenses=True):
+        """Return ``(users, groups)`` in the shape the app keeps in session state.
+
+        A group's ``members`` and a user's ``groups`` are the two directions of
+        the membership index, kept as insertion-ordered sets (dicts mapping to
+        None) so that adding, removing and testing a membership is O(1).
+        A group's ``expenses`` is an ``ExpenseTable``, with members interned
+        once across all groups. With ``expenses=False`` the expenses are not
+        read and the groups have no ``expenses`` key.
+        """
+        member_ids = MemberIds()
+        with self._lock:
+            users = {
+                email: {"full_name": full_name, "groups": {}, "expenses": []}
+                for email, full_name in self._conn.execute("SELECT email, full_name FROM users")
+            }
+            groups = {
+                name: {"members": {}, "version": version}
+                for name, version in self._conn.execute("SELECT name, version FROM groups ORDER BY rowid")
+            }
+            if expenses:
+                for group in groups.values():
+                    group["expenses"] = ExpenseTable(members=member_ids)
+            for group_name, email in self._conn.execute(
+                "SELECT group_name, email FROM memberships ORDER BY rowid"
+            ):
+                groups[group_name]["members"][email] = None
+                if email in users:
+                    users[email]["groups"][group_name] = None
+            if not expenses:
+                return users, groups
+            for group_name, expense_id, item, amount, payer, assignees, shares, date in self._conn.execute(
+                f"SELECT group_name, {EXPENSE_COLUMNS} FROM expenses ORDER BY seq"
+            ):
+                groups[group_name]["expenses"].append_row(expense_id, item, amount, payer,
+                                                          json.loads(assignees), json.loads(shares), date)
+        return users, groups
+
+    @timed("store.load_ledgers")
+    def load_ledgers(self):
+        """Return the stored balances as ``{group_name: ledger}``."""
+        ledgers = {}
+        with self._lock:
+            for group_name, debtor, creditor, amount in self._conn.execute(
+                "SELECT group_name, debtor, creditor, amount FROM balances ORDER BY rowid"
+            ):
+                ledgers.setdefault(group_name, {}).setdefault(debtor, {})[creditor] = amount
+        return ledgers
+
+    def load_ledger(self, group_name):
+        ledger = {}
+        with self._lock:
+            for debtor, creditor, amount in self._conn.execute(
+                "SELECT debtor, creditor, amount FROM balances WHERE group_name = ? ORDER BY rowid",
+                (group_name,),
+            ):
+                ledger.setdefault(debtor, {})[creditor] = amount
+        return ledger
+
+    def load_group_expenses(self, group_name, members=None):
+        """One group's expenses as an ``ExpenseTable``, interning into ``members`` if given."""
+        table = ExpenseTable(members=members)
+        with self._lock:
+            for expense_id, item, amount, payer, assignees, shares, date in self._conn.execute(
+                f"SELECT {EXPENSE_COLUMNS} FROM expenses WHERE group_name = ? ORDER BY seq",
+                (group_name,),
+            ):
+                table.append_row(expense_id, item, amount, payer, json.loads(assignees), json.loads(shares), date)
+        return table
+
+    def group_heads(self):
+        """``{group_name: (version, seq of its last expense or 0)}``.
+
+        Expense sequence numbers are never reused, so the pair identifies a
+        group's expenses even across a delete and re-create under the same name.
+        """
+        with self._lock:
+            return {
+                name: (version, seq or 0)
+                for name, version, seq in self._conn.execute(
+                    "SELECT name, version, (SELECT MAX(seq) FROM expenses WHERE group_name = groups.name) "
+                    "FROM groups"
+                )
+            }
+
+    def save_user(self, email, full_name):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO users (email, full_name) VALUES (?, ?) "
+                "ON CONFLICT(email) DO UPDATE SET full_name = excluded.full_name",
+                (email, full_name),
+            )
+
+    def group_version(self, group_name):
+        """The group's current version, or None if it does not exist."""
+        with self._lock:
+            return _current_version(self._conn, group_name)
+
+    def create_group(self, group_name, owner_email):
+        """Create a group at version 1; ``ConflictError`` if the name is taken."""
+        with self._transaction() as conn:
+            try:
+                conn.execute("INSERT INTO groups (name) VALUES (?)", (group_name,))
+            except sqlite3.IntegrityError:
+                raise ConflictError(group_name, 0, _current_version(conn, group_name)) from None
+            conn.execute(
+                "INSERT INTO memberships (group_name, email) VALUES (?, ?)",
+                (group_name, owner_email),
+            )
+        return 1
+
+    def delete_group(self, group_name, expected_version=None):
+        # Memberships and expenses go with it through ON DELETE CASCADE
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "DELETE FROM groups WHERE name = ? AND (? IS NULL OR version = ?)",
+                (group_name, expected_version, expected_version),
+            )
+            if cursor.rowcount == 0:
+                raise ConflictError(group_name, expected_version, _current_version(conn, group_name))
+
+    def add_member(self, group_name, email, full_name=None, expected_version=None):
+        """Add ``email`` to a group, registering the user first if it is new.
+
+        Returns the group's new version.
+        """
+        with self._transaction() as conn:
+            version = _advance_version(conn, group_name, expected_version)
+            if full_name is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO users (email, full_name) VALUES (?, ?)",
+                    (email, full_name),
+                )
+            conn.execute(
+                "INSERT OR IGNORE INTO memberships (group_name, email) VALUES (?, ?)",
+                (group_name, email),
+            )
+        return version
+
+    def remove_member(self, group_name, email, expected_version=None):
+        with self._transaction() as conn:
+            version = _advance_version(conn, group_name, expected_version)
+            conn.execute(
+                "DELETE FROM memberships WHERE group_name = ? AND email = ?",
+                (group_name, email),
+            )
+        return version
+
+    @timed("store.add_expenses")
+    def add_expenses(self, group_name, expenses, messages=(), expected_version=None):
+        """Append expenses and fold them into the group's balances.
+
+        ``messages`` (outbox dicts) are queued in the same transaction, so the
+        notifications exist exactly when the expenses do. Returns the group's
+        new version.
+        """
+        with self._transaction() as conn:
+            version = _advance_version(conn, group_name, expected_version)
+            conn.executemany(
+                f"INSERT INTO expenses (group_name, {EXPENSE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(group_name, *_expense_to_row(expense)) for expense in expenses],
+            )
+            _add_balances(conn, group_name, build_ledger(expenses))
+            _enqueue_messages(conn, messages)
+        return version
+
+    def enqueue_messages(self, messages):
+        with self._transaction() as conn:
+            _enqueue_messages(conn, messages)
+
+    def claim_messages(self, lease, limit=20):
+        """Lease up to ``limit`` due outbox messages for ``lease`` seconds.
+
+        A leased message whose sender dies becomes due again when the lease
+        runs out, so delivery is at-least-once.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT {OUTBOX_COLUMNS} FROM outbox "
+                "WHERE status IN ('pending', 'sending') AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET status = 'sending', next_attempt = ? WHERE key = ?",
+                [(now + lease, row[0]) for row in rows],
+            )
+        return [dict(zip(("key", "sender", "recipient", "payload", "attempts"), row)) for row in rows]
+
+    def mark_message_sent(self, key):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', sent = ?, last_error = NULL WHERE key = ?",
+                (time.time(), key),
+            )
+
+    def retry_message(self, key, delay, error, attempted=True):
+        """Put a message back in the queue ``delay`` seconds from now."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt = ?, last_error = ?, "
+                "attempts = attempts + ? WHERE key = ?",
+                (time.time() + delay, error, int(attempted), key),
+            )
+
+    def dead_letter_message(self, key, error):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'dead', last_error = ?, attempts = attempts + 1 WHERE key = ?",
+                (error, key),
+            )
+
+    def requeue_dead_messages(self, sender=None):
+        """Give dead-lettered messages (optionally one sender's) a fresh set of attempts."""
+        query = "UPDATE outbox SET status = 'pending', attempts = 0, next_attempt = ? WHERE status = 'dead'"
+        params = (time.time(),)
+        if sender is not None:
+            query += " AND sender = ?"
+            params += (sender,)
+        with self._transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def outbox_counts(self, sender=None):
+        """``{status: count}`` over the outbox, optionally for one sender."""
+        query = "SELECT status, COUNT(*) FROM outbox"
+        params = ()
+        if sender is not None:
+            query += " WHERE sender = ?"
+            params = (sender,)
+        with self._lock:
+            return dict(self._conn.execute(query + " GROUP BY status", params).fetchall())
+
+    def dead_messages(self, sender=None):
+        query = "SELECT key, sender, recipient, attempts, last_error FROM outbox WHERE status = 'dead'"
+        params = ()
+        if sender is not None:
+            query += " AND sender = ?"
+            params = (sender,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY created", params).fetchall()
+        return [dict(zip(("key", "sender", "recipient", "attempts", "last_error"), row)) for row in rows]
+
+    def rebuild_ledger(self, group_name):
+        """Recompute a group's balances from its raw expenses."""
+        ledger = build_ledger(self.load_group_expenses(group_name))
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM balances WHERE group_name = ?", (group_name,))
+            _add_balances(conn, group_name, ledger)
+        return ledger
+
+    def check_ledgers(self):
+        """Verify every group's stored balances against its expenses.
+
+        Returns ``{group_name: mismatches}`` for the inconsistent groups only.
+        """
+        with self._lock:
+            group_names = [name for (name,) in self._conn.execute("SELECT name FROM groups")]
+        problems = {}
+        for group_name in group_names:
+            mismatches = verify_ledger(
+                self.load_ledger(group_name), self.load_group_expenses(group_name)
+            )
+            if mismatches:
+                problems[group_name] = mismatches
+        return problems
+
+    def migrate_from_json(self, data_dir=DATA_DIR):
+        """Import the legacy ``users.json``/``groups.json`` files once.
+
+        Returns True if anything was imported. The JSON files are left in place
+        untouched; a marker in the ``meta`` table stops them from being read
+        again on later starts.
+        """
+        data_dir = Path(data_dir)
+        with self._lock:
+            done = self._conn.execute(
+                "SELECT 1 FROM meta WHERE key = 'migrated_from_json'"
+            ).fetchone()
+        if done:
+            return False
+
+        users = _read_json(data_dir / "users.json")
+        groups = _read_json(data_dir / "groups.json")
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO users (email, full_name) VALUES (?, ?)",
+                [(email, user.get("full_name", email)) for email, user in users.items()],
+            )
+            for group_name, group in groups.items():
+                conn.execute("INSERT OR IGNORE INTO groups (name) VALUES (?)", (group_name,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO memberships (group_name, email) VALUES (?, ?)",
+                    [(group_name, email) for email in group.get("members", [])],
+                )
+                expenses = [_legacy_expense(expense) for expense in group.get("expenses", [])]
+                conn.executemany(
+                    f"INSERT INTO expenses (group_name, {EXPENSE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(group_name, *_expense_to_row(expense)) for expense in expenses],
+                )
+                _add_balances(conn, group_name, build_ledger(expenses))
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                (str(data_dir),),
+            )
+        return bool(users or groups)
+
+
+def _add_balances(conn, group_name, ledger, table="balances"):
+    conn.executemany(
+        f"INSERT INTO {table} (group_name, debtor, creditor, amount) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(group_name, debtor, creditor) DO UPDATE SET amount = amount + excluded.amount",
+        [
+            (group_name, debtor, creditor, amount)
+            for debtor, owes_to in ledger.items()
+            for creditor, amount in owes_to.items()
+        ],
+    )
+
+
+def _advance_version(conn, group_name, expected_version=None):
+    # The comparison is part of the write itself: a SELECT first would run
+    # before the implicit BEGIN and race with other connections.
+    cursor = conn.execute(
+        "UPDATE groups SET version = version + 1 WHERE name = ? AND (? IS NULL OR version = ?)",
+        (group_name, expected_version, expected_version),
+    )
+    version = _current_version(conn, group_name)
+    if cursor.rowcount == 0:
+        raise ConflictError(group_name, expected_version, version)
+    return version
+
+
+def _current_version(conn, group_name):
+    row = conn.execute("SELECT version FROM groups WHERE name = ?", (group_name,)).fetchone()
+    return row[0] if row else None
+
+
+def _enqueue_messages(conn, messages):
+    # The key makes queueing idempotent: a message that is already queued
+    # (or sent) is left alone
+    now = time.time()
+    conn.executemany(
+        "INSERT OR IGNORE INTO outbox (key, sender, recipient, payload, next_attempt, created) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(message["key"], message["sender"], message["recipient"], message["payload"], now, now)
+         for message in messages],
+    )
+
+
+def _read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _legacy_expense(expense):
+    # Older data stored float dollars and one equal share per expense
+    amount = to_cents(expense["amount"])
+    return {
+        "id": expense["id"],
+        "item": expense["item"],
+        "amount": amount,
+        "payer": expense["payer"],
+        "assignees": expense["assignees"],
+        "shares": split_evenly(amount, len(expense["assignees"])),
+        "date": expense["date"],
+    }
+
+
+def _expense_to_row(expense):
+    return (
+        expense["id"],
+        expense["item"],
+        expense["amount"],
+        expense["payer"],
+        json.dumps(expense["assignees"]),
+        json.dumps(expense["shares"]),
+        expense["date"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartSplit storage maintenance")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="import legacy data/*.json into SQLite")
+    migrate.add_argument("--data-dir", default=str(DATA_DIR))
+    migrate.add_argument("--db", default=None)
+    check = subcommands.add_parser("check-ledger", help="verify balances against raw expenses")
+    check.add_argument("--db", default=str(DB_FILE))
+    check.add_argument("--repair", action="store_true", help="rebuild inconsistent balances")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        data_dir = Path(args.data_dir)
+        store = Store(args.db or data_dir / DB_FILE.name)
+        if store.migrate_from_json(data_dir):
+            users, groups = store.load()
+            print(f"Imported {len(users)} users and {len(groups)} groups into {store.path}")
+        else:
+            print(f"Nothing to import into {store.path}")
+        store.close()
+    elif args.command == "check-ledger":
+        store = Store(args.db)
+        problems = store.check_ledgers()
+        for group_name, mismatches in problems.items():
+            print(f"{group_name}: {len(mismatches)} inconsistent balance(s)")
+            for debtor, creditor, stored, expected in mismatches:
+                print(f"  {debtor} -> {creditor}: stored {format_cents(stored)}, expected {format_cents(expected)}")
+            if args.repair:
+                store.rebuild_ledger(group_name)
+                print("  rebuilt")
+        if not problems:
+            print("All balances are consistent")
+        store.close()
+        if problems and not args.repair:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Saved logins against the fake token endpoint: silent refresh, revocation, per-browser caches."""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("google.oauth2.credentials")
+from google.oauth2.credentials import Credentials
+
+from smartsplit.auth import TokenCache, browser_token_cache, new_browser_secret, remove_unbound_tokens, silent_login
+from smartsplit.fakes import FakeTokenEndpoint
+
+SCOPES = ["openid", "https://www.googleapis.com/auth/userinfo.email"]
+USERINFO = {"email": "alice@example.com", "name": "Alice"}
+
+
+def credentials(token="old-access-token", refresh_token="refresh-1", expired=True):
+    # google.auth compares expiry against a naive UTC datetime
+    now = datetime.utcnow()
+    return Credentials(token, refresh_token=refresh_token, token_uri="https://oauth2.googleapis.com/token",
+                       client_id="client", client_secret="secret", scopes=SCOPES,
+                       expiry=now - timedelta(hours=1) if expired else now + timedelta(hours=1))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return browser_token_cache(new_browser_secret(), tmp_path)
+
+
+def test_expired_token_is_refreshed_silently_and_saved(cache):
+    cache.save(credentials(), USERINFO)
+    endpoint = FakeTokenEndpoint()
+
+    creds, userinfo = silent_login(cache, USERINFO["email"], SCOPES, endpoint)
+
+    assert userinfo == USERINFO
+    assert creds.token == "fake-access-token-1"
+    assert creds.valid
+    assert [(call["grant_type"], call["refresh_token"]) for call in endpoint.requests] == \
+        [("refresh_token", "refresh-1")]
+    # The refreshed token is what the next login starts from
+    saved, _ = cache.load(USERINFO["email"])
+    assert saved.token == "fake-access-token-1"
+
+
+def test_valid_token_needs_no_refresh(cache):
+    cache.save(credentials(token="still-good", expired=False), USERINFO)
+    endpoint = FakeTokenEndpoint()
+
+    creds, _ = silent_login(cache, USERINFO["email"], SCOPES, endpoint)
+
+    assert creds.token == "still-good"
+    assert endpoint.requests == []
+
+
+def test_revoked_refresh_token_falls_back_to_interactive_login(cache):
+    cache.save(credentials(refresh_token="revoked"), USERINFO)
+    endpoint = FakeTokenEndpoint(revoked={"revoked"})
+
+    assert silent_login(cache, USERINFO["email"], SCOPES, endpoint) is None
+    assert len(endpoint.requests) == 1
+
+
+def test_missing_scope_falls_back_without_calling_the_endpoint(cache):
+    cache.save(credentials(), USERINFO)
+    endpoint = FakeTokenEndpoint()
+
+    assert silent_login(cache, USERINFO["email"], SCOPES + ["https://www.googleapis.com/auth/gmail.send"],
+                        endpoint) is None
+    assert endpoint.requests == []
+
+
+def test_saved_logins_are_private_to_their_browser(tmp_path):
+    mine = browser_token_cache(new_browser_secret(), tmp_path)
+    theirs = browser_token_cache(new_browser_secret(), tmp_path)
+    mine.save(credentials(), USERINFO)
+
+    assert [account["email"] for account in mine.accounts()] == [USERINFO["email"]]
+    assert theirs.accounts() == []
+    assert silent_login(theirs, USERINFO["email"], SCOPES, FakeTokenEndpoint()) is None
+
+
+def test_token_files_from_before_browser_binding_are_removed(tmp_path):
+    TokenCache(tmp_path).save(credentials(), USERINFO)
+    bound = browser_token_cache(new_browser_secret(), tmp_path)
+    bound.save(credentials(), USERINFO)
+
+    assert remove_unbound_tokens(tmp_path) == 1
+    assert list(tmp_path.glob("*.json")) == []
+    assert [account["email"] for account in bound.accounts()] == [USERINFO["email"]]
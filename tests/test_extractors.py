@@ -0,0 +1,37 @@
+"""Chained extractors: only the accepted backend's items are reported."""
+from smartsplit.extractors import ChainExtractor, GeminiExtractor
+from smartsplit.fakes import CANNED_RECEIPT, FakeModel
+
+PARTIAL_RECEIPT = """ITEMS:
+Milk: $3.49"""
+
+
+class Prepared:
+    image = None
+
+    def blob(self):
+        return b"image bytes"
+
+
+def chain(first_text, second_text=CANNED_RECEIPT):
+    first = GeminiExtractor(FakeModel(text=first_text), structured=False)
+    second = GeminiExtractor(FakeModel(text=second_text), structured=False)
+    return ChainExtractor([first, second], accept=lambda receipt: len(receipt["items"]) >= 3)
+
+
+def test_rejected_backend_items_are_not_reported():
+    reported = []
+
+    receipt = chain(PARTIAL_RECEIPT).extract(Prepared(), reported.append)
+
+    assert [item["name"] for item in receipt["items"]] == ["Milk", "Bread", "Coffee Beans"]
+    assert reported == receipt["items"]
+
+
+def test_accepted_backend_items_are_reported_once():
+    reported = []
+
+    receipt = chain(CANNED_RECEIPT, PARTIAL_RECEIPT).extract(Prepared(), reported.append)
+
+    assert len(receipt["items"]) == 3
+    assert reported == receipt["items"]
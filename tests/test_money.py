@@ -0,0 +1,53 @@
+"""Integer-cents parsing and largest-remainder allocation."""
+import pytest
+
+from smartsplit.money import allocate, format_cents, parse_cents, split_evenly
+
+
+@pytest.mark.parametrize("text, cents", [
+    ("$1,234.56", 123456),
+    ("12", 1200),
+    ("-3.5", -350),
+    ("0.015", 2),
+    (" $0.99 ", 99),
+    (7.1, 710),
+])
+def test_parse_cents(text, cents):
+    assert parse_cents(text) == cents
+
+
+@pytest.mark.parametrize("text", ["", "abc", "1.2.3"])
+def test_parse_cents_rejects_non_prices(text):
+    with pytest.raises(ValueError):
+        parse_cents(text)
+
+
+def test_format_cents_round_trips_through_parse_cents():
+    for cents in (0, 5, 99, 100, 123456, -350):
+        assert parse_cents(format_cents(cents)) == cents
+
+
+def test_allocate_always_adds_up_to_the_total():
+    for total in (0, 1, 99, 100, 1001, -1001):
+        for weights in ([1, 1, 1], [1, 2, 3], [5], [3, 0, 7, 1]):
+            assert sum(allocate(total, weights)) == total
+
+
+def test_allocate_gives_leftover_cents_to_the_largest_remainders():
+    # 100 * [1, 1, 1] / 3 = 33.33 each; the extra cent goes to the first part
+    assert allocate(100, [1, 1, 1]) == [34, 33, 33]
+    # 1000 * [1, 2] / 3 = 333.33, 666.67: the larger remainder wins
+    assert allocate(1000, [1, 2]) == [333, 667]
+    assert allocate(-100, [1, 1, 1]) == [-34, -33, -33]
+
+
+def test_allocate_edge_cases():
+    assert allocate(500, []) == []
+    # All-zero weights split evenly instead of dividing by zero
+    assert allocate(5, [0, 0]) == [3, 2]
+
+
+def test_split_evenly_differs_by_at_most_a_cent():
+    shares = split_evenly(1001, 7)
+    assert sum(shares) == 1001
+    assert max(shares) - min(shares) <= 1
@@ -0,0 +1,85 @@
+"""Outbox delivery against the fake Gmail service: retries, dead letters, deferred senders."""
+from email.message import EmailMessage
+
+import pytest
+
+from smartsplit.fakes import FakeGmailService
+from smartsplit.mail import MailDispatcher
+from smartsplit.outbox import GmailSenders, OutboxWorker, outbox_message
+from smartsplit.storage import Store
+
+SENDER = "alice@example.com"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(tmp_path / "smartsplit.db")
+    yield store
+    store.close()
+
+
+def queue(store, *recipients):
+    messages = []
+    for recipient in recipients:
+        message = EmailMessage()
+        message["From"], message["To"], message["Subject"] = SENDER, recipient, "New expenses"
+        message.set_content("You owe Alice $5.00")
+        messages.append(outbox_message(SENDER, recipient, message, ["1", "2"]))
+    store.enqueue_messages(messages)
+
+
+def worker(store, service, **kwargs):
+    senders = GmailSenders()
+    senders.register(SENDER, MailDispatcher(service))
+    # No backoff, so a retried message is due again on the next drain
+    return OutboxWorker(store, senders, base_delay=0.0, **kwargs)
+
+
+def test_messages_are_sent_once(store):
+    service = FakeGmailService()
+    queue(store, "bob@example.com", "carol@example.com")
+    # Queueing the same notification again is a no-op
+    queue(store, "bob@example.com")
+
+    assert worker(store, service).drain_once() == 2
+    assert sorted(message["to"] for message in service.sent) == ["bob@example.com", "carol@example.com"]
+    assert store.outbox_counts() == {"sent": 2}
+    assert store.claim_messages(lease=60) == []
+
+
+def test_transient_failures_are_retried_then_dead_lettered(store):
+    service = FakeGmailService(error_rate=1.0)
+    queue(store, "bob@example.com")
+    outbox = worker(store, service, max_attempts=3)
+
+    assert [outbox.drain_once() for _ in range(4)] == [1, 1, 1, 0]
+    [dead] = store.dead_messages()
+    assert dead["attempts"] == 3
+    assert "503" in dead["last_error"]
+
+    # Requeued dead letters get a fresh set of attempts
+    service.error_rate = 0.0
+    assert store.requeue_dead_messages(SENDER) == 1
+    assert outbox.drain_once() == 1
+    assert store.outbox_counts() == {"sent": 1}
+
+
+def test_permanent_failure_is_dead_lettered_at_once(store):
+    service = FakeGmailService(fail_for={"nobody@example.com"})
+    queue(store, "nobody@example.com", "bob@example.com")
+
+    worker(store, service).drain_once()
+
+    assert store.outbox_counts() == {"dead": 1, "sent": 1}
+    [dead] = store.dead_messages()
+    assert (dead["recipient"], dead["attempts"]) == ("nobody@example.com", 1)
+
+
+def test_messages_wait_for_their_sender_without_using_attempts(store):
+    queue(store, "bob@example.com")
+    outbox = OutboxWorker(store, GmailSenders(), defer_delay=0.0)
+
+    outbox.drain_once()
+
+    [message] = store.claim_messages(lease=60)
+    assert message["attempts"] == 0
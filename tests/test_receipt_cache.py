@@ -0,0 +1,69 @@
+"""Receipt extraction cache: hits skip the model, misses on a changed prompt, LRU eviction."""
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+from smartsplit.fakes import FakeModel
+from smartsplit.receipt_cache import ReceiptCache
+from smartsplit.receipts import MODEL_NAME, PROMPT, extract_receipt
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ReceiptCache(tmp_path / "receipt_cache.db")
+
+
+def photo(color="white", size=(64, 96)):
+    return Image.new("RGB", size, color)
+
+
+def test_same_photo_is_extracted_once(cache):
+    model = FakeModel()
+    extract = lambda image: extract_receipt(model, image)
+
+    first = cache.get_or_extract(photo(), extract, PROMPT, MODEL_NAME)
+    # A re-upload is a new image object with the same pixels
+    second = cache.get_or_extract(photo(), extract, PROMPT, MODEL_NAME)
+
+    assert second == first
+    assert [item["name"] for item in first["items"]] == ["Milk", "Bread", "Coffee Beans"]
+    assert model.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_other_photo_prompt_or_model_misses(cache):
+    model = FakeModel()
+    extract = lambda image: extract_receipt(model, image)
+    cache.get_or_extract(photo(), extract, PROMPT, MODEL_NAME)
+
+    cache.get_or_extract(photo("gray"), extract, PROMPT, MODEL_NAME)
+    cache.get_or_extract(photo(), extract, PROMPT + " Be brief.", MODEL_NAME)
+    cache.get_or_extract(photo(), extract, PROMPT, "another-model")
+
+    assert model.calls == 4
+    assert cache.stats()["entries"] == 4
+
+
+def test_receipts_without_items_are_not_cached(cache):
+    model = FakeModel(text="Sorry, I can't read this receipt.")
+    extract = lambda image: extract_receipt(model, image)
+
+    assert cache.get_or_extract(photo(), extract, PROMPT, MODEL_NAME)["items"] == []
+    cache.get_or_extract(photo(), extract, PROMPT, MODEL_NAME)
+
+    assert model.calls == 2
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ReceiptCache(tmp_path / "receipt_cache.db", max_entries=2)
+    receipt = {"items": [{"name": "Milk", "price": 349}]}
+    cache.put("a", receipt)
+    cache.put("b", receipt)
+    cache.get("a")
+    cache.put("c", receipt)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == receipt
+    assert cache.get("c") == receipt
@@ -0,0 +1,65 @@
+"""Debt simplification: exact and greedy solvers agree on balances, exact uses fewest transfers."""
+import random
+
+import pytest
+
+from smartsplit.settlement import net_balances, settle, settle_exact, settle_greedy, simplify_ledger
+
+
+def apply(transfers, balances):
+    remaining = dict(balances)
+    for debtor, creditor, amount in transfers:
+        assert amount > 0
+        remaining[debtor] += amount
+        remaining[creditor] -= amount
+    return remaining
+
+
+def random_balances(rng, members):
+    amounts = [rng.randint(-5000, 5000) for _ in range(members - 1)]
+    amounts.append(-sum(amounts))
+    return {f"user{i}": amount for i, amount in enumerate(amounts)}
+
+
+def test_net_balances_collapses_pairwise_debts():
+    ledger = {"bob": {"alice": 500}, "carol": {"bob": 500}}
+    assert net_balances(ledger) == {"alice": 500, "bob": 0, "carol": -500}
+    # Bob only passes money through, so one transfer settles the group
+    assert simplify_ledger(ledger) == [("carol", "alice", 500)]
+
+
+def test_exact_beats_greedy_when_members_pair_off():
+    # Greedy pairs b with d first and needs 4 transfers; {b, e} and
+    # {a, c, d} each settle on their own, so 3 suffice.
+    balances = {"a": 5, "b": 6, "c": 2, "d": -7, "e": -6}
+    exact = settle_exact(balances)
+    greedy = settle_greedy(balances)
+
+    assert len(exact) == 3
+    assert len(greedy) == 4
+    assert all(amount == 0 for amount in apply(exact, balances).values())
+    assert all(amount == 0 for amount in apply(greedy, balances).values())
+
+
+def test_both_solvers_clear_every_balance():
+    rng = random.Random(0)
+    for _ in range(50):
+        balances = random_balances(rng, rng.randint(2, 8))
+        exact = settle_exact(balances)
+        greedy = settle_greedy(balances)
+
+        assert all(amount == 0 for amount in apply(exact, balances).values())
+        assert all(amount == 0 for amount in apply(greedy, balances).values())
+        nonzero = sum(1 for amount in balances.values() if amount)
+        assert len(exact) <= len(greedy) <= max(nonzero - 1, 0)
+
+
+def test_settle_uses_greedy_above_the_exact_limit():
+    balances = random_balances(random.Random(1), 8)
+    assert settle(balances, exact_limit=3) == settle_greedy(balances)
+    assert settle(balances) == settle_exact(balances)
+
+
+def test_unbalanced_positions_are_rejected():
+    with pytest.raises(ValueError):
+        settle({"a": 10, "b": -9})
@@ -0,0 +1,67 @@
+"""Binary snapshots: round trips through the file and JSON, and starting shared data from one."""
+import pytest
+
+from benchmarks.synthetic import generate, populate
+from smartsplit.shared import SharedData, SnapshotGroup
+from smartsplit.snapshot import Snapshot, SnapshotError, read_json, write_json, write_snapshot
+from smartsplit.storage import Store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(tmp_path / "smartsplit.db")
+    populate(store, *generate(3, members_per_group=4, expenses_per_group=20))
+    yield store
+    store.close()
+
+
+def test_snapshot_round_trip(store, tmp_path):
+    users, groups = store.load()
+    ledgers = store.load_ledgers()
+    path = write_snapshot(tmp_path / "smartsplit.snap", users, groups, ledgers, store.group_heads())
+
+    with Snapshot(path) as snapshot:
+        assert snapshot.load() == (users, groups)
+        assert snapshot.load_ledgers() == ledgers
+        assert snapshot.head("Group 1") == store.group_heads()["Group 1"]
+        assert snapshot.expense_count("Group 1") == 20
+
+
+def test_json_round_trip(store, tmp_path):
+    users, groups = store.load()
+    ledgers = store.load_ledgers()
+    write_json(tmp_path / "export", users, groups, ledgers)
+
+    users_json, groups_json, ledgers_json = read_json(tmp_path / "export")
+    path = write_snapshot(tmp_path / "smartsplit.snap", users_json, groups_json, ledgers_json)
+    with Snapshot(path) as snapshot:
+        assert snapshot.load() == (users, groups)
+        assert snapshot.load_ledgers() == ledgers
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "smartsplit.snap"
+    path.write_bytes(b"not a snapshot, just some bytes")
+    with pytest.raises(SnapshotError):
+        Snapshot(path)
+
+
+def test_shared_data_reads_only_changed_groups_from_the_store(store, tmp_path):
+    path = tmp_path / "smartsplit.snap"
+    SharedData(store, path).write_snapshot()
+    store.add_expenses("Group 2", [{"id": "new", "item": "Taxi", "amount": 500, "payer": "user0@example.com",
+                                    "assignees": ["user1@example.com"], "shares": [500], "date": "2024-02-01"}])
+
+    shared = SharedData(store, path)
+
+    assert shared.stale == ["Group 2"]
+    assert isinstance(shared.groups["Group 0"], SnapshotGroup)
+    users, groups = store.load()
+    assert shared.users == users
+    for name, group in groups.items():
+        # Comparing the dicts whole would skip expenses not read yet
+        assert shared.groups[name]["expenses"] == group["expenses"]
+        assert shared.groups[name] == group
+
+    shared.write_snapshot()
+    assert SharedData(store, path).stale == []
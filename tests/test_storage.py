@@ -0,0 +1,139 @@
+"""SQLite store: schema upgrades from the first release, balances kept in step with expenses,
+compare-and-swap group versions."""
+import json
+import sqlite3
+
+import pytest
+
+from smartsplit.storage import MIGRATIONS, ConflictError, Store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = Store(tmp_path / "smartsplit.db")
+    yield store
+    store.close()
+
+
+def v1_database(path):
+    # Float dollars and one equal share per expense, as the first release stored them
+    conn = sqlite3.connect(str(path))
+    conn.executescript(f"BEGIN; {MIGRATIONS[0]}; PRAGMA user_version = 1; COMMIT;")
+    conn.executemany("INSERT INTO users (email, full_name) VALUES (?, ?)",
+                     [("alice@example.com", "Alice"), ("bob@example.com", "Bob"), ("carol@example.com", "Carol")])
+    conn.execute("INSERT INTO groups (name) VALUES ('Trip')")
+    conn.executemany("INSERT INTO memberships (group_name, email) VALUES ('Trip', ?)",
+                     [("alice@example.com",), ("bob@example.com",), ("carol@example.com",)])
+    conn.executemany(
+        "INSERT INTO expenses (group_name, id, item, amount, payer, assignees, share, date) "
+        "VALUES ('Trip', ?, ?, ?, ?, ?, ?, '2024-01-01T00:00:00')",
+        [
+            ("1", "Dinner", 10.0, "alice@example.com",
+             json.dumps(["alice@example.com", "bob@example.com", "carol@example.com"]), 10.0 / 3),
+            ("2", "Taxi", 0.1 + 0.2, "bob@example.com", json.dumps(["carol@example.com"]), 0.1 + 0.2),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_v1_database_is_upgraded_to_cents_with_versions(tmp_path):
+    path = tmp_path / "smartsplit.db"
+    v1_database(path)
+
+    store = Store(path)
+    try:
+        users, groups = store.load()
+        expenses = list(groups["Trip"]["expenses"])
+        ledger = store.load_ledger("Trip")
+    finally:
+        store.close()
+
+    conn = sqlite3.connect(str(path))
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == len(MIGRATIONS)
+    assert conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0] == 0
+    conn.close()
+    assert list(users) == ["alice@example.com", "bob@example.com", "carol@example.com"]
+    assert list(groups["Trip"]["members"]) == list(users)
+    assert groups["Trip"]["version"] == 1
+    assert [(expense["amount"], expense["shares"]) for expense in expenses] == [(1000, [334, 333, 333]), (30, [30])]
+    # Balances are rebuilt from the converted shares, not the float ones
+    assert ledger == {"bob@example.com": {"alice@example.com": 333},
+                      "carol@example.com": {"alice@example.com": 333, "bob@example.com": 30}}
+
+
+def test_reopening_an_upgraded_database_applies_nothing(tmp_path):
+    path = tmp_path / "smartsplit.db"
+    Store(path).close()
+    store = Store(path)
+    try:
+        assert store.load() == ({}, {})
+    finally:
+        store.close()
+
+
+def test_balances_follow_added_expenses(store):
+    store.save_user("alice@example.com", "Alice")
+    store.create_group("Trip", "alice@example.com")
+    store.add_member("Trip", "bob@example.com", "Bob")
+    store.add_expenses("Trip", [
+        {"id": "1", "item": "Dinner", "amount": 1001, "payer": "alice@example.com",
+         "assignees": ["alice@example.com", "bob@example.com"], "shares": [501, 500], "date": "2024-01-01"},
+        {"id": "2", "item": "Taxi", "amount": 200, "payer": "bob@example.com",
+         "assignees": ["alice@example.com"], "shares": [200], "date": "2024-01-02"},
+    ])
+
+    assert store.load_ledger("Trip") == {"bob@example.com": {"alice@example.com": 500},
+                                         "alice@example.com": {"bob@example.com": 200}}
+    assert store.check_ledgers() == {}
+    assert store.rebuild_ledger("Trip") == store.load_ledger("Trip")
+
+
+def expense(expense_id, amount=100):
+    return {"id": expense_id, "item": "Item", "amount": amount, "payer": "alice@example.com",
+            "assignees": ["bob@example.com"], "shares": [amount], "date": "2024-01-01"}
+
+
+def test_writes_at_the_expected_version_advance_it(store):
+    assert store.create_group("Trip", "alice@example.com") == 1
+    assert store.add_member("Trip", "bob@example.com", "Bob", expected_version=1) == 2
+    assert store.add_expenses("Trip", [expense("1")], expected_version=2) == 3
+    assert store.remove_member("Trip", "bob@example.com", expected_version=3) == 4
+    assert store.group_version("Trip") == 4
+
+
+def test_stale_write_is_rejected_and_changes_nothing(store):
+    store.create_group("Trip", "alice@example.com")
+    store.add_expenses("Trip", [expense("1")], expected_version=1)
+
+    # A second session still at version 1 tries to add its own expense
+    with pytest.raises(ConflictError) as conflict:
+        store.add_expenses("Trip", [expense("2", 500)], expected_version=1)
+
+    assert (conflict.value.expected, conflict.value.actual) == (1, 2)
+    assert [row["id"] for row in store.load_group_expenses("Trip")] == ["1"]
+    assert store.load_ledger("Trip") == {"bob@example.com": {"alice@example.com": 100}}
+    assert store.group_version("Trip") == 2
+
+
+def test_unversioned_writes_always_apply(store):
+    store.create_group("Trip", "alice@example.com")
+    store.add_expenses("Trip", [expense("1")])
+    store.add_expenses("Trip", [expense("2")])
+    assert store.group_version("Trip") == 3
+
+
+def test_conflicts_on_create_and_delete(store):
+    store.create_group("Trip", "alice@example.com")
+    with pytest.raises(ConflictError) as taken:
+        store.create_group("Trip", "bob@example.com")
+    assert (taken.value.expected, taken.value.actual) == (0, 1)
+
+    with pytest.raises(ConflictError):
+        store.delete_group("Trip", expected_version=2)
+    store.delete_group("Trip", expected_version=1)
+
+    with pytest.raises(ConflictError) as gone:
+        store.add_member("Trip", "bob@example.com", expected_version=1)
+    assert gone.value.actual is None
+    assert "no longer exists" in str(gone.value)